@@ -0,0 +1,273 @@
+"""
+Stage-level benchmarks for the receipt pipeline.
+
+Times decode, normalization, each preprocessing method, each OCR config
+and each field extractor separately, on synthetic receipts (set length,
+noise, blur, rotation, resolution) and the sample images under test/.
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json
+    python benchmark.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ocr_engines import get_engine
+from receipt_processor import ReceiptProcessor, _apply_preprocessing
+from receipt_text import ReceiptText
+
+TEST_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test')
+
+# Synthetic presets: generate_receipt keyword arguments
+SYNTHETIC_CASES = {
+    'clean_short': {'items': 5},
+    'clean_long': {'items': 40},
+    'noisy': {'items': 15, 'noise': 25.0},
+    'blurred': {'items': 15, 'blur': 1.5},
+    'rotated': {'items': 15, 'rotation': 7.0},
+    'low_res': {'items': 15, 'scale': 0.5},
+    'high_res': {'items': 15, 'scale': 3.0},
+}
+
+EXTRACTORS = ['_extract_store_name', '_extract_total_amount', '_extract_purchase_date',
+              '_extract_items_improved', '_extract_tax_amount_improved', '_extract_subtotal']
+
+STORES = ['WALMART SUPERCENTER', 'TRADER JOES', "JOE'S DINER", 'CORNER PHARMACY', 'CITY FUEL']
+PRODUCTS = ['BANANAS', 'MILK 1 GAL', 'BREAD WHEAT', 'EGGS LARGE', 'COFFEE', 'APPLES', 'RICE 2LB',
+            'CHEESE', 'PASTA', 'YOGURT', 'SOAP', 'TOOTHPASTE', 'CHICKEN', 'WATER 24PK', 'BATTERIES']
+
+
+def receipt_lines(items: int, seed: int = 0) -> List[str]:
+    """Text of a plausible receipt with the given number of item lines"""
+    rng = random.Random(seed)
+    prices = [rng.randint(99, 2999) / 100 for _ in range(items)]
+    subtotal = round(sum(prices), 2)
+    tax = round(subtotal * 0.08, 2)
+
+    lines = [rng.choice(STORES), '1234 MAIN STREET', f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024  2:45 PM", '']
+    lines += [f"{rng.choice(PRODUCTS):<18}${price:>7.2f}" for price in prices]
+    lines += ['', f"{'SUBTOTAL':<18}${subtotal:>7.2f}", f"{'TAX':<18}${tax:>7.2f}",
+              f"{'TOTAL':<18}${subtotal + tax:>7.2f}", '', 'THANK YOU FOR SHOPPING!']
+    return lines
+
+
+def generate_receipt(items: int = 15, noise: float = 0.0, blur: float = 0.0, rotation: float = 0.0,
+                     scale: float = 1.0, seed: int = 0) -> Tuple[bytes, str]:
+    """
+    Render a synthetic receipt as PNG bytes.
+
+    Args:
+        items: number of item lines (sets the receipt length)
+        noise: standard deviation of added Gaussian pixel noise
+        blur: Gaussian blur sigma (0 = sharp)
+        rotation: counter-clockwise rotation in degrees
+        scale: resolution factor applied after rendering
+        seed: seeds the text and the noise
+
+    Returns the encoded image and the text drawn on it.
+    """
+    lines = receipt_lines(items, seed)
+    line_height = 34
+    image = np.full((line_height * (len(lines) + 2), 640), 255, dtype=np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(image, line, (20, line_height * (i + 1) + 8), cv2.FONT_HERSHEY_DUPLEX, 0.75, 0, 1, cv2.LINE_AA)
+
+    if rotation:
+        height, width = image.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotation, 1.0)
+        image = cv2.warpAffine(image, matrix, (width, height), borderValue=255)
+    if blur:
+        image = cv2.GaussianBlur(image, (0, 0), blur)
+    if noise:
+        rng = np.random.default_rng(seed)
+        image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+    if scale != 1.0:
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+
+    return cv2.imencode('.png', image)[1].tobytes(), '\n'.join(lines)
+
+
+def time_call(fn: Callable[[], Any], repeat: int) -> Tuple[Any, Dict[str, float]]:
+    """Run fn repeat times; return its last result and min/median/mean wall time in ms"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return result, {
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.mean(times), 3),
+    }
+
+
+def benchmark_case(processor: ReceiptProcessor, image_data: bytes, text: Optional[str],
+                   repeat: int, ocr_repeat: int, skip_ocr: bool) -> Dict[str, Any]:
+    """
+    Time every stage on one image.
+
+    Extractors run on the known text for synthetic receipts and on the
+    single-column OCR text for real images (skipped with skip_ocr).
+    """
+    stages = {}
+
+    gray, stages['decode'] = time_call(lambda: processor.load_grayscale(image_data), repeat)
+    (normalized, _), stages['normalize'] = time_call(lambda: processor.normalize_image(gray), repeat)
+
+    for method in processor.ENHANCED_METHODS:
+        _, stages[f'preprocess.{method}'] = time_call(lambda: _apply_preprocessing(normalized, method), repeat)
+
+    if not skip_ocr:
+        prep = {'image': normalized, 'method': 'grayscale'}
+        for config, config_name in processor.OCR_CONFIGS:
+            result, stages[f'ocr.{config_name}'] = time_call(
+                lambda: processor._run_ocr(prep, config, config_name), ocr_repeat)
+            if text is None and config_name == 'single_column' and result:
+                text = result['text']
+
+    if text is not None:
+        _, stages['extract.tokenize'] = time_call(lambda: ReceiptText(text), repeat)
+        for name in EXTRACTORS:
+            extractor = getattr(processor, name)
+            _, stages[f'extract.{name.lstrip("_")}'] = time_call(lambda: extractor(text), repeat)
+        _, stages['extract.all'] = time_call(lambda: processor.extract_structured_data(text), repeat)
+
+    return {
+        'image_size': [int(gray.shape[1]), int(gray.shape[0])],
+        'text_chars': len(text) if text is not None else None,
+        'stages': stages,
+    }
+
+
+def load_cases(which: str) -> Dict[str, Tuple[bytes, Optional[str]]]:
+    """Named (image bytes, known text or None) pairs for the chosen case set"""
+    cases = {}
+    if which in ('synthetic', 'all'):
+        for name, params in SYNTHETIC_CASES.items():
+            cases[f'synthetic/{name}'] = generate_receipt(**params)
+    if which in ('real', 'all') and os.path.isdir(TEST_IMAGE_DIR):
+        for filename in sorted(os.listdir(TEST_IMAGE_DIR)):
+            with open(os.path.join(TEST_IMAGE_DIR, filename), 'rb') as f:
+                cases[f'real/{filename}'] = (f.read(), None)
+    return cases
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(cases: Dict[str, Tuple[bytes, Optional[str]]], engine: str = 'pytesseract',
+                   repeat: int = 5, ocr_repeat: int = 1, skip_ocr: bool = False) -> Dict[str, Any]:
+    processor = ReceiptProcessor(engine=engine)
+    try:
+        engine_version = get_engine(engine).version()
+    except Exception:
+        engine_version = None
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'engine': engine,
+            'engine_version': engine_version,
+            'repeat': repeat,
+            'ocr_repeat': ocr_repeat,
+        },
+        'cases': {},
+        'totals': {},
+    }
+
+    for name, (image_data, text) in cases.items():
+        print(f"  {name}", file=sys.stderr)
+        report['cases'][name] = benchmark_case(processor, image_data, text, repeat, ocr_repeat, skip_ocr)
+
+    # Sum of medians per stage across cases, the headline numbers for a compare
+    for case in report['cases'].values():
+        for stage, timing in case['stages'].items():
+            report['totals'][stage] = round(report['totals'].get(stage, 0.0) + timing['median_ms'], 3)
+
+    processor.close()
+    return report
+
+
+def compare_reports(before: Dict[str, Any], after: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-stage total median time before and after, with the after/before ratio"""
+    rows = []
+    for stage in sorted(set(before['totals']) | set(after['totals'])):
+        old, new = before['totals'].get(stage), after['totals'].get(stage)
+        ratio = round(new / old, 3) if old and new is not None else None
+        rows.append({'stage': stage, 'before_ms': old, 'after_ms': new, 'ratio': ratio})
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]], before: Dict[str, Any], after: Dict[str, Any]):
+    print(f"{'stage':<40}{'before ms':>12}{'after ms':>12}{'ratio':>8}")
+    print(f"{'':<40}{str(before['meta'].get('commit')):>12}{str(after['meta'].get('commit')):>12}")
+    for row in rows:
+        old = f"{row['before_ms']:.1f}" if row['before_ms'] is not None else '-'
+        new = f"{row['after_ms']:.1f}" if row['after_ms'] is not None else '-'
+        ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else '-'
+        print(f"{row['stage']:<40}{old:>12}{new:>12}{ratio:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Stage-level benchmarks for the receipt pipeline')
+    parser.add_argument('--cases', choices=['synthetic', 'real', 'all'], default='all')
+    parser.add_argument('--engine', default=os.getenv('OCR_ENGINE', 'pytesseract'))
+    parser.add_argument('--repeat', type=int, default=5, help='runs per non-OCR stage')
+    parser.add_argument('--ocr-repeat', type=int, default=1, help='runs per OCR config')
+    parser.add_argument('--skip-ocr', action='store_true', help='time everything except Tesseract')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two JSON reports instead of running')
+    parser.add_argument('--fail-over', type=float, metavar='RATIO',
+                        help='with --compare, exit 1 if any stage ratio exceeds this')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        rows = compare_reports(before, after)
+        print_comparison(rows, before, after)
+        if args.fail_over and any(row['ratio'] and row['ratio'] > args.fail_over for row in rows):
+            return 1
+        return 0
+
+    print(f"Benchmarking ({args.cases}, engine={args.engine})", file=sys.stderr)
+    report = run_benchmarks(load_cases(args.cases), engine=args.engine, repeat=args.repeat,
+                            ocr_repeat=args.ocr_repeat, skip_ocr=args.skip_ocr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import itertools
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(gray: np.ndarray, hash_size: int = 16) -> int:
+    """
+    Difference hash of a grayscale image.
+
+    The image is shrunk to (hash_size + 1) x hash_size and each bit records
+    whether a pixel is brighter than its right neighbour, which survives
+    rescaling, recompression and small exposure changes.
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+class DuplicateMatch(NamedTuple):
+    key: str
+    distance: int
+
+
+class DuplicateIndex:
+    """
+    Hamming-distance index over perceptual hashes (multi-index hashing).
+
+    Each hash is split into chunk_bits-wide chunks with one lookup table
+    per chunk. Two hashes within max_distance bits must agree on at least
+    one chunk to within max_distance // n_chunks bits, so a query only
+    probes those neighbouring chunk values and checks the few candidates
+    it finds instead of scanning every stored hash.
+
+    With a path, entries are appended to a text file and picked up by
+    other processes sharing it on their next lookup.
+    """
+
+    def __init__(self, hash_bits: int = 256, chunk_bits: int = 16,
+                 max_distance: int = 16, path: Optional[str] = None):
+        if hash_bits % chunk_bits:
+            raise ValueError("hash_bits must be a multiple of chunk_bits")
+
+        self.hash_bits = hash_bits
+        self.chunk_bits = chunk_bits
+        self.n_chunks = hash_bits // chunk_bits
+        self.max_distance = max_distance
+        self.path = path
+
+        self._hashes: List[int] = []
+        self._keys: List[str] = []
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self.n_chunks)]
+        self._lock = threading.Lock()
+        self._file_offset = 0
+
+        # Bit masks within one chunk for every flip pattern of up to r bits
+        self._chunk_radius = max_distance // self.n_chunks
+        self._flip_masks = [0]
+        for radius in range(1, self._chunk_radius + 1):
+            for positions in itertools.combinations(range(chunk_bits), radius):
+                self._flip_masks.append(sum(1 << p for p in positions))
+
+        if path:
+            with self._lock:
+                self._load_new_entries()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _chunks(self, value: int) -> List[int]:
+        mask = (1 << self.chunk_bits) - 1
+        return [(value >> (i * self.chunk_bits)) & mask for i in range(self.n_chunks)]
+
+    def _insert(self, value: int, key: str):
+        entry_id = len(self._hashes)
+        self._hashes.append(value)
+        self._keys.append(key)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(entry_id)
+
+    def add(self, value: int, key: str):
+        """Index a hash under the key of its stored result"""
+        with self._lock:
+            if not self.path:
+                self._insert(value, key)
+                return
+
+            # The entry is indexed when read back, along with anything
+            # other processes appended in the meantime
+            try:
+                with open(self.path, 'ab') as f:
+                    f.write(f"{value:x} {key}\n".encode('ascii'))
+            except OSError as e:
+                logger.warning(f"Failed to persist duplicate index entry: {e}")
+                self._insert(value, key)
+                return
+            self._load_new_entries()
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> Optional[DuplicateMatch]:
+        """Return the closest stored hash within max_distance bits, if any"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+
+        with self._lock:
+            if self.path:
+                self._load_new_entries()
+
+            best = None
+            seen = set()
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                for flip in self._flip_masks:
+                    for entry_id in table.get(chunk ^ flip, ()):
+                        if entry_id in seen:
+                            continue
+                        seen.add(entry_id)
+                        distance = (self._hashes[entry_id] ^ value).bit_count()
+                        if distance <= max_distance and (best is None or distance < best.distance):
+                            best = DuplicateMatch(self._keys[entry_id], distance)
+            return best
+
+    def _load_new_entries(self):
+        """Read entries appended to the index file since the last read"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._file_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Partially written by another process
+                    self._file_offset += len(line)
+                    parts = line.decode('ascii', 'replace').split()
+                    if len(parts) == 2:
+                        self._insert(int(parts[0], 16), parts[1])
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,65 @@
+import binascii
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Optional; MessagePack request bodies are refused without it
+    msgpack = None
+
+
+class InvalidImageError(ValueError):
+    """Raised when uploaded bytes are not a decodable image"""
+
+
+def decode_base64_image(value: str) -> bytes:
+    """
+    Decode a base64 image string, with or without a data URL header
+    (data:image/jpeg;base64,...), straight into raw bytes.
+    """
+    if value.startswith('data:'):
+        value = value[value.find(',') + 1:]
+    try:
+        return binascii.a2b_base64(value)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidImageError(f"Invalid base64 image: {str(e)}")
+
+
+def unpack_image_envelope(body: bytes) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Split a MessagePack request body, a map with the raw image bytes under
+    'image' and any processing options beside it, into the image and the
+    options. A base64 string is accepted for 'image' as well.
+    """
+    try:
+        envelope = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise InvalidImageError(f"Invalid MessagePack body: {str(e)}")
+
+    if not isinstance(envelope, dict) or 'image' not in envelope:
+        raise InvalidImageError("MessagePack body must be a map with an 'image' field")
+
+    image = envelope.pop('image')
+    if isinstance(image, str):
+        image = decode_base64_image(image)
+    elif not isinstance(image, bytes):
+        raise InvalidImageError("MessagePack 'image' field must be binary or a base64 string")
+    return image, envelope
+
+
+def decode_image(image_data) -> np.ndarray:
+    """
+    Decode image bytes (or any buffer) once, directly into the grayscale
+    array the preprocessing stage works on. No intermediate copies are made
+    of the encoded data.
+    """
+    buffer = np.frombuffer(image_data, np.uint8)
+    if buffer.size == 0:
+        raise InvalidImageError("Invalid image format: empty upload")
+
+    image = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise InvalidImageError("Invalid image format: could not decode image")
+    return image
@@ -0,0 +1,401 @@
+import logging
+import math
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Side length the text-height probe works at; plenty to resolve glyphs
+PROBE_MAX_SIDE = 1200
+
+# Minimum number of glyph-like components for a trustworthy estimate
+MIN_GLYPHS = 15
+
+# Side length receipt localisation works at
+REGION_PROBE_MAX_SIDE = 800
+
+# A receipt quadrilateral must cover this share of the frame to count; above
+# the upper bound the image is already cropped (scans, screenshots)
+MIN_REGION_AREA = 0.15
+MAX_REGION_AREA = 0.9
+
+# Side length the skew and orientation probes work at
+ORIENTATION_PROBE_MAX_SIDE = 800
+
+# Largest skew (degrees) searched for; beyond this it's a quarter-turn problem
+MAX_SKEW = 15.0
+
+# Minimum Tesseract OSD confidence for flipping an image upside down
+MIN_OSD_CONFIDENCE = 2.0
+
+# Side length Tesseract OSD works at; text normalised to ~30px stays legible
+OSD_PROBE_MAX_SIDE = 1200
+
+# Text whose glyph cues are at least this one-sided (and this many) is
+# taken as upright without asking Tesseract OSD
+MIN_UPRIGHT_SHARE = 0.7
+MIN_UPRIGHT_CUES = 12
+
+
+def _ink_probe(gray: np.ndarray, max_side: int) -> Tuple[np.ndarray, float]:
+    """Downscaled, Otsu-binarised copy with ink as 255, and its scale"""
+    height, width = gray.shape[:2]
+    probe_scale = min(1.0, max_side / max(height, width))
+    probe = gray
+    if probe_scale < 1.0:
+        probe = cv2.resize(gray, None, fx=probe_scale, fy=probe_scale, interpolation=cv2.INTER_AREA)
+
+    _, binary = cv2.threshold(probe, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary, probe_scale
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """
+    Estimate the typical glyph height in pixels from connected components.
+
+    Works on a downscaled, Otsu-binarised copy and takes the median height
+    of components shaped like characters. Returns None when too few are
+    found (blank or photo-like images).
+    """
+    binary, probe_scale = _ink_probe(gray, PROBE_MAX_SIDE)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if count <= 1:
+        return None
+
+    # Skip the background component, then keep character-shaped blobs
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    probe_height = binary.shape[0]
+
+    glyphs = ((heights >= 4) & (heights <= probe_height * 0.1) &
+              (widths <= heights * 2.5) & (widths >= heights * 0.1) &
+              (areas >= 8))
+    if glyphs.sum() < MIN_GLYPHS:
+        return None
+
+    return float(np.median(heights[glyphs])) / probe_scale
+
+
+def normalize_resolution(gray: np.ndarray, target_text_height: float = 30.0,
+                         max_pixels: int = 4_000_000, min_scale: float = 0.2,
+                         max_scale: float = 3.0) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Rescale so glyphs land near target_text_height pixels, Tesseract's
+    best range, without exceeding max_pixels.
+
+    Returns the resized image and a report of the chosen scale.
+    """
+    height, width = gray.shape[:2]
+    text_height = estimate_text_height(gray)
+
+    scale = target_text_height / text_height if text_height else 1.0
+    scale = min(max(scale, min_scale), max_scale)
+
+    # Pixel budget applies whatever the text height says
+    if height * width * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / (height * width))
+
+    # Small adjustments are not worth a resample
+    if abs(scale - 1.0) < 0.1:
+        scale = 1.0
+
+    normalized = gray
+    if scale != 1.0:
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        normalized = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                interpolation=interpolation)
+
+    info = {
+        'scale': round(scale, 4),
+        'estimated_text_height': round(text_height, 1) if text_height else None,
+        'original_size': [width, height],
+        'normalized_size': [normalized.shape[1], normalized.shape[0]],
+    }
+    return normalized, info
+
+
+def _order_corners(corners: np.ndarray) -> np.ndarray:
+    """Order four points as top-left, top-right, bottom-right, bottom-left"""
+    corners = corners.reshape(4, 2).astype(np.float32)
+    sums = corners.sum(axis=1)
+    diffs = np.diff(corners, axis=1).ravel()
+    return np.array([corners[np.argmin(sums)], corners[np.argmin(diffs)],
+                     corners[np.argmax(sums)], corners[np.argmax(diffs)]], dtype=np.float32)
+
+
+def _quadrilateral(contour: np.ndarray, min_area: float, max_area: float) -> Optional[np.ndarray]:
+    """Four corners of a contour if it is a plausibly sized, convex quadrilateral"""
+    area = cv2.contourArea(contour)
+    if not min_area <= area <= max_area:
+        return None
+
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    if len(approx) == 4 and cv2.isContourConvex(approx):
+        return approx.reshape(4, 2)
+
+    # Curled or torn edges: accept the bounding rotated rectangle when the
+    # contour fills most of it
+    rect = cv2.minAreaRect(contour)
+    rect_area = rect[1][0] * rect[1][1]
+    if rect_area > 0 and area / rect_area >= 0.85:
+        return cv2.boxPoints(rect)
+    return None
+
+
+def detect_receipt_region(gray: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Find the four corners of the receipt in a photo.
+
+    Tries the largest closed edge contours first, then the largest bright
+    region (paper on a darker background). Returns corners in full-image
+    coordinates ordered TL, TR, BR, BL, or None when nothing convincing
+    is found.
+    """
+    height, width = gray.shape[:2]
+    probe_scale = min(1.0, REGION_PROBE_MAX_SIDE / max(height, width))
+    probe = gray
+    if probe_scale < 1.0:
+        probe = cv2.resize(gray, None, fx=probe_scale, fy=probe_scale, interpolation=cv2.INTER_AREA)
+
+    blurred = cv2.GaussianBlur(probe, (5, 5), 0)
+    frame_area = probe.shape[0] * probe.shape[1]
+    min_area, max_area = frame_area * MIN_REGION_AREA, frame_area * MAX_REGION_AREA
+
+    # Edge contours, with gaps in the paper outline closed
+    median = float(np.median(blurred))
+    edges = cv2.Canny(blurred, int(max(0, 0.66 * median)), int(min(255, 1.33 * median)))
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=2)
+
+    # Bright paper against a darker surface
+    _, bright = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    bright = cv2.morphologyEx(bright, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+
+    for mask in (edges, bright):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            corners = _quadrilateral(contour, min_area, max_area)
+            if corners is not None:
+                return _order_corners(corners / probe_scale)
+
+    return None
+
+
+def crop_to_receipt(gray: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Perspective-warp the receipt region to a flat, upright rectangle.
+
+    Falls back to the full frame when no receipt outline is found.
+    """
+    corners = detect_receipt_region(gray)
+    if corners is None:
+        return gray, {'detected': False}
+
+    top_left, top_right, bottom_right, bottom_left = corners
+    width = int(round(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left))))
+    height = int(round(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right))))
+    if width < 32 or height < 32:
+        return gray, {'detected': False}
+
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    transform = cv2.getPerspectiveTransform(corners, target)
+    cropped = cv2.warpPerspective(gray, transform, (width, height), flags=cv2.INTER_LINEAR,
+                                  borderMode=cv2.BORDER_REPLICATE)
+
+    return cropped, {
+        'detected': True,
+        'corners': [[round(float(x), 1), round(float(y), 1)] for x, y in corners],
+        'cropped_size': [width, height],
+    }
+
+
+def _glyph_components(binary: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep only glyph-sized ink components, dropping specks and large
+    blobs such as table texture or photo background.
+
+    Returns the glyph-only mask and the glyph centroids.
+    """
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    widths = stats[:, cv2.CC_STAT_WIDTH]
+    heights = stats[:, cv2.CC_STAT_HEIGHT]
+    glyphs = ((heights >= 3) & (widths >= 2) & (stats[:, cv2.CC_STAT_AREA] >= 6) &
+              (heights <= binary.shape[0] * 0.1) & (widths <= binary.shape[1] * 0.1))
+    glyphs[0] = False  # background
+    return glyphs[labels], centroids[glyphs]
+
+
+def horizontal_neighbour_share(centroids: np.ndarray, max_glyphs: int = 2000,
+                               chunk_size: int = 128) -> Optional[float]:
+    """
+    Share of glyphs whose nearest neighbour sits to the side rather than
+    above or below.
+
+    Letters in a word are packed closer than the lines of text, so upright
+    or upside-down text scores well above 0.5 and text turned a quarter
+    turn well below. Returns None when there are too few glyphs to tell.
+
+    Nearest neighbours are found chunk_size glyphs at a time, so the
+    distance temporaries stay at chunk_size x max_glyphs (2 MB by default)
+    rather than a full max_glyphs x max_glyphs matrix.
+    """
+    if len(centroids) < MIN_GLYPHS:
+        return None
+    if len(centroids) > max_glyphs:
+        centroids = centroids[np.random.default_rng(0).choice(len(centroids), max_glyphs, replace=False)]
+
+    xs, ys = centroids[:, 0].astype(np.float64), centroids[:, 1].astype(np.float64)
+    nearest = np.empty(len(centroids), dtype=np.intp)
+    for start in range(0, len(centroids), chunk_size):
+        stop = min(start + chunk_size, len(centroids))
+        distances = (xs[start:stop, None] - xs) ** 2
+        distances += (ys[start:stop, None] - ys) ** 2
+        distances[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        nearest[start:stop] = distances.argmin(axis=1)
+
+    offsets = np.abs(centroids[nearest] - centroids)
+    return float(np.mean(offsets[:, 0] > offsets[:, 1]))
+
+
+def upright_share(gray: np.ndarray) -> Optional[float]:
+    """
+    Share of a level image's glyph cues that say its text is upright
+    rather than upside down.
+
+    Each text line's core (the rows holding at least half its peak ink)
+    is found from the row profile. Small marks inside the bottom half of
+    the core (full stops, decimal points, commas) and tall glyphs rising
+    above it (ascenders, capitals among lowercase) count for upright;
+    their mirror images (marks in the top half, glyphs dropping below)
+    count for upside down. Returns None when there are too few cues.
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    tops, heights = stats[1:, cv2.CC_STAT_TOP], stats[1:, cv2.CC_STAT_HEIGHT]
+    widths, areas = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_AREA]
+    keep = (heights <= gray.shape[0] * 0.1) & (widths <= gray.shape[1] * 0.1) & (areas >= 2)
+    if keep.sum() < MIN_GLYPHS:
+        return None
+
+    profile = np.isin(labels, np.nonzero(keep)[0] + 1).sum(axis=1)
+    edges = np.diff(np.concatenate([[0], (profile > 0).astype(np.int8), [0]]))
+    starts, stops = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+
+    # Core rows of each line; lines too thin to have one are skipped
+    core_top = np.zeros(len(starts))
+    core_height = np.zeros(len(starts))
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        band = profile[start:stop]
+        core = np.nonzero(band >= band.max() * 0.5)[0]
+        core_top[i], core_height[i] = start + core[0], core[-1] + 1 - core[0]
+
+    tops, heights, widths = tops[keep], heights[keep], widths[keep]
+    bottoms = tops + heights
+    line = np.searchsorted(starts, tops, side='right') - 1
+    top, size = core_top[line], core_height[line]
+    inside_line = (bottoms <= stops[line]) & (size >= 5)
+    middle = top + size / 2
+
+    marks = inside_line & (heights <= 0.4 * size) & (widths <= 0.6 * size) & (tops >= top) & (bottoms <= top + size)
+    tall = inside_line & (heights >= 0.6 * size)
+    upright = (marks & (tops >= middle)) | (tall & (tops < top - 0.25 * size) & (bottoms <= top + 1.1 * size))
+    flipped = (marks & (bottoms <= middle)) | (tall & (bottoms > top + 1.25 * size) & (tops >= top - 0.1 * size))
+
+    cues = int(upright.sum() + flipped.sum())
+    if cues < MIN_UPRIGHT_CUES:
+        return None
+    return float(upright.sum()) / cues
+
+
+def _rotate(image: np.ndarray, angle: float, border_value: int = 0) -> np.ndarray:
+    """Rotate counter-clockwise by angle degrees, growing the canvas to keep the corners"""
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width, new_height = int(round(height * sin + width * cos)), int(round(height * cos + width * sin))
+    matrix[0, 2] += new_width / 2 - width / 2
+    matrix[1, 2] += new_height / 2 - height / 2
+    return cv2.warpAffine(image, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+
+
+def estimate_skew(mask: np.ndarray, max_points: int = 50_000) -> float:
+    """
+    Small text skew in degrees (counter-clockwise correction) from the
+    projection profile of a glyph mask.
+
+    Rows of level text give the most sharply peaked row sums, so the
+    angle that maximises their variance is the one that levels the text.
+    Ink coordinates are rotated rather than the image, searched coarsely
+    over +/-MAX_SKEW and then refined around the best angle.
+    """
+    ys, xs = np.nonzero(mask)
+    if len(xs) < MIN_GLYPHS:
+        return 0.0
+    if len(xs) > max_points:
+        keep = np.random.default_rng(0).choice(len(xs), max_points, replace=False)
+        xs, ys = xs[keep], ys[keep]
+    xs = xs - mask.shape[1] / 2
+    ys = ys - mask.shape[0] / 2
+
+    def profile_score(angle: float) -> float:
+        # Row each ink pixel lands on after a counter-clockwise rotation
+        radians = math.radians(angle)
+        rows = np.round(ys * math.cos(radians) - xs * math.sin(radians)).astype(np.int64)
+        return float(np.var(np.bincount(rows - rows.min())))
+
+    best = max(np.arange(-MAX_SKEW, MAX_SKEW + 0.5, 1.0), key=profile_score)
+    fine = np.arange(max(-MAX_SKEW, best - 1.0), min(MAX_SKEW, best + 1.0) + 0.05, 0.1)
+    best = max(fine, key=profile_score)
+    return round(float(best), 1)
+
+
+def correct_orientation(gray: np.ndarray,
+                        detect_osd: Optional[Callable[[np.ndarray], Optional[Tuple[int, float]]]] = None
+                        ) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Turn text upright and level, once per image.
+
+    Quarter turns come from the glyph-neighbour layout and small skew
+    from the projection profile, both on a downscaled probe. Telling
+    upright from upside-down needs a text model, so that step only runs
+    when detect_osd (an engine's detect_orientation) is given, and then
+    only when the glyph cues (upright_share) don't already show the text
+    is upright. OSD costs about as much as an OCR pass, so it reads a copy
+    downscaled to OSD_PROBE_MAX_SIDE.
+
+    Returns the corrected image and the clockwise rotation and counter-
+    clockwise deskew angle applied, and whether OSD ran.
+    """
+    info = {'rotation': 0, 'skew': 0.0, 'osd': False}
+    binary, _ = _ink_probe(gray, ORIENTATION_PROBE_MAX_SIDE)
+    mask, centroids = _glyph_components(binary)
+
+    share = horizontal_neighbour_share(centroids)
+    if share is not None and share < 0.4:
+        gray = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+        mask = cv2.rotate(mask.astype(np.uint8), cv2.ROTATE_90_CLOCKWISE)
+        info['rotation'] = 90
+
+    # Tesseract copes with a degree or so; not worth a resample
+    skew = estimate_skew(mask)
+    if abs(skew) >= 1.0:
+        # Fill the new corners with the page colour rather than black
+        gray = _rotate(gray, skew, border_value=int(np.median(gray)))
+        info['skew'] = skew
+
+    if detect_osd is not None and (upright_share(gray) or 0.0) < MIN_UPRIGHT_SHARE:
+        height, width = gray.shape[:2]
+        probe = gray
+        probe_scale = OSD_PROBE_MAX_SIDE / max(height, width)
+        if probe_scale < 1.0:
+            probe = cv2.resize(gray, None, fx=probe_scale, fy=probe_scale, interpolation=cv2.INTER_AREA)
+        osd = detect_osd(probe)
+        info['osd'] = True
+        if osd is not None and osd[0] == 180 and osd[1] >= MIN_OSD_CONFIDENCE:
+            gray = cv2.rotate(gray, cv2.ROTATE_180)
+            info['rotation'] = (info['rotation'] + 180) % 360
+
+    return gray, info
@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    image BLOB,
+    options TEXT NOT NULL,
+    webhook_url TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    leased_until REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds max_queued jobs waiting to run"""
+
+
+class Job(NamedTuple):
+    id: str
+    image: bytes
+    options: Dict[str, Any]
+    webhook_url: Optional[str]
+    attempts: int
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat(timespec='milliseconds')
+
+
+class JobQueue:
+    """
+    Durable OCR job queue in a local SQLite file.
+
+    Jobs move from 'queued' to 'running' when a worker claims them and end
+    as 'done' (with the result) or 'failed' (with the error). A claim is a
+    lease of lease_seconds that the worker renews while the job runs; a
+    job still 'running' after its lease ran out, because its worker died,
+    is handed out again until it has been tried max_attempts times. Every process that opens the same file shares the
+    queue, so uvicorn workers pull from one backlog.
+
+    Images are dropped once a job finishes; finished jobs are kept for
+    polling until purge() removes them.
+    """
+
+    def __init__(self, path: str, max_queued: int = 1000,
+                 lease_seconds: float = 600.0, max_attempts: int = 3):
+        self.path = path
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection; the file and schema are created on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # Autocommit; writes that must be atomic use explicit transactions
+            connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(_SCHEMA)
+                    self._schema_ready = True
+        return connection
+
+    def submit(self, image_data: bytes, options: Optional[Dict[str, Any]] = None,
+               webhook_url: Optional[str] = None) -> str:
+        """Queue an image and return the new job's id"""
+        connection = self._connection()
+        job_id = uuid.uuid4().hex
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            queued = connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({queued} jobs waiting)")
+            connection.execute(
+                "INSERT INTO jobs (id, status, image, options, webhook_url, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, sqlite3.Binary(image_data), json.dumps(options or {}), webhook_url, time.time())
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return job_id
+
+    def claim(self) -> Optional[Job]:
+        """
+        Take the oldest waiting job, or one whose lease has expired, and
+        mark it running. Returns None when there is nothing to do.
+        """
+        connection = self._connection()
+        now = time.time()
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            while True:
+                row = connection.execute(
+                    "SELECT id, image, options, webhook_url, attempts, status FROM jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND leased_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    connection.execute('COMMIT')
+                    return None
+
+                if row['status'] == 'running' and row['attempts'] >= self.max_attempts:
+                    logger.warning(f"Job {row['id']} abandoned after {row['attempts']} attempts")
+                    self._finish(connection, row['id'], 'failed', error=f"Abandoned after {row['attempts']} attempts")
+                    continue
+
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, leased_until = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (now, now + self.lease_seconds, row['id'])
+                )
+                connection.execute('COMMIT')
+                return Job(row['id'], bytes(row['image']), json.loads(row['options']),
+                           row['webhook_url'], row['attempts'] + 1)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def renew(self, job: Job) -> bool:
+        """
+        Extend the lease on a claimed job by lease_seconds. Returns False if
+        the lease already ran out and the job was claimed again, in which
+        case this attempt no longer owns it.
+        """
+        cursor = self._connection().execute(
+            "UPDATE jobs SET leased_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + self.lease_seconds, job.id, job.attempts)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        self._finish(self._connection(), job_id, 'done', result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(self._connection(), job_id, 'failed', error=error)
+
+    def _finish(self, connection: sqlite3.Connection, job_id: str, status: str,
+                result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        connection.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job, with its result or error once it has finished"""
+        row = self._connection().execute(
+            "SELECT id, status, result, error, attempts, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return {
+            'job_id': row['id'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': _timestamp(row['created_at']),
+            'started_at': _timestamp(row['started_at']),
+            'finished_at': _timestamp(row['finished_at']),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+        }
+
+    def purge(self, max_age_seconds: float) -> int:
+        """Delete jobs that finished more than max_age_seconds ago; returns how many"""
+        cursor = self._connection().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - max_age_seconds,)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+
+def post_webhook(url: str, payload: Dict[str, Any], attempts: int = 3, timeout: float = 10.0) -> bool:
+    """
+    POST a finished job's payload as JSON, retrying with backoff on
+    connection errors and 5xx responses. Returns whether it was delivered.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            response = requests.post(url, json=payload, timeout=timeout)
+            if response.status_code < 400:
+                return True
+            if response.status_code < 500:
+                logger.warning(f"Webhook {url} rejected job {payload.get('job_id')}: {response.status_code}")
+                return False
+            logger.warning(f"Webhook {url} returned {response.status_code} (attempt {attempt}/{attempts})")
+        except requests.RequestException as e:
+            logger.warning(f"Webhook {url} failed (attempt {attempt}/{attempts}): {e}")
+
+        if attempt < attempts:
+            time.sleep(2 ** (attempt - 1))
+    return False
@@ -0,0 +1,78 @@
+import re
+from typing import Iterable, List, Pattern
+
+
+def merge_patterns(patterns: Iterable[str]) -> Pattern:
+    """
+    Compile several regexes into a single alternation that matches
+    wherever any of them would.
+
+    A leading inline (?i) only applies to its own pattern, so it is turned
+    into a scoped (?i:...) group; patterns without it stay case-sensitive.
+    """
+    parts = []
+    for pattern in patterns:
+        if pattern.startswith('(?i)'):
+            parts.append(f"(?i:{pattern[4:]})")
+        else:
+            parts.append(f"(?:{pattern})")
+    return re.compile('|'.join(parts))
+
+
+def merge_keywords(keywords: Iterable[str]) -> Pattern:
+    """Compile literal substrings into one alternation"""
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+
+class LineRules:
+    """
+    Line classification rules for item extraction, compiled once.
+
+    The per-line checks used to run a keyword scan, eleven skip regexes,
+    up to four item regexes and five name regexes, each looked up through
+    the re cache on every call. Here the keyword and regex lists are each
+    merged into one alternation, and lines that can't end in a price are
+    rejected before any item pattern runs.
+
+    The item patterns stay separate and are tried in order: when one
+    matches but its name or price fails validation the next one gets a
+    go, which a single alternation can't express.
+    """
+
+    # "2 Item Name $10.50" or "2x Item Name $10.50"
+    QUANTITY_FIRST = re.compile(r'^(\d+)\s*[xX]?\s+(.+?)\s+\$?\s*(\d+\.?\d{0,2})\s*$')
+    # "Item Name 2 @ $5.25"
+    UNIT_PRICE = re.compile(r'^(.+?)\s+(\d+)\s*@\s*\$?\s*(\d+\.?\d{0,2})\s*$')
+    # "Item Name $12.99"
+    PRICE_ONLY = re.compile(r'^(.+?)\s+\$?\s*(\d+\.\d{2})\s*$')
+    # "Item Name x2 $10.00"
+    QUANTITY_AFTER = re.compile(r'^(.+?)\s*[xX]\s*(\d+)\s+\$?\s*(\d+\.?\d{0,2})\s*$')
+
+    def __init__(self, skip_keywords: List[str], skip_patterns: List[str],
+                 invalid_name_patterns: List[str]):
+        """
+        Args:
+            skip_keywords: lower-case substrings that rule a line out
+            skip_patterns: regexes that rule a line out
+            invalid_name_patterns: regexes that rule out an item name
+        """
+        self._skip_keywords = merge_keywords(skip_keywords)
+        self._skip = merge_patterns(skip_patterns)
+        self._invalid_name = merge_patterns(invalid_name_patterns)
+
+    def is_skipped(self, line: str) -> bool:
+        """True for headers, footers, totals and other lines that aren't items"""
+        return (self._skip_keywords.search(line.lower()) is not None or
+                self._skip.search(line) is not None)
+
+    @staticmethod
+    def may_have_price(line: str) -> bool:
+        """
+        Cheap prefilter: every item pattern ends in a number, so a stripped
+        line must end with a digit or a decimal point to be an item.
+        """
+        return bool(line) and (line[-1].isdigit() or line[-1] == '.')
+
+    def is_invalid_name(self, name: str) -> bool:
+        """True for addresses, contact details, opening hours and staff names"""
+        return self._invalid_name.search(name) is not None
@@ -1,15 +1,31 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+import asyncio
 import logging
 import time
-from typing import Optional, List, Dict, Any
-import base64
+from typing import Optional, List, Dict, Any, BinaryIO, Callable, Set, Tuple
+from contextlib import ExitStack
 import io
-from PIL import Image
+import json
+import zipfile
 import os
 
-from receipt_processor import ReceiptProcessor
+try:
+    import orjson
+except ImportError:  # Optional; responses fall back to the standard json encoder
+    orjson = None
+
+from service_config import probe_processor_from_env, processor_from_env
+from worker_pool import ProcessorWorkerPool, WorkerUnavailableError
+from ocr_pool import OCRWorkerPool, PoolSaturatedError
+from job_queue import Job, JobQueue, QueueFullError, post_webhook
+from image_ingest import InvalidImageError, decode_base64_image, msgpack, unpack_image_envelope
+from upload_limits import BodySizeLimitMiddleware, ImageTooLargeError, check_pixel_count, upload_buffer
+from response_compression import CompressionMiddleware
+import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -25,7 +41,25 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
+# /process, /process-file and /jobs bodies over OCR_MAX_UPLOAD_MB are refused
+# with 413 while they stream in, and images whose header declares more than
+# OCR_MAX_UPLOAD_PIXELS pixels are refused before they are decoded.
+# /process-batch bodies, and the images unpacked from their archives, are
+# capped at OCR_BATCH_MAX_MB in total and OCR_MAX_UPLOAD_MB per image
+MAX_UPLOAD_BYTES = int(float(os.getenv("OCR_MAX_UPLOAD_MB", 20)) * 1024 * 1024)
+MAX_UPLOAD_PIXELS = int(os.getenv("OCR_MAX_UPLOAD_PIXELS", 50_000_000))
+BATCH_MAX_BYTES = int(float(os.getenv("OCR_BATCH_MAX_MB", 200)) * 1024 * 1024)
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, paths=["/process", "/process-file", "/jobs"])
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=BATCH_MAX_BYTES, paths=["/process-batch"])
+
+# Responses of at least OCR_COMPRESS_MIN_BYTES are compressed, with brotli
+# when the brotli package is installed and the client accepts it, else gzip
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("OCR_COMPRESS_MIN_BYTES", 1024)))
+
+# OCR results are serialized with orjson when it is installed
+OCRResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+# Add CORS middleware (added last so it also covers the size limit's 413s)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Configure this properly for production
@@ -34,13 +68,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the receipt processor
-processor = ReceiptProcessor()
+# With OCR_WORKER_PROCESSES set, receipts run in long-lived worker processes
+# that each build and warm up their own processor before taking work, and
+# are replaced after OCR_WORKER_MAX_TASKS receipts or once their memory
+# passes OCR_WORKER_MAX_RSS_MB. Otherwise they run in this process, which
+# warms up at startup (OCR_WARM_UP)
+WORKER_PROCESSES = int(os.getenv("OCR_WORKER_PROCESSES", 0))
+WARM_UP = os.getenv("OCR_WARM_UP", "true").lower() == "true"
+worker_pool = None
+if WORKER_PROCESSES > 0:
+    worker_pool = ProcessorWorkerPool(
+        size=WORKER_PROCESSES,
+        factory=processor_from_env,
+        max_tasks=int(os.getenv("OCR_WORKER_MAX_TASKS", 500)),
+        max_rss_mb=int(os.getenv("OCR_WORKER_MAX_RSS_MB", 1024)),
+        warm_up=WARM_UP,
+        acquire_timeout=float(os.getenv("OCR_WORKER_ACQUIRE_TIMEOUT", 60))
+    )
+
+# Initialize the receipt processor from the OCR_* environment. With worker
+# processes it only answers health checks and categories, so it is built
+# without the result cache, duplicate index and strategy stats, which live
+# in the workers
+processor = processor_from_env() if worker_pool is None else probe_processor_from_env()
+
+# OCR is CPU-heavy and blocking, so it runs on a bounded worker pool
+# instead of the event loop; excess requests are turned away with 503
+ocr_pool = OCRWorkerPool(
+    max_in_flight=int(os.getenv("OCR_MAX_IN_FLIGHT", WORKER_PROCESSES or os.cpu_count() or 1)),
+    max_queue=int(os.getenv("OCR_MAX_QUEUE", 16))
+)
+metrics.bind_pool(ocr_pool)
+
+# Upper bound on receipts accepted in one /process-batch request
+BATCH_MAX_ITEMS = int(os.getenv("OCR_BATCH_MAX_ITEMS", 500))
+
+# Files the service writes for itself (the job queue) live under OCR_DATA_DIR
+DATA_DIR = os.getenv("OCR_DATA_DIR", "data")
+
+# Asynchronous jobs: POST /jobs queues work in a local SQLite file and
+# returns straight away; background workers run it and GET /jobs/{id}
+# reports the outcome. Finished jobs older than OCR_JOBS_RETENTION_SECONDS
+# are purged every OCR_JOBS_PURGE_INTERVAL_SECONDS
+job_queue = JobQueue(
+    path=os.getenv("OCR_JOBS_DB") or os.path.join(DATA_DIR, "ocr_jobs.sqlite3"),
+    max_queued=int(os.getenv("OCR_JOBS_MAX_QUEUED", 1000)),
+    lease_seconds=float(os.getenv("OCR_JOBS_LEASE_SECONDS", 600))
+)
+JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", 2))
+JOB_POLL_SECONDS = float(os.getenv("OCR_JOBS_POLL_SECONDS", 1.0))
+JOB_RETENTION_SECONDS = float(os.getenv("OCR_JOBS_RETENTION_SECONDS", 7 * 24 * 3600))
+JOB_PURGE_INTERVAL_SECONDS = float(os.getenv("OCR_JOBS_PURGE_INTERVAL_SECONDS", 3600))
+last_job_purge: Optional[float] = None
+job_workers: List[asyncio.Task] = []
+job_wakeup: Optional[asyncio.Event] = None
 
 # Pydantic models for request/response
-class ImageProcessRequest(BaseModel):
-    image: str  # base64 encoded image
+class ProcessOptions(BaseModel):
     enhance_quality: Optional[bool] = True
+    include_timings: Optional[bool] = False  # add the per-stage breakdown to the response
+
+class ImageProcessRequest(ProcessOptions):
+    image: str  # base64 encoded image
     
 class ProcessingResult(BaseModel):
     success: bool
@@ -54,6 +143,29 @@ class ProcessingResult(BaseModel):
     suggested_category: Optional[str]
     confidence_breakdown: Dict[str, float]
     error_message: Optional[str] = None
+    queue_wait_ms: Optional[int] = None
+    queue_depth: Optional[int] = None
+    cache_status: Optional[str] = None
+    duplicate: Optional[Dict[str, Any]] = None
+    image_normalization: Optional[Dict[str, Any]] = None
+    stage_timings: Optional[List[Dict[str, Any]]] = None
+
+class JobRequest(ImageProcessRequest):
+    webhook_url: Optional[str] = None  # receives the finished job as a JSON POST
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, done or failed
+    attempts: int
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[ProcessingResult] = None
+    error: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -61,12 +173,87 @@ class HealthResponse(BaseModel):
     version: str
     tesseract_available: bool
 
+def run_receipt(image_data: bytes, enhance_quality: bool = True) -> Dict[str, Any]:
+    """Process one receipt on a warm worker process if the pool is enabled, else in this process"""
+    if worker_pool is not None:
+        # Memory-mapped uploads can't be pickled to another process
+        return worker_pool.process_receipt(bytes(image_data), enhance_quality)
+    return processor.process_receipt(image_data, enhance_quality)
+
+def build_processing_result(result: Dict[str, Any], processing_time: int,
+                            queue_stats: Dict[str, int], include_timings: bool = False) -> ProcessingResult:
+    """Turn a ReceiptProcessor result into the API response model"""
+    return ProcessingResult(
+        success=result.get('success', True),
+        processing_time_ms=processing_time,
+        confidence_score=result.get('overall_confidence', 0.0),
+        extracted_text=result.get('extracted_text', ''),
+        store_name=result.get('store_name'),
+        total_amount=result.get('total_amount'),
+        purchase_date=result.get('purchase_date'),
+        items=result.get('items', []),
+        suggested_category=result.get('suggested_category'),
+        confidence_breakdown=result.get('confidence_breakdown', {}),
+        error_message=result.get('error_message'),
+        queue_wait_ms=queue_stats['queue_wait_ms'],
+        queue_depth=queue_stats['queue_depth'],
+        cache_status=result.get('cache_status'),
+        duplicate=result.get('duplicate'),
+        image_normalization=result.get('image_normalization'),
+        stage_timings=result.get('stage_timings') if include_timings else None
+    )
+
+def encode_json(content: Any) -> bytes:
+    """Serialize content with orjson when it is installed, else the standard library"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content).encode("utf-8")
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """
+    Fields named in a comma-separated ?fields= list, plus success and
+    error_message so a failure can't be mistaken for a missing value.
+    None (no projection) when the list is empty.
+    """
+    if not fields:
+        return None
+    
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(ProcessingResult.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested | {"success", "error_message"}
+
+def render_result(response: ProcessingResult, fields: Optional[Set[str]] = None) -> Response:
+    """
+    Serialize a ProcessingResult, projected onto fields if given. The model
+    was validated when it was built, so it is dumped straight to the
+    response instead of being validated a second time by FastAPI.
+    """
+    return OCRResponse(response.model_dump(include=fields))
+
+def build_error_result(error_message: str, processing_time: int) -> ProcessingResult:
+    """API response for a receipt that could not be processed"""
+    return ProcessingResult(
+        success=False,
+        processing_time_ms=processing_time,
+        confidence_score=0.0,
+        extracted_text="",
+        store_name=None,
+        total_amount=None,
+        purchase_date=None,
+        items=[],
+        suggested_category=None,
+        confidence_breakdown={},
+        error_message=error_message
+    )
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint with Tesseract availability check"""
     try:
-        # Test if Tesseract is available
-        tesseract_available = processor.test_tesseract()
+        # Test if Tesseract is available (spawns a process, so keep it off the loop)
+        tesseract_available = await asyncio.to_thread(processor.test_tesseract)
         
         return HealthResponse(
             status="healthy",
@@ -78,64 +265,129 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=500, detail=f"Service unhealthy: {str(e)}")
 
-@app.post("/process", response_model=ProcessingResult)
-async def process_receipt(request: ImageProcessRequest):
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+PROCESS_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": ImageProcessRequest.model_json_schema()},
+        "image/*": {"schema": {"type": "string", "format": "binary"}},
+        "application/msgpack": {"schema": {
+            "type": "object",
+            "required": ["image"],
+            "properties": {"image": {"type": "string", "format": "binary"},
+                           **ProcessOptions.model_json_schema()["properties"]},
+        }},
+    },
+}
+
+@app.post("/process", response_model=ProcessingResult, response_class=OCRResponse,
+          openapi_extra={"requestBody": PROCESS_REQUEST_BODY})
+async def process_receipt(request: Request, enhance_quality: bool = True, include_timings: bool = False,
+                          fields: Optional[str] = None):
     """
     Process a receipt image and extract structured data
     
+    The image can be sent three ways, chosen by Content-Type:
+    - application/json: ImageProcessRequest with the image base64 encoded
+    - image/*: the raw image bytes as the body, options in the query string
+    - application/msgpack: a map with the raw bytes under 'image' and the
+      options beside it, so no base64 is needed
+    
     Args:
-        request: ImageProcessRequest containing base64 encoded image
+        request: the incoming request, read according to its Content-Type
+        enhance_quality: option for raw image bodies
+        include_timings: option for raw image bodies
+        fields: comma-separated ProcessingResult fields to return, e.g.
+            fields=total_amount,store_name (default: all of them)
         
     Returns:
         ProcessingResult with extracted data and confidence scores
     """
     start_time = time.time()
+    logger.info("Starting receipt processing")
+    projection = parse_fields(fields)
+    
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    body = await request.body()
     
     try:
-        logger.info("Starting receipt processing")
+        if content_type.startswith("image/"):
+            # Raw bytes, nothing to parse or decode
+            image_data = body
+            options = ProcessOptions(enhance_quality=enhance_quality, include_timings=include_timings)
+        elif content_type in MSGPACK_TYPES:
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="MessagePack bodies need the msgpack package")
+            image_data, envelope = unpack_image_envelope(body)
+            options = ProcessOptions.model_validate(envelope)
+        elif content_type in ("application/json", ""):
+            # Validated straight from the JSON text, then base64 decoded (data URLs are accepted too)
+            options = ImageProcessRequest.model_validate_json(body)
+            image_data = decode_base64_image(options.image)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {content_type}")
         
-        # Decode base64 image
+        check_pixel_count(io.BytesIO(image_data), MAX_UPLOAD_PIXELS)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except ImageTooLargeError as e:
+        logger.warning(f"Rejected oversized image: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImageError as e:
+        logger.error(f"Failed to decode image: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = await process_image_bytes(image_data, options.enhance_quality, start_time,
+                                         include_timings=options.include_timings, endpoint="/process")
+    return render_result(response, projection)
+
+async def process_image_bytes(image_data: bytes, enhance_quality: bool, start_time: float,
+                              include_timings: bool = False, endpoint: str = "/process",
+                              on_done: Optional[Callable[[], None]] = None) -> ProcessingResult:
+    """
+    Run raw image bytes through the OCR pool and build the response
+    
+    The bytes are decoded exactly once, inside the processor, after the
+    result cache has had a chance to answer without decoding at all.
+    on_done is called once the worker has finished with image_data, which
+    can be after this coroutine is cancelled.
+    """
+    try:
+        # Process the receipt on the worker pool
         try:
-            # Handle data URL format (data:image/jpeg;base64,...)
-            if request.image.startswith('data:image'):
-                header, encoded = request.image.split(',', 1)
-                image_data = base64.b64decode(encoded)
-            else:
-                image_data = base64.b64decode(request.image)
-                
-            # Validate image
-            try:
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()  # Verify it's a valid image
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
-                
-        except Exception as e:
-            logger.error(f"Failed to decode image: {e}")
-            raise HTTPException(status_code=400, detail=f"Invalid base64 image: {str(e)}")
+            result, queue_stats = await ocr_pool.run(
+                run_receipt,
+                image_data, 
+                enhance_quality=enhance_quality,
+                on_done=on_done
+            )
+        except PoolSaturatedError as e:
+            logger.warning(f"Rejecting receipt, OCR pool saturated: {ocr_pool.stats()}")
+            metrics.FAILURES.labels('pool_saturated').inc()
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except WorkerUnavailableError as e:
+            logger.error(f"Rejecting receipt: {e} ({worker_pool.stats()})")
+            metrics.FAILURES.labels('worker_unavailable').inc()
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(ocr_pool.retry_after())}
+            )
         
-        # Process the receipt
-        result = processor.process_receipt(
-            image_data, 
-            enhance_quality=request.enhance_quality
-        )
+        metrics.observe_result(result, endpoint, time.time() - start_time)
+        
+        if result.get('error_type') == 'invalid_image':
+            raise HTTPException(status_code=400, detail=result['error_message'])
         
         processing_time = int((time.time() - start_time) * 1000)
         
         # Build response
-        response = ProcessingResult(
-            success=result.get('success', True),
-            processing_time_ms=processing_time,
-            confidence_score=result.get('overall_confidence', 0.0),
-            extracted_text=result.get('extracted_text', ''),
-            store_name=result.get('store_name'),
-            total_amount=result.get('total_amount'),
-            purchase_date=result.get('purchase_date'),
-            items=result.get('items', []),
-            suggested_category=result.get('suggested_category'),
-            confidence_breakdown=result.get('confidence_breakdown', {}),
-            error_message=result.get('error_message')
-        )
+        response = build_processing_result(result, processing_time, queue_stats, include_timings)
         
         logger.info(f"Processing completed in {processing_time}ms with confidence {response.confidence_score}")
         return response
@@ -146,41 +398,291 @@ async def process_receipt(request: ImageProcessRequest):
     except Exception as e:
         processing_time = int((time.time() - start_time) * 1000)
         logger.error(f"Unexpected error processing receipt: {e}", exc_info=True)
+        metrics.FAILURES.labels('exception').inc()
         
-        return ProcessingResult(
-            success=False,
-            processing_time_ms=processing_time,
-            confidence_score=0.0,
-            extracted_text="",
-            store_name=None,
-            total_amount=None,
-            purchase_date=None,
-            items=[],
-            suggested_category=None,
-            confidence_breakdown={},
-            error_message=str(e)
-        )
+        return build_error_result(str(e), processing_time)
 
-@app.post("/process-file")
-async def process_receipt_file(file: UploadFile = File(...)):
+@app.post("/process-file", response_model=ProcessingResult, response_class=OCRResponse)
+async def process_receipt_file(file: UploadFile = File(...), include_timings: bool = Form(False)):
     """
     Alternative endpoint for direct file upload
     """
+    start_time = time.time()
     try:
-        # Read the uploaded file
-        contents = await file.read()
-        
-        # Convert to base64
-        base64_image = base64.b64encode(contents).decode('utf-8')
+        # Starlette has already spooled the body in chunks, in memory up to
+        # 1 MB and to a temp file beyond that; it is never read back into
+        # one bytes object, and the size is checked again in case the
+        # middleware's limit was raised
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        check_pixel_count(file.file, MAX_UPLOAD_PIXELS)
         
-        # Process using the main endpoint logic
-        request = ImageProcessRequest(image=base64_image)
-        return await process_receipt(request)
+        # The uploaded bytes go straight to the processor, no base64 round
+        # trip. A client that disconnects cancels this handler but not the
+        # worker thread, so the buffer is released by the pool once the
+        # thread is done with it rather than when the handler exits
+        buffer = ExitStack()
+        image_data = buffer.enter_context(upload_buffer(file.file))
+        response = await process_image_bytes(image_data, True, start_time,
+                                             include_timings=include_timings, endpoint="/process-file",
+                                             on_done=buffer.close)
+        return render_result(response)
         
+    except ImageTooLargeError as e:
+        logger.warning(f"Rejected oversized upload: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing uploaded file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Images barely compress, so a zip entry that expands far beyond its
+# compressed size is a zip bomb rather than a receipt
+MAX_COMPRESSION_RATIO = 100
+
+def expand_batch_upload(filename: str, upload: BinaryIO, max_bytes: int) -> List[Tuple[str, bytes]]:
+    """
+    Split an uploaded file into (name, image bytes) items; zip archives
+    yield one item per entry.
+    
+    Raises ImageTooLargeError, before anything is read or unpacked, if a
+    plain file or archive entry is over MAX_UPLOAD_BYTES, an entry is over
+    MAX_COMPRESSION_RATIO, or the items would come to more than max_bytes.
+    """
+    upload.seek(0)
+    if not zipfile.is_zipfile(upload):
+        size = upload.seek(0, os.SEEK_END)
+        if size > MAX_UPLOAD_BYTES:
+            raise ImageTooLargeError(f"{filename} exceeds {MAX_UPLOAD_BYTES} bytes")
+        if size > max_bytes:
+            raise ImageTooLargeError(f"Batch exceeds its remaining {max_bytes} bytes")
+        upload.seek(0)
+        return [(filename, upload.read())]
+    
+    with zipfile.ZipFile(upload) as archive:
+        entries = [entry for entry in archive.infolist()
+                   if not entry.is_dir() and not os.path.basename(entry.filename).startswith('.')]
+        
+        # Declared sizes are checked up front; zipfile never unpacks more
+        # than an entry declares, so they also bound what is read
+        for entry in entries:
+            if entry.file_size > MAX_UPLOAD_BYTES:
+                raise ImageTooLargeError(f"{filename}/{entry.filename} exceeds {MAX_UPLOAD_BYTES} bytes")
+            if entry.file_size > MAX_COMPRESSION_RATIO * max(entry.compress_size, 1):
+                raise ImageTooLargeError(f"{filename}/{entry.filename} has a suspicious compression ratio")
+        if sum(entry.file_size for entry in entries) > max_bytes:
+            raise ImageTooLargeError(f"Batch exceeds its remaining {max_bytes} bytes once unpacked")
+        
+        return [(f"{filename}/{entry.filename}", archive.read(entry)) for entry in entries]
+
+async def process_batch_item(index: int, filename: str, image_data: bytes,
+                             enhance_quality: bool, slots: asyncio.Semaphore) -> Dict[str, Any]:
+    """Process one batch entry; failures are reported in the item instead of raised"""
+    start_time = time.time()
+    async with slots:
+        try:
+            check_pixel_count(io.BytesIO(image_data), MAX_UPLOAD_PIXELS)
+            result, queue_stats = await ocr_pool.run(
+                run_receipt,
+                image_data,
+                enhance_quality=enhance_quality,
+                reject_when_full=False
+            )
+            metrics.observe_result(result, "/process-batch", time.time() - start_time)
+            response = build_processing_result(result, int((time.time() - start_time) * 1000), queue_stats)
+        except Exception as e:
+            logger.warning(f"Batch item {index} ({filename}) failed: {e}")
+            metrics.FAILURES.labels('exception').inc()
+            response = build_error_result(str(e), int((time.time() - start_time) * 1000))
+    
+    return {"index": index, "filename": filename, **response.model_dump()}
+
+@app.post("/process-batch")
+async def process_receipt_batch(files: List[UploadFile] = File(...),
+                                enhance_quality: bool = Form(True)):
+    """
+    Process many receipts in one request
+    
+    Accepts image files and/or zip archives of images as multipart uploads
+    and streams one ProcessingResult per receipt as NDJSON, in completion
+    order. Each line carries the item's index and filename; a failed item
+    is reported with success=false without stopping the rest of the batch.
+    """
+    if ocr_pool.is_saturated():
+        retry_after = ocr_pool.retry_after()
+        raise HTTPException(
+            status_code=503,
+            detail=f"OCR service is busy, retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
+    items = []
+    remaining = BATCH_MAX_BYTES
+    for upload in files:
+        # Archives are read from Starlette's spooled file, entry by entry
+        try:
+            expanded = await asyncio.to_thread(expand_batch_upload, upload.filename or 'upload',
+                                               upload.file, remaining)
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Invalid archive {upload.filename}: {str(e)}")
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        items.extend(expanded)
+        remaining -= sum(len(image_data) for _, image_data in expanded)
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="No images in batch")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} images")
+    
+    logger.info(f"Starting batch of {len(items)} receipts")
+    
+    # A batch never holds more waiting jobs than the pool has workers, so
+    # single /process requests can still get into the queue
+    slots = asyncio.Semaphore(ocr_pool.max_in_flight)
+    
+    async def stream_results():
+        tasks = [
+            asyncio.ensure_future(process_batch_item(index, filename, image_data, enhance_quality, slots))
+            for index, (filename, image_data) in enumerate(items)
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield encode_json(await next_result) + b"\n"
+        finally:
+            # Client went away: drop the receipts that have not started
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/jobs", response_model=JobSubmitted, status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queue a receipt for processing and return its job id straight away
+    
+    Poll GET /jobs/{job_id} for the result, or pass webhook_url to have
+    the finished job POSTed to it.
+    """
+    try:
+        image_data = decode_base64_image(request.image)
+        check_pixel_count(io.BytesIO(image_data), MAX_UPLOAD_PIXELS)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if request.webhook_url and not request.webhook_url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="webhook_url must be an http(s) URL")
+    
+    options = {"enhance_quality": request.enhance_quality, "include_timings": request.include_timings}
+    try:
+        job_id = await asyncio.to_thread(job_queue.submit, image_data, options, request.webhook_url)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    if job_wakeup is not None:
+        job_wakeup.set()
+    logger.info(f"Queued job {job_id}")
+    return JobSubmitted(job_id=job_id, status="queued")
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Status of a queued job, with its ProcessingResult once done
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+async def run_job(job: Job):
+    """
+    Process one claimed job, store the outcome and notify its webhook
+    
+    Whatever the processor returns, including a receipt with no readable
+    text, is stored as 'done' with the result; 'failed' is kept for jobs
+    that raised.
+    """
+    start_time = time.time()
+    lease = asyncio.ensure_future(renew_job_lease(job))
+    try:
+        result, queue_stats = await ocr_pool.run(
+            run_receipt,
+            job.image,
+            enhance_quality=job.options.get("enhance_quality", True),
+            reject_when_full=False
+        )
+        metrics.observe_result(result, "/jobs", time.time() - start_time)
+        
+        response = build_processing_result(result, int((time.time() - start_time) * 1000), queue_stats,
+                                           job.options.get("include_timings", False))
+        await asyncio.to_thread(job_queue.complete, job.id, response.model_dump())
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+        metrics.FAILURES.labels('exception').inc()
+        await asyncio.to_thread(job_queue.fail, job.id, str(e))
+    finally:
+        lease.cancel()
+    
+    if job.webhook_url:
+        payload = await asyncio.to_thread(job_queue.get, job.id)
+        await asyncio.to_thread(post_webhook, job.webhook_url, payload)
+
+async def renew_job_lease(job: Job):
+    """
+    Renew a running job's lease every third of OCR_JOBS_LEASE_SECONDS, so
+    a job that runs longer than the lease isn't claimed by another worker;
+    only a job whose process died stops being renewed
+    """
+    while True:
+        await asyncio.sleep(job_queue.lease_seconds / 3)
+        try:
+            if not await asyncio.to_thread(job_queue.renew, job):
+                logger.warning(f"Lease on job {job.id} expired before it could be renewed")
+                return
+        except Exception as e:
+            logger.error(f"Failed to renew lease on job {job.id}: {e}")
+
+async def purge_finished_jobs():
+    """Drop finished jobs past their retention, at most once per purge interval"""
+    global last_job_purge
+    now = time.monotonic()
+    if last_job_purge is not None and now - last_job_purge < JOB_PURGE_INTERVAL_SECONDS:
+        return
+    last_job_purge = now
+    
+    try:
+        purged = await asyncio.to_thread(job_queue.purge, JOB_RETENTION_SECONDS)
+    except Exception as e:
+        logger.error(f"Failed to purge finished jobs: {e}")
+        return
+    if purged:
+        logger.info(f"Purged {purged} finished jobs")
+
+async def job_worker():
+    """Claim and run queued jobs, purging old finished ones, until cancelled"""
+    while True:
+        await purge_finished_jobs()
+        try:
+            job = await asyncio.to_thread(job_queue.claim)
+        except Exception as e:
+            logger.error(f"Failed to claim job: {e}")
+            job = None
+        
+        if job is None:
+            # Woken early by a submit in this process; other processes'
+            # submits are picked up on the next poll
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            job_wakeup.clear()
+            continue
+        
+        await run_job(job)
+
 @app.get("/categories")
 async def get_suggested_categories():
     """
@@ -190,6 +692,59 @@ async def get_suggested_categories():
         "categories": processor.get_available_categories()
     }
 
+@app.get("/stats")
+async def get_service_stats():
+    """
+    Worker pool, result cache and OCR strategy statistics
+    
+    With worker processes, each worker's cache, duplicate index and strategy
+    figures (as of its latest receipt) are listed under
+    worker_processes.processors instead.
+    """
+    return {
+        "ocr_pool": ocr_pool.stats(),
+        "worker_processes": worker_pool.stats() if worker_pool is not None else None,
+        **(processor.stats() if worker_pool is None else {}),
+        "jobs": await asyncio.to_thread(job_queue.stats)
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics: per-stage and per-OCR-run latency histograms,
+    winning strategy and failure counters, in-flight and queue gauges
+    """
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+@app.on_event("startup")
+async def warm_up_processing():
+    # Worker processes warm up in the background and take requests as they
+    # become ready; in-process OCR warms up before the first request
+    if worker_pool is not None:
+        worker_pool.start()
+    elif WARM_UP:
+        seconds = await asyncio.to_thread(processor.warm_up)
+        logger.info(f"OCR warm-up took {seconds * 1000:.0f}ms")
+
+@app.on_event("startup")
+async def start_job_workers():
+    global job_wakeup
+    job_wakeup = asyncio.Event()
+    for _ in range(JOB_WORKERS):
+        job_workers.append(asyncio.create_task(job_worker()))
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    # Jobs cut off here are still 'running' and are retried once their lease expires
+    for worker in job_workers:
+        worker.cancel()
+    job_workers.clear()
+    ocr_pool.shutdown()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+    processor.close()
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,88 @@
+import os
+from typing import Any, Dict, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# Pipeline stages run from milliseconds (decode, extraction) to tens of
+# seconds (a full OCR grid on a large photo)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_SECONDS = Histogram(
+    'receipt_request_duration_seconds', 'End-to-end receipt processing time',
+    ['endpoint'], buckets=STAGE_BUCKETS)
+STAGE_SECONDS = Histogram(
+    'receipt_stage_duration_seconds', 'Time spent in each pipeline stage per receipt',
+    ['stage'], buckets=STAGE_BUCKETS)
+PREPROCESS_SECONDS = Histogram(
+    'receipt_preprocess_duration_seconds', 'Time per preprocessing method',
+    ['method'], buckets=STAGE_BUCKETS)
+OCR_SECONDS = Histogram(
+    'receipt_ocr_duration_seconds', 'Time per Tesseract invocation',
+    ['method', 'config'], buckets=STAGE_BUCKETS)
+
+WINNING_STRATEGY = Counter(
+    'receipt_winning_strategy_total', 'Receipts by the preprocessing method and OCR config that won',
+    ['method', 'config'])
+FAILURES = Counter(
+    'receipt_failures_total', 'Receipts that could not be processed', ['error_type'])
+CACHE_LOOKUPS = Counter(
+    'receipt_cache_lookups_total', 'Result cache outcomes', ['status'])
+
+# Updated with inc/dec as jobs start and finish, so under
+# PROMETHEUS_MULTIPROC_DIR every uvicorn worker's value is written out and
+# the live processes' values are summed
+IN_FLIGHT = Gauge('receipt_ocr_in_flight', 'Receipts being processed right now',
+                  multiprocess_mode='livesum')
+QUEUE_DEPTH = Gauge('receipt_ocr_queue_depth', 'Receipts waiting for an OCR worker',
+                    multiprocess_mode='livesum')
+
+
+def bind_pool(pool: Any):
+    """Keep the in-flight and queue gauges in step with an OCRWorkerPool"""
+    IN_FLIGHT.inc(pool.in_flight)
+    QUEUE_DEPTH.inc(pool.waiting)
+    pool.in_flight_gauge = IN_FLIGHT
+    pool.queue_gauge = QUEUE_DEPTH
+
+
+def observe_result(result: Dict[str, Any], endpoint: str, seconds: float):
+    """Record one processed receipt: its stage spans, outcome and total time"""
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+
+    # Several spans can share a stage (one per OCR run); the stage histogram
+    # gets their per-receipt total
+    stage_totals: Dict[str, float] = {}
+    for span in result.get('stage_timings') or ():
+        seconds_spent = span['ms'] / 1000
+        stage = span['stage']
+        stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds_spent
+        if stage == 'ocr':
+            OCR_SECONDS.labels(span['method'], span['config']).observe(seconds_spent)
+        elif stage == 'preprocess':
+            PREPROCESS_SECONDS.labels(span['method']).observe(seconds_spent)
+    for stage, total in stage_totals.items():
+        STAGE_SECONDS.labels(stage).observe(total)
+
+    if result.get('cache_status'):
+        CACHE_LOOKUPS.labels(result['cache_status']).inc()
+
+    if result.get('success', True):
+        if result.get('preprocessing_method') and result.get('ocr_config'):
+            WINNING_STRATEGY.labels(result['preprocessing_method'], result['ocr_config']).inc()
+    else:
+        FAILURES.labels(result.get('error_type', 'processing_error')).inc()
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    Exposition payload and content type for /metrics.
+
+    With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so every
+    worker's samples are aggregated.
+    """
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
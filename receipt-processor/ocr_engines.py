@@ -0,0 +1,192 @@
+import os
+import threading
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from word_boxes import WORD_DTYPE, WordBoxes
+
+try:
+    import tesserocr
+except ImportError:  # Optional in-process engine
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+def parse_config(config: str) -> Tuple[int, int]:
+    """Read the --oem and --psm values out of a Tesseract config string"""
+    oem, psm = 3, 3
+    parts = config.split()
+    for flag, value in zip(parts, parts[1:]):
+        if flag == '--oem':
+            oem = int(value)
+        elif flag == '--psm':
+            psm = int(value)
+    return oem, psm
+
+
+class PytesseractEngine:
+    """Runs the tesseract binary through pytesseract (one subprocess per call)"""
+
+    name = 'pytesseract'
+
+    def version(self) -> str:
+        return str(pytesseract.get_tesseract_version())
+
+    def image_to_data(self, image: np.ndarray, config: str) -> WordBoxes:
+        # The raw TSV is parsed with array operations rather than
+        # pytesseract's cell-by-cell Output.DICT conversion
+        return WordBoxes.from_tsv(pytesseract.image_to_data(Image.fromarray(image), config=config))
+
+    def detect_orientation(self, image: np.ndarray) -> Optional[Tuple[int, float]]:
+        """
+        Tesseract orientation detection (needs osd.traineddata).
+
+        Returns the clockwise rotation in degrees that makes the text
+        upright and its confidence, or None when detection isn't possible.
+        """
+        try:
+            osd = pytesseract.image_to_osd(Image.fromarray(image), output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError as e:
+            logger.debug(f"Orientation detection failed: {str(e)}")
+            return None
+        return int(osd['rotate']) % 360, float(osd['orientation_conf'])
+
+
+class TesserocrEngine:
+    """
+    Runs Tesseract in-process through tesserocr.
+
+    Each thread keeps one initialised API per OCR engine mode, so the
+    traineddata is loaded once per worker and reused across calls and
+    requests. Images are handed over as raw pixel buffers, with no image
+    encoding, temp files or TSV parsing.
+
+    The traineddata is read from tessdata_path, or TESSDATA_PREFIX when
+    that isn't given (tesserocr otherwise falls back to the path it was
+    built with). The constructing thread's API is created straight away,
+    so a missing or broken tessdata directory fails at startup rather than
+    on the first receipt.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, lang: str = 'eng', tessdata_path: Optional[str] = None):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed; install it to use the in-process OCR engine")
+        self.lang = lang
+        self.tessdata_path = tessdata_path or os.getenv('TESSDATA_PREFIX')
+        self._local = threading.local()
+        self._get_api(3)
+
+    def version(self) -> str:
+        return tesserocr.tesseract_version().splitlines()[0]
+
+    def _create_api(self, **kwargs) -> 'tesserocr.PyTessBaseAPI':
+        if self.tessdata_path:
+            kwargs['path'] = self.tessdata_path
+        try:
+            return tesserocr.PyTessBaseAPI(**kwargs)
+        except RuntimeError as e:
+            raise RuntimeError(f"Could not load Tesseract model lang={kwargs.get('lang')} "
+                               f"from {self.tessdata_path or 'the default tessdata path'}: {str(e)}")
+
+    def _get_api(self, oem: int) -> 'tesserocr.PyTessBaseAPI':
+        apis = getattr(self._local, 'apis', None)
+        if apis is None:
+            apis = self._local.apis = {}
+
+        if oem not in apis:
+            logger.info(f"Loading Tesseract model lang={self.lang} oem={oem} in {threading.current_thread().name}")
+            apis[oem] = self._create_api(lang=self.lang, oem=oem)
+        return apis[oem]
+
+    def _set_image(self, api: 'tesserocr.PyTessBaseAPI', image: np.ndarray):
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+
+    def detect_orientation(self, image: np.ndarray) -> Optional[Tuple[int, float]]:
+        """
+        Tesseract orientation detection (needs osd.traineddata).
+
+        Returns the clockwise rotation in degrees that makes the text
+        upright and its confidence, or None when detection isn't possible.
+        """
+        try:
+            api = getattr(self._local, 'osd_api', None)
+            if api is None:
+                api = self._local.osd_api = self._create_api(lang='osd', psm=tesserocr.PSM.OSD_ONLY)
+
+            self._set_image(api, image)
+            osd = api.DetectOrientationScript()
+        except RuntimeError as e:
+            logger.debug(f"Orientation detection failed: {str(e)}")
+            return None
+        if not osd:
+            return None
+        return (360 - osd['orient_deg']) % 360, float(osd['orient_conf'])
+
+    def image_to_data(self, image: np.ndarray, config: str) -> WordBoxes:
+        oem, psm = parse_config(config)
+        api = self._get_api(oem)
+        api.SetPageSegMode(psm)
+        self._set_image(api, image)
+        api.Recognize()
+
+        rows = []
+        words = []
+        iterator = api.GetIterator()
+        if iterator is None:
+            return WordBoxes(np.zeros(0, WORD_DTYPE), words)
+
+        RIL = tesserocr.RIL
+        block_num = par_num = line_num = word_num = 0
+
+        for word in tesserocr.iterate_level(iterator, RIL.WORD):
+            if word.IsAtBeginningOf(RIL.BLOCK):
+                block_num, par_num, line_num = block_num + 1, 0, 0
+            if word.IsAtBeginningOf(RIL.PARA):
+                par_num, line_num = par_num + 1, 0
+            if word.IsAtBeginningOf(RIL.TEXTLINE):
+                line_num, word_num = line_num + 1, 0
+            word_num += 1
+
+            try:
+                text = word.GetUTF8Text(RIL.WORD)
+            except RuntimeError:
+                continue
+            bbox = word.BoundingBox(RIL.WORD)
+            if bbox is None:
+                continue
+            left, top, right, bottom = bbox
+
+            rows.append((block_num, par_num, line_num, word_num, left, top,
+                         right - left, bottom - top, int(word.Confidence(RIL.WORD))))
+            words.append(text)
+
+        return WordBoxes(np.array(rows, dtype=WORD_DTYPE), words)
+
+
+ENGINES = {
+    'pytesseract': PytesseractEngine,
+    'tesserocr': TesserocrEngine,
+}
+
+_engines: Dict[str, Any] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name: str):
+    """Return this process's shared engine instance for the given name"""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown OCR engine: {name}")
+
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = ENGINES[name]()
+        return _engines[name]
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when both the worker slots and the wait queue are full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"OCR service is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class OCRWorkerPool:
+    """
+    Runs blocking OCR work off the event loop with bounded concurrency.
+
+    At most max_in_flight jobs run at once and at most max_queue more wait
+    for a slot; anything beyond that is rejected straight away so callers
+    can back off instead of piling up behind the queue.
+
+    in_flight_gauge and queue_gauge, when set (metrics.bind_pool), are
+    kept in step with the in-flight and waiting counts.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                            thread_name_prefix='ocr-request')
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.in_flight_gauge = None
+        self.queue_gauge = None
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._total_service = 0.0
+
+    def is_saturated(self) -> bool:
+        return self.in_flight + self.waiting >= self.max_in_flight + self.max_queue
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until a slot frees up, from the average job time"""
+        average = self._total_service / self.completed if self.completed else 1.0
+        return max(1, math.ceil(average * (self.waiting + 1) / self.max_in_flight))
+
+    async def run(self, fn: Callable[..., Any], *args: Any, reject_when_full: bool = True,
+                  on_done: Optional[Callable[[], None]] = None, **kwargs: Any) -> Tuple[Any, Dict[str, int]]:
+        """
+        Run fn(*args, **kwargs) on a worker thread.
+
+        Returns the function's result and the queue stats for this job
+        (queue_depth seen on arrival and queue_wait_ms spent waiting).
+        Callers that bound their own submissions (batches) can pass
+        reject_when_full=False to wait for a slot instead.
+
+        A caller cancelled mid-job (a client disconnecting, say) can't stop
+        the thread, so the job keeps its slot until the thread is done.
+        on_done, if given, is called once the thread has finished, or as
+        soon as the job is turned away if it never starts; buffers fn reads
+        from must stay open until then, not just until the caller returns.
+        """
+        if reject_when_full and self.is_saturated():
+            self.rejected += 1
+            if on_done is not None:
+                on_done()
+            raise PoolSaturatedError(self.retry_after())
+
+        queue_depth = self.waiting
+        queued_at = time.monotonic()
+        self._add_waiting(1)
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            if on_done is not None:
+                on_done()
+            raise
+        finally:
+            self._add_waiting(-1)
+
+        wait = time.monotonic() - queued_at
+        self._total_wait += wait
+        self._add_in_flight(1)
+        started_at = time.monotonic()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+        except Exception:
+            self._add_in_flight(-1)
+            self.failed += 1
+            self._slots.release()
+            if on_done is not None:
+                on_done()
+            raise
+        future.add_done_callback(lambda done: self._finish(done, started_at, on_done))
+
+        # Shielded, so cancelling the caller doesn't free the slot under a running thread
+        result = await asyncio.shield(future)
+        return result, {'queue_depth': queue_depth, 'queue_wait_ms': int(wait * 1000)}
+
+    def _finish(self, future: asyncio.Future, started_at: float,
+                on_done: Optional[Callable[[], None]] = None):
+        """Free a job's slot once its thread has finished"""
+        self._add_in_flight(-1)
+        self._slots.release()
+        if on_done is not None:
+            on_done()
+        # Retrieving the exception also keeps asyncio from logging it when
+        # the caller was cancelled and never will
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+            self._total_service += time.monotonic() - started_at
+
+    def _add_waiting(self, delta: int):
+        self.waiting += delta
+        if self.queue_gauge is not None:
+            self.queue_gauge.inc(delta)
+
+    def _add_in_flight(self, delta: int):
+        self.in_flight += delta
+        if self.in_flight_gauge is not None:
+            self.in_flight_gauge.inc(delta)
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'avg_queue_wait_ms': int(self._total_wait / finished * 1000) if finished else 0,
+            'avg_processing_ms': int(self._total_service / self.completed * 1000) if self.completed else 0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,15 +1,34 @@
 import cv2
 import numpy as np
 import pytesseract
-from PIL import Image
 import io
 import re
 import json
 import os
 import logging
 import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any, Union
+
+import image_ingest
+import line_rules
+import ocr_engines
+import receipt_text
+import word_boxes
+from ocr_engines import get_engine
+from result_cache import ResultCache
+from duplicate_index import DuplicateIndex, dhash
+from image_ingest import InvalidImageError, decode_image
+from line_rules import LineRules, merge_patterns
+from receipt_text import ReceiptText
+from stage_timer import StageTimer
+from strategy_stats import StrategyStats
+from word_boxes import WordBoxes
+import image_normalization
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -21,10 +40,319 @@ if os.name == 'nt':  # Windows
 elif os.path.exists('/usr/bin/tesseract'):
     pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
 
+# Preprocessing and OCR steps are module-level functions so they can be
+# shipped to a process pool without pickling the ReceiptProcessor itself
+
+def _apply_preprocessing(gray: np.ndarray, method: str) -> Dict[str, Any]:
+    """Apply one enhancement method to a grayscale image, timing it where it runs"""
+    started = time.perf_counter()
+    
+    if method == 'bilateral_otsu':
+        # Bilateral filter + Otsu's threshold
+        bilateral = cv2.bilateralFilter(gray, 11, 17, 17)
+        _, otsu = cv2.threshold(bilateral, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        result = {
+            'image': otsu,
+            'method': 'bilateral_otsu',
+            'description': 'Bilateral filter with Otsu threshold'
+        }
+    
+    elif method == 'clahe':
+        # CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        enhanced = clahe.apply(gray)
+        _, thresh_clahe = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        result = {
+            'image': thresh_clahe,
+            'method': 'clahe',
+            'description': 'CLAHE contrast enhancement'
+        }
+    
+    elif method == 'adaptive_gaussian':
+        # Adaptive threshold with noise reduction
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        adaptive = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                                       cv2.THRESH_BINARY, 11, 2)
+        result = {
+            'image': adaptive,
+            'method': 'adaptive_gaussian',
+            'description': 'Adaptive Gaussian threshold'
+        }
+    
+    else:
+        raise ValueError(f"Unknown preprocessing method: {method}")
+    
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+# Every module whose code shapes a result: OCR, word data, normalization,
+# text parsing and field rules. A new pipeline module belongs here too
+PIPELINE_MODULES = (ocr_engines, word_boxes, image_ingest, image_normalization,
+                    line_rules, receipt_text)
+
+def _source_fingerprint() -> str:
+    """Hash of the OCR and parsing code, so cached results expire whenever the rules change"""
+    digest = hashlib.sha256()
+    for module_path in [__file__] + [module.__file__ for module in PIPELINE_MODULES]:
+        try:
+            with open(module_path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(module_path.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+# What a streamed OCR result keeps once it is no longer the best: enough
+# for selection, timings and strategy stats, none of the text or word data
+_SUMMARY_KEYS = ('method', 'config', 'avg_confidence', 'quality_score', 'combined_score',
+                 'ocr_seconds', 'scoring_seconds')
+
+def _result_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: result[key] for key in _SUMMARY_KEYS if key in result}
+
+def _ocr_image_data(image: np.ndarray, config: str, engine: str) -> Tuple[WordBoxes, float]:
+    """Run Tesseract once and return its word-level data and the seconds it took"""
+    started = time.perf_counter()
+    data = get_engine(engine).image_to_data(image, config)
+    return data, time.perf_counter() - started
+
+def _line_crop(gray: np.ndarray, bbox: List[int]) -> np.ndarray:
+    """
+    Cut a line out of the image. The vertical margin is kept small so the
+    crop doesn't pick up the lines above and below it.
+    """
+    left, top, right, bottom = bbox
+    margin = max(4, (bottom - top) // 4)
+    height, width = gray.shape[:2]
+    return gray[max(0, top - 2):min(height, bottom + 2),
+                max(0, left - margin):min(width, right + margin)]
+
+def _stack_line_crops(crops: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Paste line crops one per row onto a white sheet, a crop's height apart
+    so Tesseract can't join them. Returns the sheet and the y where each
+    crop's band starts, for mapping the lines read back to their crops.
+    """
+    gap = max(crop.shape[0] for crop in crops)
+    tops = [gap]
+    for crop in crops[:-1]:
+        tops.append(tops[-1] + crop.shape[0] + gap)
+    
+    sheet = np.full((tops[-1] + crops[-1].shape[0] + gap, max(crop.shape[1] for crop in crops) + 2 * gap),
+                    255, dtype=np.uint8)
+    for top, crop in zip(tops, crops):
+        sheet[top:top + crop.shape[0], gap:gap + crop.shape[1]] = crop
+    return sheet, np.array(tops) - gap // 2
+
+def _readings_by_band(lines: List[Dict[str, Any]], bands: np.ndarray) -> Dict[int, Tuple[str, float]]:
+    """
+    Text and word-weighted confidence read in each band of a stacked
+    sheet; a crop read as several lines is joined left to right.
+    """
+    parts = {}
+    for line in lines:
+        left, top, _, bottom = line['bbox']
+        band = int(np.searchsorted(bands, (top + bottom) / 2, side='right')) - 1
+        if band >= 0:
+            parts.setdefault(band, []).append((left, line['text'], line['avg_confidence']))
+    
+    readings = {}
+    for band, band_parts in parts.items():
+        band_parts.sort()
+        words = [len(text.split()) for _, text, _ in band_parts]
+        confidence = sum(conf * count for (_, _, conf), count in zip(band_parts, words)) / max(sum(words), 1)
+        readings[band] = (' '.join(text for _, text, _ in band_parts), confidence)
+    return readings
+
 class ReceiptProcessor:
     """Enhanced receipt processing with improved item parsing and tax extraction"""
     
-    def __init__(self):
+    # Different Tesseract configurations to try
+    OCR_CONFIGS = [
+        ('--oem 3 --psm 4', 'single_column'),      # Assume single column
+        ('--oem 3 --psm 6', 'uniform_block'),      # Uniform block of text
+        ('--oem 3 --psm 3', 'automatic'),          # Fully automatic
+        ('--oem 1 --psm 4', 'legacy_single'),      # Legacy engine
+        ('--oem 3 --psm 11', 'sparse_text'),       # Sparse text
+    ]
+    
+    # Configurations used to re-read sheets of stacked line crops in refine mode
+    LINE_OCR_CONFIGS = [
+        ('--oem 3 --psm 6', 'uniform_block'),      # Rows of single lines
+        ('--oem 3 --psm 4', 'single_column'),      # Same, with line finding
+    ]
+    
+    # (method, config) order used by the cascade search, most likely winners first
+    DEFAULT_STRATEGY_ORDER = [
+        ('grayscale', 'single_column'),
+        ('clahe', 'single_column'),
+        ('bilateral_otsu', 'single_column'),
+        ('grayscale', 'uniform_block'),
+        ('adaptive_gaussian', 'single_column'),
+        ('clahe', 'uniform_block'),
+        ('bilateral_otsu', 'uniform_block'),
+        ('adaptive_gaussian', 'uniform_block'),
+        ('grayscale', 'automatic'),
+        ('clahe', 'automatic'),
+        ('bilateral_otsu', 'automatic'),
+        ('adaptive_gaussian', 'automatic'),
+        ('grayscale', 'sparse_text'),
+        ('clahe', 'sparse_text'),
+        ('bilateral_otsu', 'sparse_text'),
+        ('adaptive_gaussian', 'sparse_text'),
+        ('grayscale', 'legacy_single'),
+        ('clahe', 'legacy_single'),
+        ('bilateral_otsu', 'legacy_single'),
+        ('adaptive_gaussian', 'legacy_single'),
+    ]
+    
+    # Enhancement methods applied on top of the grayscale image
+    ENHANCED_METHODS = ['bilateral_otsu', 'clahe', 'adaptive_gaussian']
+    
+    # Field patterns, compiled once. Each entry lists the ReceiptText keywords
+    # a match needs; anchored=False where a match can begin on an earlier
+    # line than its keyword (\s spans newlines).
+    TOTAL_PATTERNS = [
+        # (pattern, confidence, keywords, anchored)
+        (re.compile(r'(?i)(?:total|tot|balance\s+due|amount\s+due)[\s:]*\$?\s*([\d,]+\.?\d{0,2})'), 1.0,
+         ('tot', 'balance', 'amount'), True),
+        (re.compile(r'(?i)(?:grand\s+total|g\.?\s*total)[\s:]*\$?\s*([\d,]+\.?\d{0,2})'), 1.0, ('tot',), False),
+        (re.compile(r'\$\s*([\d,]+\.\d{2})(?=\s*(?:total|tot))'), 0.9, ('tot',), False),
+        (re.compile(r'(?i)(?:pay|due)[\s:]*\$?\s*([\d,]+\.?\d{0,2})'), 0.8, ('pay', 'due'), True),
+        (re.compile(r'(?i)(?:sale|sales)[\s:]*\$?\s*([\d,]+\.?\d{0,2})'), 0.7, ('sale',), True),
+    ]
+    
+    SUBTOTAL_PATTERNS = [
+        (re.compile(r'(?i)(?:subtotal|sub\s*total|sub\s*tot)[\s:]*\$?\s*([\d,]+\.?\d{0,2})'), ('sub',)),
+        (re.compile(r'(?i)(?:total\s+before\s+tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})'), ('tot',)),
+    ]
+    
+    TAX_PATTERNS = [
+        # Standard tax patterns
+        (re.compile(r'(?i)(?:tax|hst|gst|vat|sales\s*tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', re.MULTILINE), 1.0,
+         ('tax', 'hst', 'gst', 'vat', 'sale'), True),
+        (re.compile(r'(?i)(?:tax\s*total|total\s*tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', re.MULTILINE), 1.0,
+         ('tax', 'tot'), True),
+        (re.compile(r'(?i)(?:provincial\s*tax|federal\s*tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', re.MULTILINE), 0.9,
+         ('tax',), False),
+        
+        # Line-by-line tax detection
+        (re.compile(r'(?i)^.*tax.*\$?\s*([\d,]+\.\d{2})\s*$', re.MULTILINE), 0.8, ('tax',), True),
+        
+        # Tax abbreviations
+        (re.compile(r'(?i)(?:tx|st|ft)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', re.MULTILINE), 0.7, ('tx', 'st', 'ft'), True),
+    ]
+    
+    # Date patterns in order of preference, with the separators each needs
+    DATE_PATTERNS = [
+        (re.compile(r'(\d{1,2})[/\-](\d{1,2})[/\-](\d{4})'), 'MDY', '/-'),  # MM/DD/YYYY
+        (re.compile(r'(\d{4})[/\-](\d{1,2})[/\-](\d{1,2})'), 'YMD', '/-'),  # YYYY/MM/DD
+        (re.compile(r'(\d{1,2})[/\-](\d{1,2})[/\-](\d{2})'), 'MDY', '/-'),   # MM/DD/YY
+        (re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})'), 'DMY', '.'),         # DD.MM.YYYY
+        (re.compile(r'([A-Za-z]{3,9})\s+(\d{1,2}),?\s+(\d{4})'), 'MDY', ''),  # Jan 15, 2024
+    ]
+    
+    # Common receipt headers that aren't the store name
+    STORE_NAME_SKIP = merge_patterns([
+        r'^\d+$',  # Just numbers
+        r'^\W+$',  # Just special characters
+        r'(?i)^(receipt|invoice|bill|order)$',
+        r'\d{1,2}[:/\-]\d{1,2}',  # Time patterns
+        r'\d{1,2}[/\-\.]\d{1,2}[/\-\.]\d{2,4}',  # Date patterns
+        r'(?i)(phone|tel|address|street|ave|rd)',  # Contact info
+    ])
+    STORE_NAME_CLEANUP = re.compile(r'[^\w\s\-&\']')
+    
+    def __init__(self, search_mode: str = 'grid',
+                 strategy_order: Optional[List[Tuple[str, str]]] = None,
+                 early_exit_score: float = 100.0,
+                 early_exit_confidence: float = 75.0,
+                 max_ocr_attempts: Optional[int] = None,
+                 ocr_workers: int = 1,
+                 executor_type: str = 'thread',
+                 engine: str = 'pytesseract',
+                 result_cache: Optional[ResultCache] = None,
+                 duplicate_index: Optional[DuplicateIndex] = None,
+                 duplicate_mode: str = 'flag',
+                 normalize_resolution: bool = True,
+                 target_text_height: float = 30.0,
+                 max_pixels: int = 4_000_000,
+                 detect_region: bool = True,
+                 correct_orientation: bool = True,
+                 strategy_stats: Optional[StrategyStats] = None,
+                 refine_confidence: float = 60.0,
+                 refine_max_lines: int = 12):
+        """
+        Args:
+            search_mode: 'grid' runs every preprocessing/config combination,
+                'stream' runs the same combinations building one variant at
+                a time and keeping only the best full result, 'cascade' runs
+                them in ranked order and stops at the first result that
+                clears the early-exit checks, 'refine' runs the top-ranked
+                combination once and re-reads only its low-confidence lines
+            strategy_order: ranked (method, config_name) pairs for cascade mode
+            early_exit_score: minimum combined_score to stop the cascade
+            early_exit_confidence: minimum avg_confidence to stop the cascade
+            max_ocr_attempts: cap on Tesseract runs per receipt (None = no cap)
+            ocr_workers: number of combinations run at the same time
+                (1 = sequential)
+            executor_type: 'thread' or 'process' pool used when ocr_workers > 1
+            engine: 'pytesseract' (tesseract subprocess per call) or
+                'tesserocr' (in-process, model loaded once per worker)
+            result_cache: cache for finished results, keyed by image content
+                and processing settings
+            duplicate_index: perceptual-hash index used to spot re-uploads
+                and re-photographs of receipts seen before
+            duplicate_mode: 'flag' marks near-duplicates in the result,
+                'reuse' returns the stored result without running OCR
+            normalize_resolution: rescale images so text lands near
+                target_text_height pixels before any filtering
+            target_text_height: glyph height (px) the rescale aims for
+            max_pixels: pixel budget enforced by the rescale
+            detect_region: find the receipt outline in photos and
+                perspective-crop to it, falling back to the full frame
+            correct_orientation: turn sideways or upside-down receipts
+                upright and level small skew before any filtering
+            strategy_stats: win-rate telemetry per (method, config); in
+                grid mode, combinations it has pruned are skipped except
+                on exploration rounds
+            refine_confidence: refine mode re-reads lines whose average
+                word confidence is below this
+            refine_max_lines: most lines re-read per receipt, lowest
+                confidence first
+        """
+        if search_mode not in ('grid', 'stream', 'cascade', 'refine'):
+            raise ValueError(f"Unknown search mode: {search_mode}")
+        if executor_type not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor type: {executor_type}")
+        if duplicate_mode not in ('flag', 'reuse'):
+            raise ValueError(f"Unknown duplicate mode: {duplicate_mode}")
+        
+        self.search_mode = search_mode
+        self.strategy_order = list(strategy_order or self.DEFAULT_STRATEGY_ORDER)
+        self.early_exit_score = early_exit_score
+        self.early_exit_confidence = early_exit_confidence
+        self.max_ocr_attempts = max_ocr_attempts
+        self.ocr_workers = max(1, ocr_workers)
+        self.executor_type = executor_type
+        self.engine = engine
+        self.result_cache = result_cache
+        self.duplicate_index = duplicate_index
+        self.duplicate_mode = duplicate_mode
+        self.normalize_resolution = normalize_resolution
+        self.target_text_height = target_text_height
+        self.max_pixels = max_pixels
+        self.detect_region = detect_region
+        self.correct_orientation = correct_orientation
+        self.strategy_stats = strategy_stats
+        self.refine_confidence = refine_confidence
+        self.refine_max_lines = refine_max_lines
+        self._cache_namespace = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        
+        # Fail fast if the engine is unknown or its library is missing
+        get_engine(engine)
+        
         self.categories = [
             'Groceries', 'Restaurants', 'Gas & Fuel', 'Shopping', 
             'Healthcare', 'Entertainment', 'Transportation', 'Other'
@@ -45,42 +373,252 @@ class ReceiptProcessor:
             r'^[\W\s]*$',  # Just special characters
         ]
         
+        # Define what lines to skip (headers, footers, totals, etc.)
+        self.skip_keywords = [
+            'total', 'subtotal', 'tax', 'balance', 'change', 'cash', 'credit', 'debit',
+            'payment', 'thank you', 'receipt', 'invoice', 'cashier', 'server',
+            'visit us', 'store hours', 'customer service', 'phone', 'address',
+            'street', 'avenue', 'road', 'city', 'state', 'zip', 'postal'
+        ]
+        
+        # Skip common non-item patterns
+        self.invalid_name_patterns = [
+            r'(?i)(street|avenue|road|blvd|suite|floor|apt)',
+            r'(?i)(phone|tel|fax|email|www)',
+            r'(?i)(hours|monday|tuesday|wednesday|thursday|friday|saturday|sunday)',
+            r'(?i)(manager|cashier|server|clerk)',
+            r'^\d+$',  # Just a number
+        ]
+        
+        # Compiled once; item extraction runs these on every line
+        self.line_rules = LineRules(self.skip_keywords, self.skip_patterns, self.invalid_name_patterns)
+        
     def test_tesseract(self) -> bool:
         """Test if Tesseract is available and working"""
         try:
-            version = pytesseract.get_tesseract_version()
+            version = get_engine(self.engine).version()
             logger.info(f"Tesseract version: {version}")
             return True
         except Exception as e:
             logger.error(f"Tesseract not available: {e}")
             return False
     
+    def warm_up(self) -> float:
+        """
+        Run a small synthetic receipt through decode, normalization,
+        preprocessing, one OCR pass and extraction, so the first real
+        request doesn't pay for loading OpenCV, the OCR engine and its
+        model. Nothing is cached, indexed or recorded.
+
+        Returns the time taken in seconds.
+        """
+        started = time.perf_counter()
+
+        lines = ['WARM UP STORE', 'COFFEE        $3.50', 'TOTAL         $3.50']
+        image = np.full((40 * (len(lines) + 1), 400), 255, dtype=np.uint8)
+        for i, line in enumerate(lines):
+            cv2.putText(image, line, (10, 40 * (i + 1)), cv2.FONT_HERSHEY_DUPLEX, 0.7, 0, 1, cv2.LINE_AA)
+
+        gray = self.load_grayscale(cv2.imencode('.png', image)[1].tobytes())
+        normalized, _ = self.normalize_image(gray)
+        prep_result = self.build_preprocessed_images(normalized, enhance_quality=True)[0]
+        config, config_name = self.OCR_CONFIGS[0]
+        result = self._run_ocr(prep_result, config, config_name)
+        if result is not None:
+            self.extract_structured_data(result['text'])
+
+        return time.perf_counter() - started
+
+    def _get_executor(self) -> Optional[Executor]:
+        """Lazily create the pool used for parallel preprocessing and OCR"""
+        if self.ocr_workers <= 1:
+            return None
+        
+        with self._executor_lock:
+            if self._executor is None:
+                if self.executor_type == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.ocr_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.ocr_workers,
+                                                        thread_name_prefix='ocr')
+            return self._executor
+    
+    def close(self):
+        """Shut down the worker pool, if one was started, and save strategy stats"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.strategy_stats is not None:
+            self.strategy_stats.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Result cache, duplicate index and strategy statistics"""
+        return {
+            'result_cache': self.result_cache.stats() if self.result_cache is not None else None,
+            'duplicate_index': {'entries': len(self.duplicate_index) if self.duplicate_index is not None else 0},
+            'strategy_stats': self.strategy_stats.stats() if self.strategy_stats is not None else None,
+        }
+    
+    def cache_key(self, image_data: bytes, enhance_quality: bool) -> str:
+        """
+        Content address for a processing result.
+        
+        Covers the image bytes, enhance_quality, the engine and its version,
+        the search settings and a fingerprint of the parsing code.
+        """
+        if self._cache_namespace is None:
+            try:
+                engine_version = get_engine(self.engine).version()
+            except Exception:
+                engine_version = 'unknown'
+            
+            settings = {
+                'code': _source_fingerprint(),
+                'engine': self.engine,
+                'engine_version': engine_version,
+                'search_mode': self.search_mode,
+                'strategy_order': self.strategy_order,
+                'early_exit': [self.early_exit_score, self.early_exit_confidence],
+                'max_ocr_attempts': self.max_ocr_attempts,
+                'ocr_configs': self.OCR_CONFIGS,
+                'normalization': [self.normalize_resolution, self.target_text_height, self.max_pixels],
+                'detect_region': self.detect_region,
+                'correct_orientation': self.correct_orientation,
+                'strategy_pruning': self.strategy_stats.settings() if self.strategy_stats else None,
+                'refinement': [self.refine_confidence, self.refine_max_lines, self.LINE_OCR_CONFIGS],
+            }
+            self._cache_namespace = json.dumps(settings, sort_keys=True).encode('utf-8')
+        
+        digest = hashlib.sha256(self._cache_namespace)
+        digest.update(b'enhance' if enhance_quality else b'plain')
+        digest.update(image_data)
+        return digest.hexdigest()
+    
     def process_receipt(self, image_data: bytes, enhance_quality: bool = True) -> Dict[str, Any]:
         """
         Main entry point for receipt processing
         """
+        if self.result_cache is None:
+            return self._process_receipt(image_data, enhance_quality)
+        
+        # Only successful results are cached; errors are retried next time
+        key = self.cache_key(image_data, enhance_quality)
+        result, cache_status = self.result_cache.get_or_compute(
+            key,
+            lambda: self._process_receipt(image_data, enhance_quality, key),
+            cacheable=lambda result: result.get('success', False)
+        )
+        result['cache_status'] = cache_status
+        if cache_status != 'miss':
+            # Served without running the pipeline; stored spans belong to the original run
+            result['stage_timings'] = []
+        return result
+    
+    def _process_receipt(self, image_data: bytes, enhance_quality: bool,
+                         key: Optional[str] = None) -> Dict[str, Any]:
+        """Run the full pipeline for one image"""
+        timer = StageTimer()
         try:
-            # Preprocess image with multiple strategies
-            preprocessed_images = self.preprocess_image(image_data, enhance_quality)
+            with timer.span('decode'):
+                gray = self.load_grayscale(image_data)
+            
+            # Look for an earlier upload of the same receipt before any OCR runs
+            duplicate = None
+            if self.duplicate_index is not None:
+                with timer.span('duplicate_lookup'):
+                    image_hash = dhash(gray)
+                    match = self.duplicate_index.search(image_hash)
+                if match:
+                    duplicate = {'receipt_key': match.key, 'distance': match.distance}
+                    stored = self._stored_duplicate_result(match.key)
+                    if stored is not None:
+                        logger.info(f"Reusing result of near-duplicate {match.key[:12]} (distance {match.distance})")
+                        stored['duplicate'] = duplicate
+                        stored['stage_timings'] = timer.spans
+                        return stored
+            
+            with timer.span('normalize'):
+                normalized, normalization = self.normalize_image(gray)
+            result = self._run_pipeline(normalized, enhance_quality, timer)
+            result['duplicate'] = duplicate
+            result['image_normalization'] = normalization
+            
+            if self.duplicate_index is not None and duplicate is None and result['success']:
+                self.duplicate_index.add(image_hash, key or self.cache_key(image_data, enhance_quality))
             
-            # Extract text using multiple OCR configurations
-            ocr_results = self.perform_ocr(preprocessed_images)
+        except InvalidImageError as e:
+            logger.warning(f"Rejected receipt image: {e}")
+            result = self._create_error_response(str(e), error_type='invalid_image')
+        except Exception as e:
+            logger.error(f"Error processing receipt: {e}", exc_info=True)
+            result = self._create_error_response(str(e))
+        
+        result['stage_timings'] = timer.spans
+        return result
+    
+    def _stored_duplicate_result(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored result for a near-duplicate, when reuse is enabled and it is still cached"""
+        if self.duplicate_mode != 'reuse' or self.result_cache is None:
+            return None
+        return self.result_cache.peek(key)
+    
+    def _run_pipeline(self, gray: np.ndarray, enhance_quality: bool,
+                      timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        """Preprocess, OCR and parse a grayscale image"""
+        timer = timer or StageTimer()
+        try:
+            if self.search_mode == 'stream':
+                # Variants are built, read and dropped one at a time
+                ocr_results = self._perform_streaming_ocr(gray, enhance_quality, timer)
+            elif self.search_mode == 'refine':
+                # One full pass; only its weak lines are read again
+                ocr_results = self._perform_refined_ocr(gray, enhance_quality, timer)
+            elif self.search_mode == 'cascade':
+                # Variants are built in ranked order, only once a combination needs them
+                variants = {}
+                
+                def variant(method: str) -> Dict[str, Any]:
+                    if method not in variants:
+                        variants[method] = self._build_variant(gray, method, timer)
+                    return variants[method]
+                
+                methods = ['grayscale'] + (self.ENHANCED_METHODS if enhance_quality else [])
+                ocr_results = self._perform_cascade_ocr(methods, variant)
+            else:
+                # Preprocess image with multiple strategies
+                preprocessed_images = self.build_preprocessed_images(gray, enhance_quality)
+                for prep in preprocessed_images:
+                    if 'seconds' in prep:
+                        timer.add('preprocess', prep['seconds'], method=prep['method'])
+                
+                # Extract text using multiple OCR configurations; each result
+                # carries the time its Tesseract call and scoring took
+                ocr_results = self.perform_ocr(preprocessed_images)
+            scoring_seconds = 0.0
+            for result in ocr_results:
+                timer.add('ocr', result['ocr_seconds'], method=result['method'], config=result['config'])
+                scoring_seconds += result['scoring_seconds'] + result.get('extraction_seconds', 0.0)
             
             # Select best OCR result based on confidence
+            started = time.perf_counter()
             best_result = self.select_best_ocr_result(ocr_results)
+            if self.strategy_stats is not None and self.search_mode in ('grid', 'stream'):
+                self.strategy_stats.record(ocr_results, best_result)
+            timer.add('scoring', scoring_seconds + time.perf_counter() - started)
             
             if not best_result['text']:
                 return self._create_error_response("No text could be extracted from the image")
             
-            # Extract structured data with improved parsing
-            extracted_data = self.extract_structured_data(best_result['text'])
-            
-            # Calculate confidence scores
-            confidence_breakdown = self.calculate_confidence_scores(extracted_data, best_result)
-            overall_confidence = sum(confidence_breakdown.values()) / len(confidence_breakdown)
-            
-            # Suggest category
-            suggested_category = self.suggest_category(extracted_data)
+            with timer.span('extraction'):
+                # Extract structured data with improved parsing
+                extracted_data = best_result.get('extracted_data') or self.extract_structured_data(best_result['text'])
+                
+                # Calculate confidence scores
+                confidence_breakdown = self.calculate_confidence_scores(extracted_data, best_result)
+                overall_confidence = sum(confidence_breakdown.values()) / len(confidence_breakdown)
+                
+                # Suggest category
+                suggested_category = self.suggest_category(extracted_data)
             
             return {
                 'success': True,
@@ -95,7 +633,9 @@ class ReceiptProcessor:
                 'overall_confidence': overall_confidence,
                 'confidence_breakdown': confidence_breakdown,
                 'preprocessing_method': best_result['method'],
-                'ocr_config': best_result['config']
+                'ocr_config': best_result['config'],
+                'ocr_attempts': len(ocr_results) + best_result.get('line_ocr_attempts', 0),
+                'refined_lines': best_result.get('refined_lines', 0)
             }
             
         except Exception as e:
@@ -104,18 +644,52 @@ class ReceiptProcessor:
     
     def preprocess_image(self, image_data: bytes, enhance_quality: bool) -> List[Dict[str, Any]]:
         """Apply multiple preprocessing strategies to improve OCR accuracy"""
-        # Load image
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        normalized, _ = self.normalize_image(self.load_grayscale(image_data))
+        return self.build_preprocessed_images(normalized, enhance_quality)
+    
+    def load_grayscale(self, image_data: bytes) -> np.ndarray:
+        """Decode image bytes into the grayscale image every later stage works from"""
+        # Single decode, straight to grayscale; raises InvalidImageError
+        return decode_image(image_data)
+    
+    def normalize_image(self, gray: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Bring a decoded grayscale image to the geometry OCR works best on,
+        once, before the preprocessing variants are built.
+        
+        Returns the normalized image and a report of what was done.
+        """
+        region = None
+        if self.detect_region:
+            # Crop first so background clutter doesn't skew the text-height estimate
+            gray, region = image_normalization.crop_to_receipt(gray)
+        
+        if self.normalize_resolution:
+            normalized, info = image_normalization.normalize_resolution(
+                gray, target_text_height=self.target_text_height, max_pixels=self.max_pixels)
+        else:
+            height, width = gray.shape[:2]
+            normalized, info = gray, {'scale': 1.0, 'original_size': [width, height],
+                                      'normalized_size': [width, height]}
         
-        if image is None:
-            raise ValueError("Failed to decode image")
+        info['region'] = region
         
+        info['orientation'] = None
+        if self.correct_orientation:
+            # Every preprocessing variant and OCR config reuses the upright image
+            engine = get_engine(self.engine)
+            normalized, info['orientation'] = image_normalization.correct_orientation(
+                normalized, detect_osd=engine.detect_orientation)
+            info['normalized_size'] = [normalized.shape[1], normalized.shape[0]]
+        
+        return normalized, info
+    
+    def build_preprocessed_images(self, gray: np.ndarray, enhance_quality: bool) -> List[Dict[str, Any]]:
+        """Build the preprocessing variants of a grayscale image"""
         # Store results from different preprocessing methods
         results = []
         
         # Method 1: Basic grayscale + adaptive threshold
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         results.append({
             'image': gray,
             'method': 'grayscale',
@@ -123,84 +697,362 @@ class ReceiptProcessor:
         })
         
         if enhance_quality:
-            # Method 2: Bilateral filter + Otsu's threshold
-            bilateral = cv2.bilateralFilter(gray, 11, 17, 17)
-            _, otsu = cv2.threshold(bilateral, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            results.append({
-                'image': otsu,
-                'method': 'bilateral_otsu',
-                'description': 'Bilateral filter with Otsu threshold'
-            })
-            
-            # Method 3: CLAHE (Contrast Limited Adaptive Histogram Equalization)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(gray)
-            _, thresh_clahe = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            results.append({
-                'image': thresh_clahe,
-                'method': 'clahe',
-                'description': 'CLAHE contrast enhancement'
-            })
-            
-            # Method 4: Adaptive threshold with noise reduction
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            adaptive = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                           cv2.THRESH_BINARY, 11, 2)
-            results.append({
-                'image': adaptive,
-                'method': 'adaptive_gaussian',
-                'description': 'Adaptive Gaussian threshold'
-            })
+            # OpenCV releases the GIL, so the filters can share a thread pool;
+            # a process pool would only add the cost of copying the image around
+            executor = self._get_executor()
+            if executor is not None and self.executor_type == 'thread':
+                results.extend(executor.map(_apply_preprocessing,
+                                            [gray] * len(self.ENHANCED_METHODS),
+                                            self.ENHANCED_METHODS))
+            else:
+                results.extend(_apply_preprocessing(gray, method) for method in self.ENHANCED_METHODS)
         
         return results
     
     def perform_ocr(self, preprocessed_images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Perform OCR with multiple configurations on preprocessed images"""
+        if self.search_mode == 'cascade':
+            images_by_method = {prep['method']: prep for prep in preprocessed_images}
+            return self._perform_cascade_ocr(list(images_by_method), images_by_method.__getitem__)
+        
+        combinations = [(prep_result, config, config_name)
+                        for prep_result in preprocessed_images
+                        for config, config_name in self.OCR_CONFIGS]
+        combinations = self._limit_combinations(
+            combinations, key=lambda combination: StrategyStats.key(combination[0]['method'], combination[2]))
+        
+        # Results keep grid order, so ties in select_best_ocr_result resolve
+        # the same way whether or not the combinations ran in parallel
+        return [result for result in self._run_ocr_batch(combinations) if result]
+    
+    def _build_variant(self, gray: np.ndarray, method: str, timer: StageTimer) -> Dict[str, Any]:
+        """Build one preprocessing variant, recording its time on the timer"""
+        if method == 'grayscale':
+            return {'image': gray, 'method': 'grayscale', 'description': 'Basic grayscale conversion'}
+        prep_result = _apply_preprocessing(gray, method)
+        timer.add('preprocess', prep_result['seconds'], method=method)
+        return prep_result
+    
+    def _limit_combinations(self, combinations: List[Any], key: Callable[[Any], str]) -> List[Any]:
+        """Drop combinations pruned by the strategy stats, then apply the attempt budget"""
+        if self.strategy_stats is not None:
+            combinations = self.strategy_stats.select(combinations, key=key)
+        if self.max_ocr_attempts is not None:
+            combinations = combinations[:self.max_ocr_attempts]
+        return combinations
+    
+    def _perform_streaming_ocr(self, gray: np.ndarray, enhance_quality: bool,
+                               timer: StageTimer) -> List[Dict[str, Any]]:
+        """
+        Grid search that holds one preprocessing variant at a time.
+        
+        Each variant is built only when its configs are due and dropped
+        once they have run (a variant with every config pruned is never
+        built). Only the running best result keeps its text and word data;
+        the rest are cut down to their scores and timings. Peak memory is
+        about one preprocessed image and a handful of word-data dicts,
+        rather than every variant and all twenty results.
+        
+        Combinations run in grid order and the best is only replaced by a
+        strictly higher score, so the winner is the same as in grid mode.
+        """
+        methods = ['grayscale'] + (self.ENHANCED_METHODS if enhance_quality else [])
+        plan = self._limit_combinations(
+            [(method, config, config_name) for method in methods for config, config_name in self.OCR_CONFIGS],
+            key=lambda step: StrategyStats.key(step[0], step[2]))
+        
         results = []
+        best_index = None
+        for method in methods:
+            steps = [(config, config_name) for step_method, config, config_name in plan if step_method == method]
+            if not steps:
+                continue
+            
+            prep_result = self._build_variant(gray, method, timer)
+            batch = [(prep_result, config, config_name) for config, config_name in steps]
+            for result in self._run_ocr_batch(batch):
+                if not result:
+                    continue
+                if best_index is None or result['combined_score'] > results[best_index]['combined_score']:
+                    if best_index is not None:
+                        results[best_index] = _result_summary(results[best_index])
+                    best_index = len(results)
+                    results.append(result)
+                else:
+                    results.append(_result_summary(result))
+            del prep_result, batch
         
-        # Different Tesseract configurations to try
-        configs = [
-            ('--oem 3 --psm 4', 'single_column'),      # Assume single column
-            ('--oem 3 --psm 6', 'uniform_block'),      # Uniform block of text
-            ('--oem 3 --psm 3', 'automatic'),          # Fully automatic
-            ('--oem 1 --psm 4', 'legacy_single'),      # Legacy engine
-            ('--oem 3 --psm 11', 'sparse_text'),       # Sparse text
-        ]
+        return results
+    
+    def _perform_refined_ocr(self, gray: np.ndarray, enhance_quality: bool,
+                             timer: StageTimer) -> List[Dict[str, Any]]:
+        """
+        One full-page pass, then a second look at only the lines it was
+        unsure of.
+        
+        The page is read once with the top-ranked strategy. Lines whose
+        average confidence is below refine_confidence (at most
+        refine_max_lines, weakest first) are cropped from the normalized
+        image, each crop goes through every preprocessing variant, and each
+        variant's crops are stacked one per row into a small sheet read
+        with the line configs. That is one Tesseract call per variant and
+        config however many lines need another look. A line takes its most
+        confident reading if it beats the original, and the page text is
+        rebuilt from the merged lines before extraction.
+        
+        Returns the merged full-page result as the only result; the sheet
+        reads are recorded as 'ocr' spans on the timer.
+        """
+        method, config_name = self.strategy_order[0]
+        configs_by_name = {name: config for config, name in self.OCR_CONFIGS}
+        prep_result = self._build_variant(gray, method, timer)
+        
+        result = self._run_ocr(prep_result, configs_by_name[config_name], config_name)
+        if result is None:
+            return []
+        
+        weak = sorted((i for i, line in enumerate(result['lines'])
+                       if line['avg_confidence'] < self.refine_confidence),
+                      key=lambda i: result['lines'][i]['avg_confidence'])[:self.refine_max_lines]
+        if not weak:
+            return [result]
+        
+        crops = [_line_crop(gray, result['lines'][i]['bbox']) for i in weak]
+        combinations = []
+        for crop_method in ['grayscale'] + (self.ENHANCED_METHODS if enhance_quality else []):
+            if crop_method == 'grayscale':
+                variants = crops
+            else:
+                prepared = [_apply_preprocessing(crop, crop_method) for crop in crops]
+                variants = [prep['image'] for prep in prepared]
+                timer.add('preprocess', sum(prep['seconds'] for prep in prepared), method=crop_method)
+            
+            sheet, bands = _stack_line_crops(variants)
+            sheet_prep = {'image': sheet, 'method': crop_method, 'bands': bands}
+            combinations.extend((sheet_prep, config, name) for config, name in self.LINE_OCR_CONFIGS)
         
-        for prep_result in preprocessed_images:
-            image = prep_result['image']
-            pil_image = Image.fromarray(image)
+        lines = [dict(line) for line in result['lines']]
+        replaced = set()
+        for (sheet_prep, _, name), reading in zip(combinations, self._run_ocr_batch(combinations)):
+            if not reading:
+                continue
+            timer.add('ocr', reading['ocr_seconds'], method=sheet_prep['method'], config=name)
+            result['scoring_seconds'] += reading['scoring_seconds']
             
-            for config, config_name in configs:
-                try:
-                    # Get text and confidence data
-                    text = pytesseract.image_to_string(pil_image, config=config)
-                    data = pytesseract.image_to_data(pil_image, config=config, 
-                                                    output_type=pytesseract.Output.DICT)
-                    
-                    # Calculate average confidence (excluding -1 values)
-                    confidences = [float(conf) for conf in data['conf'] if int(conf) > 0]
-                    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-                    
-                    # Calculate text quality score
-                    quality_score = self._calculate_text_quality(text)
-                    
-                    results.append({
-                        'text': text,
-                        'method': prep_result['method'],
-                        'config': config_name,
-                        'avg_confidence': avg_confidence,
-                        'quality_score': quality_score,
-                        'combined_score': avg_confidence * quality_score,
-                        'data': data
-                    })
-                    
-                except Exception as e:
-                    logger.warning(f"OCR failed for {prep_result['method']} with {config_name}: {e}")
+            for band, (text, confidence) in _readings_by_band(reading['lines'], sheet_prep['bands']).items():
+                i = weak[band]
+                if self._is_better_line_reading(text, confidence, lines[i]):
+                    lines[i]['text'] = text
+                    lines[i]['avg_confidence'] = confidence
+                    replaced.add(i)
+        
+        if replaced:
+            logger.info(f"Refined {len(replaced)} of {len(weak)} low-confidence lines")
+            layout = self._layout_from_lines(lines)
+            
+            # Shift the page confidence by each re-read line's gain, weighted
+            # by its share of the words
+            original = result['lines']
+            word_counts = [len(line['text'].split()) for line in original]
+            if sum(word_counts):
+                gain = sum((lines[i]['avg_confidence'] - original[i]['avg_confidence']) * word_counts[i]
+                           for i in replaced)
+                result['avg_confidence'] += gain / sum(word_counts)
+            result.update(layout)
+            result['quality_score'] = self._calculate_text_quality(layout['text'])
+            result['combined_score'] = result['avg_confidence'] * result['quality_score']
+        
+        result['refined_lines'] = len(replaced)
+        result['line_ocr_attempts'] = len(combinations)
+        return [result]
+    
+    def _is_better_line_reading(self, text: str, confidence: float, line: Dict[str, Any]) -> bool:
+        """
+        Whether a re-read line should replace the original: it must score
+        higher on confidence times text quality, the same measure used to
+        pick between whole pages, and keep at least as many digits, so a
+        confident reading that drops a price is never taken.
+        """
+        if not text:
+            return False
+        if sum(c.isdigit() for c in text) < sum(c.isdigit() for c in line['text']):
+            return False
+        return (confidence * self._calculate_text_quality(text) >
+                line['avg_confidence'] * self._calculate_text_quality(line['text']))
+    
+    def _perform_cascade_ocr(self, methods: List[str],
+                             variant: Callable[[str], Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run combinations in ranked order, stopping at the first acceptable result
+        
+        variant(method) returns a method's preprocessed image; it is only
+        called when a combination using the method is about to run, so a
+        cascade that stops early never builds the variants it didn't reach.
+        """
+        configs_by_name = {name: config for config, name in self.OCR_CONFIGS}
+        
+        ranked = [(method, configs_by_name[config_name], config_name)
+                  for method, config_name in self.strategy_order
+                  if method in methods and config_name in configs_by_name]
+        if self.max_ocr_attempts is not None:
+            ranked = ranked[:self.max_ocr_attempts]
+        
+        results = []
+        attempts = 0
+        
+        # With a pool, run as many ranked combinations at once as there are
+        # workers and accept the best-ranked one that passes
+        while attempts < len(ranked):
+            batch = [(variant(method), config, config_name)
+                     for method, config, config_name in ranked[attempts:attempts + self.ocr_workers]]
+            
+            for (prep_result, _, config_name), result in zip(batch, self._run_ocr_batch(batch)):
+                attempts += 1
+                if not result:
                     continue
+                
+                results.append(result)
+                if self._passes_early_exit(result):
+                    logger.info(f"Cascade OCR accepted {prep_result['method']}/{config_name} "
+                               f"after {attempts} attempts")
+                    return results
+        
+        if self.max_ocr_attempts is not None and attempts >= self.max_ocr_attempts:
+            logger.info(f"Cascade OCR stopped after {attempts} attempts (budget exhausted)")
         
         return results
     
+    def _run_ocr_batch(self, combinations: List[Tuple[Dict[str, Any], str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """Run (prep_result, config, config_name) combinations, in parallel when a pool is configured"""
+        executor = self._get_executor()
+        if executor is None or len(combinations) <= 1:
+            return [self._run_ocr(prep_result, config, config_name)
+                    for prep_result, config, config_name in combinations]
+        
+        futures = [executor.submit(_ocr_image_data, prep_result['image'], config, self.engine)
+                   for prep_result, config, _ in combinations]
+        
+        results = []
+        for (prep_result, _, config_name), future in zip(combinations, futures):
+            try:
+                data, ocr_seconds = future.result()
+            except Exception as e:
+                logger.warning(f"OCR failed for {prep_result['method']} with {config_name}: {e}")
+                results.append(None)
+                continue
+            results.append(self._timed_score(prep_result, config_name, data, ocr_seconds))
+        
+        return results
+    
+    def _run_ocr(self, prep_result: Dict[str, Any], config: str, config_name: str) -> Optional[Dict[str, Any]]:
+        """Run a single Tesseract pass and score the result"""
+        try:
+            data, ocr_seconds = _ocr_image_data(prep_result['image'], config, self.engine)
+        except Exception as e:
+            logger.warning(f"OCR failed for {prep_result['method']} with {config_name}: {e}")
+            return None
+        
+        return self._timed_score(prep_result, config_name, data, ocr_seconds)
+    
+    def _timed_score(self, prep_result: Dict[str, Any], config_name: str,
+                     data: WordBoxes, ocr_seconds: float) -> Optional[Dict[str, Any]]:
+        """Score an OCR result, recording how long Tesseract and the scoring took"""
+        started = time.perf_counter()
+        result = self._score_ocr_result(prep_result, config_name, data)
+        if result is not None:
+            result['ocr_seconds'] = ocr_seconds
+            result['scoring_seconds'] = time.perf_counter() - started
+        return result
+    
+    def _score_ocr_result(self, prep_result: Dict[str, Any], config_name: str,
+                          data: Union[WordBoxes, Dict[str, List[Any]]]) -> Optional[Dict[str, Any]]:
+        """Build a scored OCR result from Tesseract word-level data"""
+        try:
+            # A single Tesseract pass gives word boxes and confidences;
+            # the plain text is rebuilt from the same data
+            data = WordBoxes.of(data)
+            layout = self._build_layout_from_data(data)
+            text = layout['text']
+            
+            # Calculate average confidence (excluding -1 values)
+            avg_confidence = data.mean_confidence()
+            
+            # Calculate text quality score
+            quality_score = self._calculate_text_quality(text)
+            
+            return {
+                'text': text,
+                'lines': layout['lines'],
+                'blocks': layout['blocks'],
+                'method': prep_result['method'],
+                'config': config_name,
+                'avg_confidence': avg_confidence,
+                'quality_score': quality_score,
+                'combined_score': avg_confidence * quality_score,
+                'data': data
+            }
+            
+        except Exception as e:
+            logger.warning(f"OCR failed for {prep_result['method']} with {config_name}: {e}")
+            return None
+    
+    def _passes_early_exit(self, result: Dict[str, Any]) -> bool:
+        """Check whether an OCR result is good enough to stop the cascade"""
+        if result['combined_score'] < self.early_exit_score:
+            return False
+        if result['avg_confidence'] < self.early_exit_confidence:
+            return False
+        
+        # Parse once here; process_receipt reuses the parsed fields
+        started = time.perf_counter()
+        extracted_data = self.extract_structured_data(result['text'])
+        result['extracted_data'] = extracted_data
+        result['extraction_seconds'] = time.perf_counter() - started
+        
+        total = extracted_data['total_amount']
+        if total is None:
+            return False
+        
+        # Same consistency check as calculate_confidence_scores
+        if extracted_data['subtotal'] and extracted_data['tax_amount']:
+            calculated_total = extracted_data['subtotal'] + extracted_data['tax_amount']
+            if abs(calculated_total - total) >= 0.10:
+                return False
+        
+        return True
+    
+    def _build_layout_from_data(self, data: Union[WordBoxes, Dict[str, List[Any]]]) -> Dict[str, Any]:
+        """
+        Rebuild text, lines and blocks from word-level image_to_data output.
+        
+        Words are grouped by their (block_num, par_num, line_num) and joined the
+        same way image_to_string lays out its output: words separated by a space,
+        lines by a newline and paragraphs/blocks by a blank line.
+        """
+        return self._layout_from_lines(WordBoxes.of(data).lines())
+    
+    def _layout_from_lines(self, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Join grouped lines into page text and blocks"""
+        blocks = []
+        paragraphs = []
+        previous = None
+        for line in lines:
+            if previous is None or line['block_num'] != previous['block_num']:
+                blocks.append([])
+            if previous is None or (line['block_num'], line['par_num']) != (previous['block_num'], previous['par_num']):
+                paragraphs.append([])
+            blocks[-1].append(line['text'])
+            paragraphs[-1].append(line['text'])
+            previous = line
+        
+        text = '\n\n'.join('\n'.join(paragraph) for paragraph in paragraphs)
+        
+        return {
+            'text': text + '\n' if text else '',
+            'lines': lines,
+            'blocks': ['\n'.join(block) for block in blocks]
+        }
+    
     def _calculate_text_quality(self, text: str) -> float:
         """Calculate quality score based on text characteristics"""
         if not text:
@@ -249,18 +1101,20 @@ class ReceiptProcessor:
     
     def extract_structured_data(self, text: str) -> Dict[str, Any]:
         """Extract structured information from OCR text with improved parsing"""
+        # Tokenise once; every extractor reads the same lines, keywords and amounts
+        receipt_text = ReceiptText(text)
         return {
-            'store_name': self._extract_store_name(text),
-            'total_amount': self._extract_total_amount(text),
-            'purchase_date': self._extract_purchase_date(text),
-            'items': self._extract_items_improved(text),
-            'tax_amount': self._extract_tax_amount_improved(text),
-            'subtotal': self._extract_subtotal(text)
+            'store_name': self._extract_store_name(receipt_text),
+            'total_amount': self._extract_total_amount(receipt_text),
+            'purchase_date': self._extract_purchase_date(receipt_text),
+            'items': self._extract_items_improved(receipt_text),
+            'tax_amount': self._extract_tax_amount_improved(receipt_text),
+            'subtotal': self._extract_subtotal(receipt_text)
         }
     
-    def _extract_store_name(self, text: str) -> Optional[str]:
+    def _extract_store_name(self, text: Union[str, ReceiptText]) -> Optional[str]:
         """Extract store name with improved heuristics"""
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
+        lines = ReceiptText.of(text).nonblank_lines
         
         if not lines:
             return None
@@ -268,48 +1122,25 @@ class ReceiptProcessor:
         # Check first 5 lines for store name
         for i, line in enumerate(lines[:5]):
             # Skip common receipt headers
-            skip_patterns = [
-                r'^\d+$',  # Just numbers
-                r'^\W+$',  # Just special characters
-                r'(?i)^(receipt|invoice|bill|order)$',
-                r'\d{1,2}[:/\-]\d{1,2}',  # Time patterns
-                r'\d{1,2}[/\-\.]\d{1,2}[/\-\.]\d{2,4}',  # Date patterns
-                r'(?i)(phone|tel|address|street|ave|rd)',  # Contact info
-            ]
-            
-            if any(re.search(pattern, line) for pattern in skip_patterns):
+            if self.STORE_NAME_SKIP.search(line):
                 continue
             
             # Positive indicators for store names
             if len(line) > 3 and len(line) < 50:
                 # Clean up the line
-                cleaned = re.sub(r'[^\w\s\-&\']', ' ', line).strip()
+                cleaned = self.STORE_NAME_CLEANUP.sub(' ', line).strip()
                 if cleaned and len(cleaned.split()) <= 5:  # Reasonable word count
                     return cleaned
         
         return None
     
-    def _extract_tax_amount_improved(self, text: str) -> Optional[float]:
+    def _extract_tax_amount_improved(self, text: Union[str, ReceiptText]) -> Optional[float]:
         """Improved tax amount extraction with multiple patterns"""
-        # More comprehensive tax patterns
-        tax_patterns = [
-            # Standard tax patterns
-            (r'(?i)(?:tax|hst|gst|vat|sales\s*tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 1.0),
-            (r'(?i)(?:tax\s*total|total\s*tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 1.0),
-            (r'(?i)(?:provincial\s*tax|federal\s*tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 0.9),
-            
-            # Line-by-line tax detection
-            (r'(?i)^.*tax.*\$?\s*([\d,]+\.\d{2})\s*$', 0.8),
-            
-            # Tax abbreviations
-            (r'(?i)(?:tx|st|ft)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 0.7),
-        ]
-        
+        receipt_text = ReceiptText.of(text)
         candidates = []
         
-        for pattern, confidence in tax_patterns:
-            matches = re.finditer(pattern, text, re.MULTILINE)
-            for match in matches:
+        for pattern, confidence, keywords, anchored in self.TAX_PATTERNS:
+            for match in receipt_text.finditer(pattern, keywords, anchored):
                 try:
                     amount = float(match.group(1).replace(',', ''))
                     # Tax amounts are typically reasonable (not too large or small)
@@ -325,31 +1156,18 @@ class ReceiptProcessor:
         
         return None
     
-    def _extract_items_improved(self, text: str) -> List[Dict[str, Any]]:
+    def _extract_items_improved(self, text: Union[str, ReceiptText]) -> List[Dict[str, Any]]:
         """Improved item extraction with better parsing"""
-        lines = text.split('\n')
+        lines = ReceiptText.of(text).lines
         items = []
         
-        # Define what lines to skip (headers, footers, totals, etc.)
-        skip_line_if_contains = [
-            'total', 'subtotal', 'tax', 'balance', 'change', 'cash', 'credit', 'debit',
-            'payment', 'thank you', 'receipt', 'invoice', 'cashier', 'server',
-            'visit us', 'store hours', 'customer service', 'phone', 'address',
-            'street', 'avenue', 'road', 'city', 'state', 'zip', 'postal'
-        ]
-        
         for line_num, line in enumerate(lines):
             original_line = line.strip()
             if not original_line or len(original_line) < 3:
                 continue
             
-            # Skip lines that contain skip keywords
-            line_lower = original_line.lower()
-            if any(keyword in line_lower for keyword in skip_line_if_contains):
-                continue
-            
-            # Skip lines that match skip patterns
-            if any(re.search(pattern, original_line) for pattern in self.skip_patterns):
+            # Skip headers, footers, totals etc. (keywords and skip patterns)
+            if self.line_rules.is_skipped(original_line):
                 continue
             
             # Try different item parsing patterns
@@ -364,10 +1182,11 @@ class ReceiptProcessor:
     
     def _parse_item_line(self, line: str) -> Optional[Dict[str, Any]]:
         """Parse a single line to extract item information"""
+        if not self.line_rules.may_have_price(line):
+            return None
         
         # Pattern 1: Quantity at the beginning: "2 Item Name $10.50" or "2x Item Name $10.50"
-        pattern1 = r'^(\d+)\s*[xX]?\s+(.+?)\s+\$?\s*(\d+\.?\d{0,2})\s*$'
-        match = re.match(pattern1, line)
+        match = self.line_rules.QUANTITY_FIRST.match(line)
         if match:
             try:
                 quantity = int(match.group(1))
@@ -385,8 +1204,7 @@ class ReceiptProcessor:
                 pass
         
         # Pattern 2: Item with @ symbol: "Item Name 2 @ $5.25"
-        pattern2 = r'^(.+?)\s+(\d+)\s*@\s*\$?\s*(\d+\.?\d{0,2})\s*$'
-        match = re.match(pattern2, line)
+        match = self.line_rules.UNIT_PRICE.match(line)
         if match:
             try:
                 name = match.group(1).strip()
@@ -403,8 +1221,7 @@ class ReceiptProcessor:
                 pass
         
         # Pattern 3: Simple item with price at end: "Item Name $12.99"
-        pattern3 = r'^(.+?)\s+\$?\s*(\d+\.\d{2})\s*$'
-        match = re.match(pattern3, line)
+        match = self.line_rules.PRICE_ONLY.match(line)
         if match:
             try:
                 name = match.group(1).strip()
@@ -420,8 +1237,7 @@ class ReceiptProcessor:
                 pass
         
         # Pattern 4: Item name followed by quantity and price: "Item Name x2 $10.00"
-        pattern4 = r'^(.+?)\s*[xX]\s*(\d+)\s+\$?\s*(\d+\.?\d{0,2})\s*$'
-        match = re.match(pattern4, line)
+        match = self.line_rules.QUANTITY_AFTER.match(line)
         if match:
             try:
                 name = match.group(1).strip()
@@ -459,15 +1275,7 @@ class ReceiptProcessor:
             return False
         
         # Skip common non-item patterns
-        invalid_patterns = [
-            r'(?i)(street|avenue|road|blvd|suite|floor|apt)',
-            r'(?i)(phone|tel|fax|email|www)',
-            r'(?i)(hours|monday|tuesday|wednesday|thursday|friday|saturday|sunday)',
-            r'(?i)(manager|cashier|server|clerk)',
-            r'^\d+$',  # Just a number
-        ]
-        
-        if any(re.search(pattern, name) for pattern in invalid_patterns):
+        if self.line_rules.is_invalid_name(name):
             return False
         
         return True
@@ -500,22 +1308,13 @@ class ReceiptProcessor:
         
         return cleaned_items
     
-    def _extract_total_amount(self, text: str) -> Optional[float]:
+    def _extract_total_amount(self, text: Union[str, ReceiptText]) -> Optional[float]:
         """Extract total amount with multiple pattern matching"""
-        # Comprehensive patterns for total detection
-        patterns = [
-            (r'(?i)(?:total|tot|balance\s+due|amount\s+due)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 1.0),
-            (r'(?i)(?:grand\s+total|g\.?\s*total)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 1.0),
-            (r'\$\s*([\d,]+\.\d{2})(?=\s*(?:total|tot))', 0.9),
-            (r'(?i)(?:pay|due)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 0.8),
-            (r'(?i)(?:sale|sales)[\s:]*\$?\s*([\d,]+\.?\d{0,2})', 0.7),
-        ]
-        
+        receipt_text = ReceiptText.of(text)
         candidates = []
         
-        for pattern, confidence in patterns:
-            matches = re.finditer(pattern, text)
-            for match in matches:
+        for pattern, confidence, keywords, anchored in self.TOTAL_PATTERNS:
+            for match in receipt_text.finditer(pattern, keywords, anchored):
                 try:
                     amount = float(match.group(1).replace(',', ''))
                     candidates.append((amount, confidence))
@@ -528,26 +1327,15 @@ class ReceiptProcessor:
             return candidates[0][0]
         
         # Fallback: Find largest currency amount
-        currency_pattern = r'\$?\s*([\d,]+\.\d{2})'
-        amounts = []
-        for match in re.finditer(currency_pattern, text):
-            try:
-                amount = float(match.group(1).replace(',', ''))
-                amounts.append(amount)
-            except ValueError:
-                continue
-        
+        amounts = receipt_text.amounts
         return max(amounts) if amounts else None
     
-    def _extract_subtotal(self, text: str) -> Optional[float]:
+    def _extract_subtotal(self, text: Union[str, ReceiptText]) -> Optional[float]:
         """Extract subtotal amount"""
-        patterns = [
-            r'(?i)(?:subtotal|sub\s*total|sub\s*tot)[\s:]*\$?\s*([\d,]+\.?\d{0,2})',
-            r'(?i)(?:total\s+before\s+tax)[\s:]*\$?\s*([\d,]+\.?\d{0,2})',
-        ]
+        receipt_text = ReceiptText.of(text)
         
-        for pattern in patterns:
-            match = re.search(pattern, text)
+        for pattern, keywords in self.SUBTOTAL_PATTERNS:
+            match = receipt_text.search(pattern, keywords)
             if match:
                 try:
                     return float(match.group(1).replace(',', ''))
@@ -556,19 +1344,16 @@ class ReceiptProcessor:
         
         return None
     
-    def _extract_purchase_date(self, text: str) -> Optional[str]:
+    def _extract_purchase_date(self, text: Union[str, ReceiptText]) -> Optional[str]:
         """Extract and normalize purchase date"""
-        # Date patterns in order of preference
-        patterns = [
-            (r'(\d{1,2})[/\-](\d{1,2})[/\-](\d{4})', 'MDY'),  # MM/DD/YYYY
-            (r'(\d{4})[/\-](\d{1,2})[/\-](\d{1,2})', 'YMD'),  # YYYY/MM/DD
-            (r'(\d{1,2})[/\-](\d{1,2})[/\-](\d{2})', 'MDY'),   # MM/DD/YY
-            (r'(\d{1,2})\.(\d{1,2})\.(\d{4})', 'DMY'),         # DD.MM.YYYY
-            (r'([A-Za-z]{3,9})\s+(\d{1,2}),?\s+(\d{4})', 'MDY'), # Jan 15, 2024
-        ]
+        text = ReceiptText.of(text).text
         
-        for pattern, format_type in patterns:
-            match = re.search(pattern, text)
+        for pattern, format_type, separators in self.DATE_PATTERNS:
+            # No separator, no date of this shape
+            if separators and not any(separator in text for separator in separators):
+                continue
+            
+            match = pattern.search(text)
             if match:
                 try:
                     if format_type == 'MDY':
@@ -686,11 +1471,12 @@ class ReceiptProcessor:
         """Return list of available categories"""
         return self.categories
     
-    def _create_error_response(self, error_message: str) -> Dict[str, Any]:
+    def _create_error_response(self, error_message: str, error_type: str = 'processing_error') -> Dict[str, Any]:
         """Create a standardized error response"""
         return {
             'success': False,
             'error_message': error_message,
+            'error_type': error_type,
             'extracted_text': '',
             'store_name': None,
             'total_amount': None,
@@ -700,5 +1486,6 @@ class ReceiptProcessor:
             'subtotal': None,
             'suggested_category': None,
             'overall_confidence': 0.0,
-            'confidence_breakdown': {}
+            'confidence_breakdown': {},
+            'duplicate': None
         }
\ No newline at end of file
@@ -0,0 +1,77 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Match, Optional, Pattern, Union
+
+# Literals the field patterns are anchored on. A pattern listing keywords
+# can only match where one of them occurs.
+KEYWORDS = ('tot', 'sub', 'balance', 'amount', 'pay', 'due', 'sale',
+            'tax', 'hst', 'gst', 'vat', 'tx', 'st', 'ft')
+
+# Case-insensitive like the field patterns, so a keyword is found wherever
+# a pattern could match it. Separate literal searches run in C and beat one
+# overlapping alternation scan that yields every hit back to Python.
+_KEYWORD_SEARCHES = [(keyword, re.compile(re.escape(keyword), re.IGNORECASE)) for keyword in KEYWORDS]
+
+_MONEY = re.compile(r'([\d,]+\.\d{2})')
+
+
+class ReceiptText:
+    """
+    OCR text tokenised once for the field extractors.
+
+    Holds the split lines, the first position of every keyword and every
+    money amount, so extractors share a single pass over the text instead
+    of each re-splitting and rescanning it. Patterns are only run when one
+    of their keywords occurs, starting from that keyword's line.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.split('\n')
+        self.nonblank_lines = [line.strip() for line in self.lines if line.strip()]
+
+        # First position of each keyword present
+        self.keywords: Dict[str, int] = {}
+        for keyword, search in _KEYWORD_SEARCHES:
+            match = search.search(text)
+            if match:
+                self.keywords[keyword] = match.start()
+
+        self.amounts: List[float] = []
+        for match in _MONEY.finditer(text):
+            try:
+                self.amounts.append(float(match.group(1).replace(',', '')))
+            except ValueError:
+                continue
+
+    @classmethod
+    def of(cls, text: Union[str, 'ReceiptText']) -> 'ReceiptText':
+        return text if isinstance(text, cls) else cls(text)
+
+    def scan_start(self, keywords: Iterable[str], anchored: bool = True) -> Optional[int]:
+        """
+        Where a scan for a pattern that needs one of keywords can start,
+        or None if the pattern can't match at all.
+
+        Anchored patterns start matching at the keyword itself, so the scan
+        begins at the start of the earliest keyword's line (keeping ^ in
+        MULTILINE patterns intact). Patterns whose match may begin on an
+        earlier line pass anchored=False and scan the whole text.
+        """
+        positions = [self.keywords[keyword] for keyword in keywords if keyword in self.keywords]
+        if not positions:
+            return None
+        if not anchored:
+            return 0
+        return self.text.rfind('\n', 0, min(positions)) + 1
+
+    def finditer(self, pattern: Pattern, keywords: Iterable[str], anchored: bool = True) -> Iterator[Match]:
+        start = self.scan_start(keywords, anchored)
+        if start is None:
+            return iter(())
+        return pattern.finditer(self.text, start)
+
+    def search(self, pattern: Pattern, keywords: Iterable[str], anchored: bool = True) -> Optional[Match]:
+        start = self.scan_start(keywords, anchored)
+        if start is None:
+            return None
+        return pattern.search(self.text, start)
@@ -0,0 +1,131 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Optional; responses fall back to gzip
+    brotli = None
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header lists coding without q=0"""
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        if name.strip().lower() == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class _GzipCompressor:
+    """gzip behind brotli's Compressor interface (process, flush, finish)"""
+
+    def __init__(self, level: int):
+        # wbits=31 writes the gzip header and trailer around the deflate stream
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least minimum_size bytes: brotli for clients
+    that accept it when the brotli package is installed, gzip otherwise.
+    Smaller responses are sent as they are, since compressing them costs
+    more CPU than the bytes saved are worth.
+
+    Streamed responses are compressed chunk by chunk and every chunk is
+    flushed, so an NDJSON stream still reaches the client line by line.
+    (Starlette's GZipMiddleware holds streamed output back until the
+    compressor's buffer fills, which for small lines is the end.)
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            accept_encoding = Headers(scope=scope).get('accept-encoding', '')
+            if brotli is not None and _accepts(accept_encoding, 'br'):
+                responder = _CompressingResponder(
+                    self.app, self.minimum_size, 'br', lambda: brotli.Compressor(quality=self.brotli_quality))
+                await responder(scope, receive, send)
+                return
+            if _accepts(accept_encoding, 'gzip'):
+                responder = _CompressingResponder(
+                    self.app, self.minimum_size, 'gzip', lambda: _GzipCompressor(self.gzip_level))
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressingResponder:
+    """Compresses one response with the given coding"""
+
+    def __init__(self, app, minimum_size: int, coding: str, make_compressor):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.coding = coding
+        self.make_compressor = make_compressor
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message['type'] == 'http.response.start':
+            # Held back until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+        if message['type'] != 'http.response.body':
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start['headers'])
+            if 'content-encoding' in headers or (len(body) < self.minimum_size and not more_body):
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.compressor = self.make_compressor()
+            headers['Content-Encoding'] = self.coding
+            headers.add_vary_header('Accept-Encoding')
+            if more_body:
+                del headers['Content-Length']
+            body = self._compress(body, more_body)
+            if not more_body:
+                headers['Content-Length'] = str(len(body))
+            await self.send(start)
+            await self.send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+            return
+
+        if self.compressor is None:
+            await self.send(message)
+            return
+
+        body = self._compress(body, more_body)
+        await self.send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        # Streamed chunks are flushed so clients see them straight away
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
@@ -0,0 +1,267 @@
+import copy
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coalescing
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A computation in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    Content-addressed cache for receipt processing results.
+
+    Results live in a bounded in-memory LRU and, when disk_dir is set, in
+    JSON files that every worker process sharing the directory can read.
+    The disk tier holds at most max_disk_entries files: every so often a
+    writer prunes the least recently used (oldest mtime; disk hits touch
+    their file) back down to the limit.
+
+    Concurrent misses for the same key are coalesced: one caller computes
+    and the others wait for its result (across processes too, via a lock
+    file, where fcntl is available). The lock file is removed once the
+    result is written, so it doesn't outlive the computation.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None,
+                 max_disk_entries: int = 10_000):
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        # A directory scan per write would cost more than the cache saves
+        self._prune_every = max(1, self.max_disk_entries // 20)
+        self._disk_writes = 0
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]],
+                       cacheable: Callable[[Dict[str, Any]], bool] = lambda result: True
+                       ) -> Tuple[Dict[str, Any], str]:
+        """
+        Return the cached result for key, computing it on a miss.
+
+        The second element says where the result came from: 'hit',
+        'disk_hit', 'coalesced' or 'miss'.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key]), 'hit'
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), 'coalesced'
+
+        try:
+            result, status = self._load_or_compute(key, compute, cacheable)
+            flight.result = result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+        return copy.deepcopy(result), status
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a stored result without computing anything or touching the counters"""
+        with self._lock:
+            if key in self._entries:
+                return copy.deepcopy(self._entries[key])
+        if self.disk_dir:
+            return self._read_disk(key)
+        return None
+
+    def _load_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]],
+                         cacheable: Callable[[Dict[str, Any]], bool]) -> Tuple[Dict[str, Any], str]:
+        if not self.disk_dir:
+            result = compute()
+            with self._lock:
+                self.misses += 1
+            if cacheable(result):
+                self._store(key, result)
+            return result, 'miss'
+
+        with self._disk_lock(key):
+            result = self._read_disk(key)
+            if result is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._touch_disk(key)
+                self._store(key, result)
+                return result, 'disk_hit'
+
+            result = compute()
+            with self._lock:
+                self.misses += 1
+            if cacheable(result):
+                self._store(key, result)
+                self._write_disk(key, result)
+            return result, 'miss'
+
+    def _store(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_lock(self, key: str):
+        """Exclusive lock on a key's lock file, so other processes wait for the result"""
+        return _FileLock(self._disk_path(key) + '.lock')
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, result: Dict[str, Any]):
+        path = self._disk_path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % self._prune_every == 0
+        if prune:
+            self.prune_disk()
+
+    def _touch_disk(self, key: str):
+        try:
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+
+    def prune_disk(self) -> int:
+        """Delete the least recently used disk entries over max_disk_entries; returns how many"""
+        entries = []
+        for path in glob.glob(os.path.join(self.disk_dir, '*', '*.json')):
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                continue  # pruned by another process
+
+        removed = 0
+        for _, path in sorted(entries)[:max(0, len(entries) - self.max_disk_entries)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.disk_evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_enabled': bool(self.disk_dir),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'max_disk_entries': self.max_disk_entries if self.disk_dir else None,
+                'disk_evictions': self.disk_evictions,
+            }
+
+
+class _FileLock:
+    """
+    flock-based lock file, removed on release; a no-op where fcntl is
+    unavailable.
+
+    A waiter may lock a file the previous holder has already removed, so
+    after locking it checks the path still names the same file and
+    starts over on the new one if not.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if fcntl is None:
+            return self
+        while True:
+            lock_file = open(self.path, 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and os.path.samestat(current, os.fstat(lock_file.fileno())):
+                self._file = lock_file
+                return self
+            lock_file.close()
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            # Removed while still held, so no one else can be relying on it
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
@@ -0,0 +1,64 @@
+import os
+
+from duplicate_index import DuplicateIndex
+from receipt_processor import ReceiptProcessor
+from result_cache import ResultCache
+from strategy_stats import StrategyStats
+
+
+def processor_from_env() -> ReceiptProcessor:
+    """
+    Build the service's ReceiptProcessor from the OCR_* environment
+    variables (see .env.example).
+
+    Module-level so worker processes can be handed it by reference and
+    build an identical processor of their own.
+    """
+    # Results are cached by image content; set OCR_CACHE_DIR to share them
+    # between worker processes through the filesystem
+    result_cache = ResultCache(
+        max_entries=int(os.getenv("OCR_CACHE_SIZE", 256)),
+        disk_dir=os.getenv("OCR_CACHE_DIR") or None,
+        max_disk_entries=int(os.getenv("OCR_CACHE_DISK_ENTRIES", 10_000))
+    )
+
+    # Perceptual-hash index for spotting re-uploaded or re-photographed
+    # receipts; opt-in, since 'reuse' mode can answer with another receipt's result
+    duplicate_index = None
+    if os.getenv("OCR_DEDUP", "false").lower() == "true":
+        duplicate_index = DuplicateIndex(
+            max_distance=int(os.getenv("OCR_DEDUP_MAX_DISTANCE", 16)),
+            path=os.getenv("OCR_DEDUP_INDEX_PATH") or None
+        )
+
+    # Win-rate telemetry per OCR combination; combinations that rarely win are
+    # skipped except on a share of exploration receipts that run the full grid.
+    # Opt-in, since pruning trades some accuracy on unusual receipts for speed
+    strategy_stats = None
+    if os.getenv("OCR_STRATEGY_PRUNING", "false").lower() == "true":
+        strategy_stats = StrategyStats(
+            path=os.getenv("OCR_STRATEGY_STATS_PATH") or None,
+            exploration=float(os.getenv("OCR_STRATEGY_EXPLORATION", 0.1)),
+            min_trials=int(os.getenv("OCR_STRATEGY_MIN_TRIALS", 50))
+        )
+
+    return ReceiptProcessor(
+        engine=os.getenv("OCR_ENGINE", "pytesseract"),
+        search_mode=os.getenv("OCR_SEARCH_MODE", "grid"),
+        result_cache=result_cache,
+        duplicate_index=duplicate_index,
+        duplicate_mode=os.getenv("OCR_DEDUP_MODE", "flag"),
+        strategy_stats=strategy_stats,
+        refine_confidence=float(os.getenv("OCR_REFINE_CONFIDENCE", 60)),
+        refine_max_lines=int(os.getenv("OCR_REFINE_MAX_LINES", 12))
+    )
+
+
+def probe_processor_from_env() -> ReceiptProcessor:
+    """
+    A processor for health checks and the category list only, with the
+    configured OCR engine but no result cache, duplicate index or strategy
+    stats. The service builds this one when receipts run in worker
+    processes, each of which has a full processor_from_env() of its own.
+    """
+    return ReceiptProcessor(engine=os.getenv("OCR_ENGINE", "pytesseract"))
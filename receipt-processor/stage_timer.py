@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+
+class StageTimer:
+    """
+    Collects timing spans for one receipt as it moves through the pipeline.
+
+    Each span is a dict with the stage name, any labels (method, config)
+    and the duration in ms, ready for the response and the metrics
+    exporter. Recording is a perf_counter call and a list append.
+    """
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, stage: str, seconds: float, **labels: str):
+        self.spans.append({'stage': stage, **labels, 'ms': round(seconds * 1000, 3)})
+
+    @contextmanager
+    def span(self, stage: str, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, **labels)
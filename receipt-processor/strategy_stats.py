@@ -0,0 +1,222 @@
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from result_cache import _FileLock
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# z for the Wilson upper bound on a combination's win rate. A combination
+# that never wins drops below min_win_rate after about 1 / min_win_rate runs.
+_WILSON_Z = 1.0
+
+
+def wilson_upper(wins: int, runs: int, z: float = _WILSON_Z) -> float:
+    """Optimistic (upper-bound) estimate of a win rate from wins out of runs"""
+    if runs <= 0:
+        return 1.0
+    p = wins / runs
+    denominator = 1 + z * z / runs
+    centre = p + z * z / (2 * runs)
+    margin = z * math.sqrt(p * (1 - p) / runs + z * z / (4 * runs * runs))
+    return min(1.0, (centre + margin) / denominator)
+
+
+def _merge_counts(target: Dict[str, Dict[str, float]], counts: Dict[str, Dict[str, float]]):
+    for combination, delta in counts.items():
+        entry = target.setdefault(combination, {'runs': 0, 'wins': 0, 'gain': 0.0})
+        for field, value in delta.items():
+            entry[field] += value
+
+
+class StrategyStats:
+    """
+    Running win-rate and marginal-gain telemetry per OCR combination, and
+    an epsilon-greedy policy that stops running combinations that rarely win.
+
+    Every grid search records, for each (method, config) it ran, whether it
+    produced the selected result and by how much it beat the runner-up (its
+    marginal gain: what the receipt would have lost without it). A
+    combination is pruned once it has min_trials runs, even its optimistic
+    win rate is below min_win_rate and its mean gain per run is below
+    min_gain. An exploration share of receipts still runs the full grid so
+    pruned combinations keep being measured and come back if they start
+    winning.
+
+    With a path, counts are saved to a JSON file every save_every receipts
+    and on close. Saving merges this process's new counts into the file
+    under a lock, so workers sharing it pool their telemetry.
+    """
+
+    def __init__(self, path: Optional[str] = None, exploration: float = 0.1,
+                 min_trials: int = 50, min_win_rate: float = 0.02, min_gain: float = 1.0,
+                 save_every: int = 20, seed: Optional[int] = None):
+        """
+        Args:
+            path: JSON file the counts persist to (None = memory only)
+            exploration: share of receipts that run every combination
+            min_trials: runs a combination needs before it can be pruned
+            min_win_rate: win-rate bound below which a combination is pruned
+            min_gain: mean marginal gain per run (combined_score points)
+                below which a combination is pruned
+            save_every: receipts recorded between saves
+            seed: seeds the exploration draws
+        """
+        if not 0.0 <= exploration <= 1.0:
+            raise ValueError(f"exploration must be between 0 and 1, got {exploration}")
+
+        self.path = path
+        self.exploration = exploration
+        self.min_trials = min_trials
+        self.min_win_rate = min_win_rate
+        self.min_gain = min_gain
+        self.save_every = max(1, save_every)
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, float]] = {}
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._unsaved = 0
+        self.receipts = 0
+        self.explored = 0
+
+        if path:
+            self._counts = self._read_file()
+
+    @staticmethod
+    def key(method: str, config: str) -> str:
+        return f"{method}/{config}"
+
+    def settings(self) -> Dict[str, Any]:
+        """Policy parameters, for cache keys"""
+        return {
+            'exploration': self.exploration,
+            'min_trials': self.min_trials,
+            'min_win_rate': self.min_win_rate,
+            'min_gain': self.min_gain,
+        }
+
+    def is_pruned(self, key: str) -> bool:
+        with self._lock:
+            return self._is_pruned(key)
+
+    def _is_pruned(self, key: str) -> bool:
+        counts = self._counts.get(key)
+        if not counts or counts['runs'] < self.min_trials:
+            return False
+        return (wilson_upper(int(counts['wins']), int(counts['runs'])) < self.min_win_rate and
+                counts['gain'] / counts['runs'] < self.min_gain)
+
+    def select(self, combinations: Sequence[T], key: Callable[[T], str]) -> List[T]:
+        """
+        The combinations to run for the next receipt, in their given order.
+
+        Either all of them (an exploration round) or those not pruned. At
+        least one combination always survives.
+        """
+        with self._lock:
+            self.receipts += 1
+            if self._rng.random() < self.exploration:
+                self.explored += 1
+                return list(combinations)
+
+            kept = [combination for combination in combinations if not self._is_pruned(key(combination))]
+        return kept or list(combinations[:1])
+
+    def record(self, results: List[Dict[str, Any]], winner: Dict[str, Any]):
+        """
+        Record one receipt's scored results and the one that was selected.
+
+        Results carry 'method', 'config' and 'combined_score'.
+        """
+        if not results:
+            return
+
+        winner_key = self.key(winner['method'], winner['config'])
+        runner_up = max((result['combined_score'] for result in results if result is not winner), default=0.0)
+        gain = max(0.0, winner['combined_score'] - runner_up)
+
+        with self._lock:
+            for result in results:
+                result_key = self.key(result['method'], result['config'])
+                won = result_key == winner_key
+                delta = {result_key: {'runs': 1, 'wins': int(won), 'gain': gain if won else 0.0}}
+                _merge_counts(self._counts, delta)
+                _merge_counts(self._pending, delta)
+
+            self._unsaved += 1
+            due = bool(self.path) and self._unsaved >= self.save_every
+
+        if due:
+            self.save()
+
+    def save(self):
+        """Merge counts recorded since the last save into the file"""
+        if not self.path:
+            return
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._unsaved = 0
+        if not pending:
+            return
+
+        try:
+            with _FileLock(os.path.abspath(self.path) + '.lock'):
+                merged = self._read_file()
+                _merge_counts(merged, pending)
+
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'combinations': merged}, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save strategy stats: {e}")
+            # Keep the counts for the next attempt
+            with self._lock:
+                _merge_counts(self._pending, pending)
+            return
+
+        # Pick up what other workers saved in the meantime
+        with self._lock:
+            _merge_counts(merged, self._pending)
+            self._counts = merged
+
+    def close(self):
+        self.save()
+
+    def _read_file(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('combinations', {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable strategy stats {self.path}: {e}")
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            combinations = {}
+            for combination, counts in sorted(self._counts.items()):
+                runs = counts['runs']
+                combinations[combination] = {
+                    'runs': runs,
+                    'wins': counts['wins'],
+                    'win_rate': round(counts['wins'] / runs, 4) if runs else 0.0,
+                    'mean_gain': round(counts['gain'] / runs, 3) if runs else 0.0,
+                    'pruned': self._is_pruned(combination),
+                }
+            return {
+                'receipts': self.receipts,
+                'explored': self.explored,
+                'exploration': self.exploration,
+                'combinations': combinations,
+            }
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+from benchmark import compare_reports, generate_receipt, run_benchmarks
+
+
+def test_generator_controls_length_and_resolution():
+    short, short_text = generate_receipt(items=5)
+    long, long_text = generate_receipt(items=30, scale=0.5)
+
+    short_image = cv2.imdecode(np.frombuffer(short, np.uint8), cv2.IMREAD_GRAYSCALE)
+    long_image = cv2.imdecode(np.frombuffer(long, np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert long_text.count('\n') - short_text.count('\n') == 25
+    assert long_image.shape[1] == short_image.shape[1] // 2
+    assert generate_receipt(items=5) == (short, short_text)
+
+
+def test_report_times_each_stage_without_ocr():
+    cases = {'synthetic/tiny': generate_receipt(items=3)}
+    report = run_benchmarks(cases, repeat=2, skip_ocr=True)
+
+    stages = report['cases']['synthetic/tiny']['stages']
+    assert {'decode', 'normalize', 'preprocess.clahe', 'extract.extract_total_amount', 'extract.all'} <= set(stages)
+    assert not any(stage.startswith('ocr.') for stage in stages)
+    assert report['totals']['decode'] == stages['decode']['median_ms']
+
+
+def test_compare_reports_ratio():
+    before = {'meta': {}, 'totals': {'decode': 10.0, 'ocr.automatic': 100.0}}
+    after = {'meta': {}, 'totals': {'decode': 5.0, 'extract.all': 1.0}}
+    rows = {row['stage']: row for row in compare_reports(before, after)}
+    assert rows['decode']['ratio'] == 0.5
+    assert rows['ocr.automatic']['after_ms'] is None
+    assert rows['extract.all']['ratio'] is None
@@ -0,0 +1,61 @@
+import os
+import random
+
+import cv2
+
+from duplicate_index import DuplicateIndex, dhash
+from test_single_pass_ocr import TEST_IMAGE_DIR
+
+
+def load_gray(filename):
+    return cv2.imread(os.path.join(TEST_IMAGE_DIR, filename), cv2.IMREAD_GRAYSCALE)
+
+
+def test_dhash_survives_rescaling_and_recompression():
+    gray = load_gray('Itemized+receipt+example.png')
+    resized = cv2.resize(gray, None, fx=0.6, fy=0.6, interpolation=cv2.INTER_AREA)
+    _, jpeg = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    recompressed = cv2.imdecode(jpeg, cv2.IMREAD_GRAYSCALE)
+
+    original = dhash(gray)
+    assert (original ^ dhash(recompressed)).bit_count() <= 16
+    assert (original ^ dhash(load_gray('images.png'))).bit_count() > 16
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(256) for _ in range(5000)]
+    index = DuplicateIndex(max_distance=32)
+    for i, value in enumerate(hashes):
+        index.add(value, f"key{i}")
+
+    for target in rng.sample(range(len(hashes)), 25):
+        query = hashes[target]
+        for bit in rng.sample(range(256), rng.randint(0, 32)):
+            query ^= 1 << bit
+
+        match = index.search(query)
+        expected = min((value ^ query).bit_count() for value in hashes)
+        assert match is not None and match.distance == expected
+
+    assert index.search(rng.getrandbits(256)) is None
+
+
+def test_index_file_is_shared(tmp_path):
+    path = str(tmp_path / 'dhash.idx')
+    first = DuplicateIndex(path=path)
+    second = DuplicateIndex(path=path)
+
+    first.add(0b1011, 'receipt-a')
+    assert second.search(0b1001).key == 'receipt-a'
+    assert len(DuplicateIndex(path=path)) == 1
+
+
+def test_dedup_is_opt_in(monkeypatch):
+    from service_config import processor_from_env
+
+    monkeypatch.delenv('OCR_DEDUP', raising=False)
+    assert processor_from_env().duplicate_index is None
+
+    monkeypatch.setenv('OCR_DEDUP', 'true')
+    assert processor_from_env().duplicate_index is not None
@@ -0,0 +1,22 @@
+import json
+import os
+
+import pytest
+
+from receipt_processor import ReceiptProcessor
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data', 'extraction_golden.json')
+
+with open(GOLDEN_PATH, encoding='utf-8') as f:
+    GOLDEN_CASES = json.load(f)
+
+
+@pytest.fixture(scope='module')
+def processor():
+    return ReceiptProcessor()
+
+
+@pytest.mark.parametrize('case', GOLDEN_CASES, ids=[case['name'] for case in GOLDEN_CASES])
+def test_extraction_matches_golden_output(processor, case):
+    """OCR text from the sample images plus synthetic receipts, with the original extractor's output"""
+    assert processor.extract_structured_data(case['text']) == case['expected']
@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+
+from image_normalization import (OSD_PROBE_MAX_SIDE, _rotate, correct_orientation, crop_to_receipt,
+                                 estimate_text_height, horizontal_neighbour_share, normalize_resolution,
+                                 upright_share)
+
+
+def render_receipt(font_scale, width=600, lines=12):
+    """White page with lines of dark text drawn at the given font scale"""
+    line_height = int(40 * font_scale)
+    image = np.full((line_height * (lines + 1), width), 255, dtype=np.uint8)
+    for i in range(lines):
+        cv2.putText(image, f"ITEM {i:02d} WIDGET  $1{i}.99", (10, line_height * (i + 1)),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, max(1, int(2 * font_scale)))
+    return image
+
+
+def test_estimate_tracks_font_size():
+    small = estimate_text_height(render_receipt(0.5))
+    large = estimate_text_height(render_receipt(1.0, width=1200))
+    assert small is not None and large is not None
+    assert 1.6 <= large / small <= 2.4
+
+
+def test_blank_image_is_left_alone():
+    blank = np.full((800, 600), 255, dtype=np.uint8)
+    normalized, info = normalize_resolution(blank)
+    assert normalized is blank
+    assert info['scale'] == 1.0
+    assert info['estimated_text_height'] is None
+
+
+def test_small_text_is_upscaled_towards_target():
+    image = render_receipt(0.4, width=400)
+    normalized, info = normalize_resolution(image, target_text_height=30)
+    assert info['scale'] > 1.5
+    assert info['normalized_size'] == [normalized.shape[1], normalized.shape[0]]
+    assert 20 <= estimate_text_height(normalized) <= 40
+
+
+def test_pixel_budget_is_enforced():
+    image = render_receipt(3.0, width=3000)
+    normalized, info = normalize_resolution(image, target_text_height=200, max_pixels=1_000_000)
+    assert normalized.shape[0] * normalized.shape[1] <= 1_000_000 * 1.01
+    assert info['scale'] < 1.0
+
+
+def photograph(receipt, corners, size=(1200, 1000)):
+    """Warp a receipt onto a darker, textured background at the given corners"""
+    height, width = receipt.shape
+    source = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+    transform = cv2.getPerspectiveTransform(source, np.float32(corners))
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 90, size=size, dtype=np.uint8)
+    warped = cv2.warpPerspective(receipt, transform, (size[1], size[0]))
+    mask = cv2.warpPerspective(np.full_like(receipt, 255), transform, (size[1], size[0]))
+    return np.where(mask > 0, warped, background)
+
+
+def test_receipt_is_cropped_out_of_photo():
+    receipt = render_receipt(0.6, width=400, lines=30)
+    corners = [[300, 120], [700, 150], [680, 890], [280, 860]]
+    photo = photograph(receipt, corners)
+
+    cropped, info = crop_to_receipt(photo)
+
+    assert info['detected'] is True
+    for found, expected in zip(info['corners'], corners):
+        assert abs(found[0] - expected[0]) <= 15 and abs(found[1] - expected[1]) <= 15
+    # Roughly the receipt's own aspect ratio, with no background left over
+    width, height = info['cropped_size']
+    assert abs(width / height - receipt.shape[1] / receipt.shape[0]) < 0.1
+    assert cropped.mean() > 180
+
+
+def test_scan_without_outline_keeps_full_frame():
+    scan = render_receipt(0.6, width=400)
+    cropped, info = crop_to_receipt(scan)
+    assert cropped is scan
+    assert info == {'detected': False}
+
+
+def test_sideways_receipt_is_turned_upright():
+    receipt = render_receipt(0.6, width=400, lines=30)
+    sideways = cv2.rotate(receipt, cv2.ROTATE_90_COUNTERCLOCKWISE)
+
+    upright, info = correct_orientation(sideways)
+
+    assert info == {'rotation': 90, 'skew': 0.0, 'osd': False}
+    assert np.array_equal(upright, receipt)
+
+
+def test_skew_is_levelled():
+    receipt = render_receipt(0.6, width=400, lines=30)
+    skewed = _rotate(receipt, -6, border_value=255)
+
+    _, info = correct_orientation(skewed)
+
+    assert info['rotation'] == 0
+    assert abs(info['skew'] - 6) <= 0.5
+
+
+def test_upside_down_needs_a_confident_osd():
+    receipt = render_receipt(0.6, width=400, lines=30)
+    upside_down = cv2.rotate(receipt, cv2.ROTATE_180)
+
+    flipped, info = correct_orientation(upside_down, detect_osd=lambda image: (180, 5.0))
+    assert info == {'rotation': 180, 'skew': 0.0, 'osd': True}
+    assert np.array_equal(flipped, receipt)
+
+    unchanged, info = correct_orientation(upside_down, detect_osd=lambda image: (180, 0.5))
+    assert info['rotation'] == 0
+    assert unchanged is upside_down
+
+
+def test_osd_is_skipped_when_glyphs_show_text_is_upright():
+    receipt = render_receipt(0.6, width=400, lines=30)
+    assert upright_share(receipt) >= 0.9
+    assert upright_share(cv2.rotate(receipt, cv2.ROTATE_180)) <= 0.1
+
+    calls = []
+    _, info = correct_orientation(receipt, detect_osd=lambda image: calls.append(image.shape) or (180, 5.0))
+    assert calls == []
+    assert info == {'rotation': 0, 'skew': 0.0, 'osd': False}
+
+
+def test_osd_reads_a_downscaled_copy():
+    receipt = cv2.resize(render_receipt(0.6, width=400, lines=30), None, fx=2, fy=2)
+    calls = []
+    correct_orientation(cv2.rotate(receipt, cv2.ROTATE_180), detect_osd=lambda image: calls.append(image.shape))
+    assert len(calls) == 1 and max(calls[0]) == OSD_PROBE_MAX_SIDE
+
+
+def test_neighbour_share_is_the_same_in_any_chunk_size():
+    # Glyphs 10px apart along rows 30px apart, with a little jitter
+    rng = np.random.default_rng(1)
+    grid = np.array([(x * 10, y * 30) for y in range(20) for x in range(40)], dtype=np.float64)
+    centroids = grid + rng.uniform(-2, 2, grid.shape)
+
+    share = horizontal_neighbour_share(centroids)
+    assert share > 0.9
+    assert horizontal_neighbour_share(centroids, chunk_size=7) == share
+    assert horizontal_neighbour_share(centroids, chunk_size=len(centroids)) == share
+    assert horizontal_neighbour_share(centroids[:, ::-1]) < 0.1
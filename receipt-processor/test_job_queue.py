@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+import requests
+
+import job_queue
+from job_queue import JobQueue, QueueFullError, post_webhook
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'), max_queued=3)
+
+
+def test_jobs_are_claimed_oldest_first_and_finished(queue):
+    first = queue.submit(b'one', {'enhance_quality': False})
+    second = queue.submit(b'two', webhook_url='http://backend/hook')
+
+    job = queue.claim()
+    assert (job.id, job.image, job.options, job.attempts) == (first, b'one', {'enhance_quality': False}, 1)
+    assert queue.get(first)['status'] == 'running'
+
+    queue.complete(first, {'total_amount': 14.79})
+    done = queue.get(first)
+    assert done['status'] == 'done' and done['result'] == {'total_amount': 14.79}
+    assert done['finished_at'] is not None
+
+    job = queue.claim()
+    assert (job.id, job.webhook_url) == (second, 'http://backend/hook')
+    queue.fail(second, 'Invalid image format')
+    assert queue.get(second)['error'] == 'Invalid image format'
+
+    assert queue.claim() is None
+    assert queue.stats() == {'queued': 0, 'running': 0, 'done': 1, 'failed': 1}
+
+
+def test_queue_survives_a_restart_and_rejects_overflow(queue, tmp_path):
+    job_ids = [queue.submit(b'x') for _ in range(3)]
+    with pytest.raises(QueueFullError):
+        queue.submit(b'x')
+
+    reopened = JobQueue(queue.path)
+    assert reopened.claim().id == job_ids[0]
+    assert reopened.get('missing') is None
+
+
+def test_expired_leases_are_retried_then_abandoned(queue):
+    queue.lease_seconds = 0.0
+    queue.max_attempts = 2
+    job_id = queue.submit(b'x')
+
+    assert queue.claim().attempts == 1
+    assert queue.claim().attempts == 2
+    assert queue.claim() is None
+    assert queue.get(job_id)['status'] == 'failed'
+
+
+def test_renewed_leases_keep_a_job_from_being_claimed_again(queue):
+    queue.lease_seconds = 0.0
+    queue.submit(b'x')
+    job = queue.claim()
+
+    queue.lease_seconds = 60.0
+    assert queue.renew(job)
+    assert queue.claim() is None
+
+    # Once another worker has taken over, the first one can't renew it back
+    queue.lease_seconds = 0.0
+    assert queue.renew(job)
+    retried = queue.claim()
+    assert retried.attempts == 2
+    assert not queue.renew(job)
+    assert queue.renew(retried)
+
+
+def test_concurrent_workers_never_share_a_job(queue):
+    queue.max_queued = 100
+    for _ in range(40):
+        queue.submit(b'x')
+
+    claimed = []
+
+    def worker():
+        while True:
+            job = queue.claim()
+            if job is None:
+                return
+            claimed.append(job.id)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == len(set(claimed)) == 40
+
+
+def test_finished_jobs_are_purged(queue):
+    job_id = queue.submit(b'x')
+    queue.claim()
+    queue.complete(job_id, {})
+    assert queue.purge(3600) == 0
+    assert queue.purge(-1) == 1
+    assert queue.get(job_id) is None
+
+
+def test_webhook_retries_server_errors(monkeypatch):
+    statuses = [502, 200]
+    calls = []
+
+    class FakeResponse:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    def fake_post(url, json=None, timeout=None):
+        calls.append(json)
+        return FakeResponse(statuses.pop(0))
+
+    monkeypatch.setattr(requests, 'post', fake_post)
+    monkeypatch.setattr(job_queue.time, 'sleep', lambda seconds: None)
+
+    assert post_webhook('http://backend/hook', {'job_id': 'abc'}) is True
+    assert calls == [{'job_id': 'abc'}, {'job_id': 'abc'}]
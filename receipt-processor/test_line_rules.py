@@ -0,0 +1,21 @@
+from line_rules import LineRules, merge_keywords, merge_patterns
+
+
+def test_inline_ignorecase_stays_scoped():
+    merged = merge_patterns([r'(?i)(total|tax)', r'^ITEM$'])
+    assert merged.search('Sub TOTAL')
+    assert merged.search('ITEM')
+    assert not merged.search('item')
+
+
+def test_keywords_are_literal():
+    merged = merge_keywords(['visit us', 'www.'])
+    assert merged.search('please visit us again')
+    assert not merged.search('wwwx')
+
+
+def test_price_prefilter():
+    assert LineRules.may_have_price('Burger $10.00')
+    assert LineRules.may_have_price('Burger 10.')
+    assert not LineRules.may_have_price('Burger')
+    assert not LineRules.may_have_price('')
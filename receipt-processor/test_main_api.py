@@ -0,0 +1,448 @@
+import io
+import json
+import os
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from image_ingest import InvalidImageError, decode_image
+from test_single_pass_ocr import TEST_IMAGE_DIR
+
+
+def read_test_image(filename='images.png'):
+    with open(os.path.join(TEST_IMAGE_DIR, filename), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def fake_process_receipt(image_data, enhance_quality=True):
+        try:
+            decode_image(image_data)
+        except InvalidImageError as e:
+            return {'success': False, 'error_message': str(e), 'error_type': 'invalid_image'}
+        return {'success': True, 'total_amount': float(len(image_data) % 100),
+                'overall_confidence': 0.9, 'items': [], 'extracted_text': 'TOTAL',
+                'preprocessing_method': 'clahe', 'ocr_config': 'single_column',
+                'stage_timings': [{'stage': 'decode', 'ms': 1.5},
+                                  {'stage': 'ocr', 'method': 'clahe', 'config': 'single_column', 'ms': 250.0}]}
+
+    monkeypatch.setattr(main.processor, 'process_receipt', fake_process_receipt)
+    return TestClient(main.app)
+
+
+def test_batch_streams_one_line_per_receipt(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('receipts/one.png', read_test_image())
+        zf.writestr('receipts/broken.png', b'not an image')
+
+    files = [
+        ('files', ('single.png', read_test_image('Itemized+receipt+example.png'), 'image/png')),
+        ('files', ('month.zip', archive.getvalue(), 'application/zip')),
+    ]
+    response = client.post('/process-batch', files=files)
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+
+    lines = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line['index'])
+    assert [line['filename'] for line in lines] == [
+        'single.png', 'month.zip/receipts/one.png', 'month.zip/receipts/broken.png'
+    ]
+    assert [line['success'] for line in lines] == [True, True, False]
+    assert 'Invalid image format' in lines[2]['error_message']
+
+
+def test_batch_rejects_empty_archive(client):
+    archive = io.BytesIO()
+    zipfile.ZipFile(archive, 'w').close()
+
+    response = client.post('/process-batch', files=[('files', ('empty.zip', archive.getvalue(), 'application/zip'))])
+
+    assert response.status_code == 400
+
+
+def test_batch_refuses_archive_entries_before_unpacking_them(client, monkeypatch):
+    def upload(archive):
+        return client.post('/process-batch', files=[('files', ('month.zip', archive.getvalue(), 'application/zip'))])
+
+    # A zip bomb: megabytes of zeros deflate to a few kilobytes
+    bomb = io.BytesIO()
+    with zipfile.ZipFile(bomb, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('receipt.png', bytes(5 * 1024 * 1024))
+    response = upload(bomb)
+    assert response.status_code == 413
+    assert 'compression ratio' in response.json()['detail']
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('one.png', read_test_image())
+        zf.writestr('two.png', read_test_image())
+    monkeypatch.setattr(main, 'MAX_UPLOAD_BYTES', len(read_test_image()) - 1)
+    assert upload(archive).status_code == 413
+
+    monkeypatch.setattr(main, 'MAX_UPLOAD_BYTES', len(read_test_image()))
+    monkeypatch.setattr(main, 'BATCH_MAX_BYTES', 2 * len(read_test_image()) - 1)
+    response = upload(archive)
+    assert response.status_code == 413
+    assert str(2 * len(read_test_image()) - 1) in response.json()['detail']
+
+
+def test_batch_refuses_plain_files_over_the_per_file_limit(client, monkeypatch):
+    image = read_test_image()
+    monkeypatch.setattr(main, 'MAX_UPLOAD_BYTES', len(image) - 1)
+
+    response = client.post('/process-batch', files=[('files', ('receipt.png', image, 'image/png'))])
+
+    assert response.status_code == 413
+    assert 'receipt.png' in response.json()['detail']
+
+
+def test_batch_items_over_the_pixel_limit_fail_alone(client, monkeypatch):
+    monkeypatch.setattr(main, 'MAX_UPLOAD_PIXELS', 10_000)
+    files = [
+        ('files', ('large.png', read_test_image(), 'image/png')),
+        ('files', ('broken.png', b'not an image', 'image/png')),
+    ]
+    response = client.post('/process-batch', files=files)
+
+    assert response.status_code == 200
+    lines = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line['index'])
+    assert [line['success'] for line in lines] == [False, False]
+    assert 'pixel limit' in lines[0]['error_message']
+
+
+def test_no_free_worker_process_is_a_503(client, monkeypatch):
+    from worker_pool import ProcessorWorkerPool, WorkerUnavailableError
+
+    def no_free_worker(image_data, enhance_quality=True):
+        raise WorkerUnavailableError('No OCR worker process became free within 60s')
+
+    monkeypatch.setattr(main, 'worker_pool', ProcessorWorkerPool(size=1, factory=None))
+    monkeypatch.setattr(main.worker_pool, 'process_receipt', no_free_worker)
+    response = client.post('/process-file', files={'file': ('receipt.png', read_test_image(), 'image/png')})
+
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    assert 'result_cache' not in client.get('/stats').json()
+
+
+def test_process_file_sends_raw_bytes(client):
+    response = client.post('/process-file', files={'file': ('receipt.png', read_test_image(), 'image/png')})
+    assert response.status_code == 200
+    assert response.json()['success'] is True
+
+    response = client.post('/process-file', files={'file': ('receipt.png', b'not an image', 'image/png')})
+    assert response.status_code == 400
+
+
+def test_large_uploads_are_decoded_from_a_memory_map(client, monkeypatch):
+    import mmap
+
+    import cv2
+    import numpy as np
+
+    # Noise doesn't compress, so this PNG is well past the 1 MB spool threshold
+    noise = np.random.default_rng(0).integers(0, 256, (1200, 1200), dtype=np.uint8)
+    image = cv2.imencode('.png', noise)[1].tobytes()
+    assert len(image) > 1024 * 1024
+
+    received = []
+    fake_process_receipt = main.processor.process_receipt
+    monkeypatch.setattr(main.processor, 'process_receipt',
+                        lambda image_data, enhance_quality=True: received.append(image_data) or
+                        fake_process_receipt(image_data, enhance_quality))
+
+    response = client.post('/process-file', files={'file': ('receipt.png', image, 'image/png')})
+    assert response.status_code == 200
+    assert response.json()['total_amount'] == float(len(image) % 100)
+    assert [type(image_data) for image_data in received] == [mmap.mmap]
+    # Released by the pool once the worker thread finished with it
+    assert received[0].closed
+
+    monkeypatch.setattr(main, 'MAX_UPLOAD_BYTES', len(image) - 1)
+    response = client.post('/process-file', files={'file': ('receipt.png', image, 'image/png')})
+    assert response.status_code == 413
+    assert len(received) == 1
+
+
+def test_process_file_rejects_images_over_the_pixel_limit(client, monkeypatch):
+    monkeypatch.setattr(main, 'MAX_UPLOAD_PIXELS', 10_000)
+    response = client.post('/process-file', files={'file': ('receipt.png', read_test_image(), 'image/png')})
+    assert response.status_code == 413
+    assert 'pixel limit' in response.json()['detail']
+
+
+def test_body_size_limit_cuts_off_streamed_uploads():
+    from fastapi import FastAPI, Request
+
+    from upload_limits import BodySizeLimitMiddleware
+
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=1000, paths=['/upload'])
+
+    @app.post('/upload')
+    async def upload(request: Request):
+        return {'size': len(await request.body())}
+
+    client = TestClient(app)
+    assert client.post('/upload', content=b'x' * 1000).json() == {'size': 1000}
+    assert client.post('/upload', content=b'x' * 1001).status_code == 413
+
+    # No Content-Length: counted chunk by chunk as the body arrives
+    response = client.post('/upload', content=iter([b'x' * 600] * 5))
+    assert response.status_code == 413
+    assert 'content-length' not in response.request.headers
+
+
+def test_process_accepts_json_raw_and_msgpack_bodies(client, monkeypatch):
+    import base64
+
+    image = read_test_image()
+    expected = float(len(image) % 100)
+
+    response = client.post('/process', json={'image': base64.b64encode(image).decode('ascii')})
+    assert response.status_code == 200
+    assert response.json()['total_amount'] == expected
+
+    response = client.post('/process?include_timings=true', content=image, headers={'Content-Type': 'image/png'})
+    assert response.status_code == 200
+    assert response.json()['total_amount'] == expected
+    assert response.json()['stage_timings'] is not None
+
+    response = client.post('/process', content=b'not an image', headers={'Content-Type': 'image/jpeg'})
+    assert response.status_code == 400
+
+    response = client.post('/process', json={'enhance_quality': True})
+    assert response.status_code == 422
+
+    response = client.post('/process', content=image, headers={'Content-Type': 'text/plain'})
+    assert response.status_code == 415
+
+    monkeypatch.setattr(main, 'msgpack', None)
+    response = client.post('/process', content=b'\x81', headers={'Content-Type': 'application/msgpack'})
+    assert response.status_code == 415
+
+
+def test_process_accepts_msgpack_envelopes(client):
+    msgpack = pytest.importorskip('msgpack')
+    image = read_test_image()
+
+    body = msgpack.packb({'image': image, 'include_timings': True})
+    response = client.post('/process', content=body, headers={'Content-Type': 'application/msgpack'})
+    assert response.status_code == 200
+    assert response.json()['total_amount'] == float(len(image) % 100)
+    assert response.json()['stage_timings'] is not None
+
+    body = msgpack.packb({'picture': image})
+    response = client.post('/process', content=body, headers={'Content-Type': 'application/msgpack'})
+    assert response.status_code == 400
+
+
+def test_process_projects_fields_and_compresses_large_responses(client):
+    import gzip
+
+    image = read_test_image()
+    response = client.post('/process?fields=total_amount,store_name', content=image,
+                           headers={'Content-Type': 'image/png'})
+    assert response.status_code == 200
+    assert response.json() == {'success': True, 'error_message': None,
+                               'total_amount': float(len(image) % 100), 'store_name': None}
+
+    response = client.post('/process?fields=total,items', content=image, headers={'Content-Type': 'image/png'})
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Unknown fields: total'
+
+    # Small responses aren't worth compressing; large ones are
+    response = client.post('/process', content=image, headers={'Content-Type': 'image/png',
+                                                                'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    response = client.get('/openapi.json', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert int(response.headers['content-length']) < len(response.content)
+
+
+def test_batch_stream_is_not_held_back_by_gzip(monkeypatch):
+    import asyncio
+    import threading
+    import zlib
+
+    import httpx
+
+    first_line_sent = threading.Event()
+    events = []
+
+    def fake_process_receipt(image_data, enhance_quality=True):
+        if image_data == b'second':
+            # Finishes only once the first result has reached the client
+            first_line_sent.wait(5)
+            events.append('second finished')
+        return {'success': True, 'total_amount': 1.0, 'overall_confidence': 0.9, 'items': [],
+                'extracted_text': 'TOTAL ' * 400}
+
+    monkeypatch.setattr(main.processor, 'process_receipt', fake_process_receipt)
+    pool = main.OCRWorkerPool(max_in_flight=2, max_queue=4)
+    monkeypatch.setattr(main, 'ocr_pool', pool)
+
+    request = httpx.Request('POST', 'http://test/process-batch',
+                            files=[('files', ('first.png', b'first', 'image/png')),
+                                   ('files', ('second.png', b'second', 'image/png'))])
+    body = request.read()
+    scope = {'type': 'http', 'method': 'POST', 'path': '/process-batch', 'raw_path': b'/process-batch',
+             'query_string': b'', 'root_path': '', 'scheme': 'http', 'server': ('test', 80),
+             'http_version': '1.1', 'client': ('127.0.0.1', 1234),
+             'headers': [(b'accept-encoding', b'gzip'), (b'content-type', request.headers['content-type'].encode()),
+                         (b'content-length', str(len(body)).encode())]}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    decompressor = zlib.decompressobj(31)
+    received = b''
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(60)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal received
+        if message['type'] == 'http.response.start':
+            assert (b'content-encoding', b'gzip') in message['headers']
+        elif message['type'] == 'http.response.body':
+            received += decompressor.decompress(message.get('body', b''))
+            if b'\n' in received and not first_line_sent.is_set():
+                events.append('first line')
+                first_line_sent.set()
+
+    try:
+        asyncio.run(main.app(scope, receive, send))
+    finally:
+        pool.shutdown()
+
+    assert events == ['first line', 'second finished']
+    assert [json.loads(line)['filename'] for line in received.splitlines()] == ['first.png', 'second.png']
+
+
+def test_timings_are_opt_in_and_exported(client):
+    response = client.post('/process-file', files={'file': ('receipt.png', read_test_image(), 'image/png')})
+    assert response.json()['stage_timings'] is None
+
+    response = client.post('/process-file', files={'file': ('receipt.png', read_test_image(), 'image/png')},
+                           data={'include_timings': 'true'})
+    assert [span['stage'] for span in response.json()['stage_timings']] == ['decode', 'ocr']
+
+    metrics = client.get('/metrics')
+    assert metrics.status_code == 200
+    assert 'receipt_ocr_duration_seconds_count{config="single_column",method="clahe"}' in metrics.text
+    assert 'receipt_winning_strategy_total{config="single_column",method="clahe"}' in metrics.text
+    assert 'receipt_ocr_in_flight' in metrics.text
+
+
+def test_jobs_are_queued_and_polled(client, monkeypatch, tmp_path):
+    import asyncio
+    import base64
+
+    from job_queue import JobQueue
+    from ocr_pool import OCRWorkerPool
+
+    # No startup here, so no background job workers: each job is run directly
+    pool = OCRWorkerPool(max_in_flight=2, max_queue=4)
+    monkeypatch.setattr(main, 'ocr_pool', pool)
+    monkeypatch.setattr(main, 'job_queue', JobQueue(str(tmp_path / 'jobs.sqlite3')))
+    delivered = []
+    monkeypatch.setattr(main, 'post_webhook', lambda url, payload: delivered.append((url, payload)))
+    image = base64.b64encode(read_test_image()).decode('ascii')
+
+    def run_next_job():
+        asyncio.run(main.run_job(main.job_queue.claim()))
+
+    try:
+        response = client.post('/jobs', json={'image': image, 'webhook_url': 'http://backend/hook'})
+        assert response.status_code == 202
+        job_id = response.json()['job_id']
+        assert client.get(f'/jobs/{job_id}').json()['status'] == 'queued'
+
+        run_next_job()
+        job = client.get(f'/jobs/{job_id}').json()
+        assert job['status'] == 'done'
+        assert job['result']['success'] is True
+        assert delivered == [('http://backend/hook', job)]
+
+        # No readable text is an answer, not a failure
+        monkeypatch.setattr(main.processor, 'process_receipt', lambda image_data, enhance_quality=True: {
+            'success': False, 'error_message': 'No text could be extracted from the image',
+            'error_type': 'processing_error'})
+        job_id = client.post('/jobs', json={'image': image}).json()['job_id']
+        run_next_job()
+        job = client.get(f'/jobs/{job_id}').json()
+        assert job['status'] == 'done'
+        assert job['result']['error_message'] == 'No text could be extracted from the image'
+
+        def raise_error(image_data, enhance_quality=True):
+            raise RuntimeError('tesseract crashed')
+
+        monkeypatch.setattr(main.processor, 'process_receipt', raise_error)
+        job_id = client.post('/jobs', json={'image': image}).json()['job_id']
+        run_next_job()
+        job = client.get(f'/jobs/{job_id}').json()
+        assert job['status'] == 'failed'
+        assert job['error'] == 'tesseract crashed'
+    finally:
+        pool.shutdown()
+
+    assert client.get('/jobs/unknown').status_code == 404
+    assert client.post('/jobs', json={'image': image, 'webhook_url': 'file:///etc'}).status_code == 400
+
+    monkeypatch.setattr(main, 'MAX_UPLOAD_PIXELS', 10_000)
+    assert client.post('/jobs', json={'image': image}).status_code == 413
+
+
+def test_jobs_outliving_their_lease_are_not_claimed_twice(client, monkeypatch, tmp_path):
+    import asyncio
+    import time
+
+    from job_queue import JobQueue
+    from ocr_pool import OCRWorkerPool
+
+    pool = OCRWorkerPool(max_in_flight=1, max_queue=0)
+    monkeypatch.setattr(main, 'ocr_pool', pool)
+    monkeypatch.setattr(main, 'job_queue', JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=0.3))
+    job_id = main.job_queue.submit(read_test_image())
+
+    reclaimed = []
+    fake_process_receipt = main.processor.process_receipt
+
+    def slow_process_receipt(image_data, enhance_quality=True):
+        # Several leases pass while this runs; another worker looks for work meanwhile
+        for _ in range(4):
+            time.sleep(0.25)
+            reclaimed.append(main.job_queue.claim())
+        return fake_process_receipt(image_data, enhance_quality)
+
+    monkeypatch.setattr(main.processor, 'process_receipt', slow_process_receipt)
+    try:
+        asyncio.run(main.run_job(main.job_queue.claim()))
+    finally:
+        pool.shutdown()
+
+    assert reclaimed == [None] * 4
+    job = main.job_queue.get(job_id)
+    assert (job['status'], job['attempts']) == ('done', 1)
+
+
+def test_job_workers_purge_finished_jobs_periodically(monkeypatch):
+    import asyncio
+
+    purges = []
+    monkeypatch.setattr(main.job_queue, 'purge', lambda max_age: purges.append(max_age) or 0)
+    monkeypatch.setattr(main, 'last_job_purge', None)
+
+    asyncio.run(main.purge_finished_jobs())
+    asyncio.run(main.purge_finished_jobs())
+    assert purges == [main.JOB_RETENTION_SECONDS]
+
+    monkeypatch.setattr(main, 'JOB_PURGE_INTERVAL_SECONDS', 0)
+    asyncio.run(main.purge_finished_jobs())
+    assert len(purges) == 2
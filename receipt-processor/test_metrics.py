@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+# prometheus_client picks its value store when it is imported, so each
+# "uvicorn worker" is a fresh interpreter with PROMETHEUS_MULTIPROC_DIR set
+WORKER = '''
+import asyncio
+import sys
+import threading
+
+import metrics
+from ocr_pool import OCRWorkerPool
+
+busy = int(sys.argv[1])
+release = threading.Event()
+
+async def scenario():
+    pool = OCRWorkerPool(max_in_flight=busy, max_queue=0)
+    metrics.bind_pool(pool)
+    jobs = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(busy)]
+    await asyncio.sleep(0.1)
+    print(metrics.render()[0].decode() + '# END', flush=True)
+    sys.stdin.readline()
+    release.set()
+    await asyncio.gather(*jobs)
+    pool.shutdown()
+
+asyncio.run(scenario())
+'''
+
+
+def sample(exposition, name):
+    for line in exposition.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split()[1])
+    return None
+
+
+def test_in_flight_gauge_is_summed_across_processes(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    here = os.path.dirname(os.path.abspath(__file__))
+    workers = []
+    try:
+        for busy in (1, 2):
+            worker = subprocess.Popen([sys.executable, '-c', WORKER, str(busy)], cwd=here, env=env,
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            workers.append(worker)
+            exposition = ''
+            for line in worker.stdout:
+                if line == '# END\n':
+                    break
+                exposition += line
+
+        assert sample(exposition, 'receipt_ocr_in_flight') == 3.0
+        assert sample(exposition, 'receipt_ocr_queue_depth') == 0.0
+    finally:
+        for worker in workers:
+            worker.communicate('\n', timeout=30)
@@ -0,0 +1,57 @@
+import os
+
+import cv2
+import pytest
+
+import ocr_engines
+from ocr_engines import get_engine, parse_config
+from receipt_processor import ReceiptProcessor
+from test_single_pass_ocr import TEST_IMAGE_DIR, normalize, tesseract_available
+
+
+def test_parse_config():
+    assert parse_config('--oem 3 --psm 4') == (3, 4)
+    assert parse_config('--psm 11') == (3, 11)
+    assert parse_config('') == (3, 3)
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        ReceiptProcessor(engine='ocrad')
+
+
+def tesserocr_available():
+    # The import alone isn't enough: the engine also needs readable traineddata
+    try:
+        get_engine('tesserocr')
+        return True
+    except RuntimeError:
+        return False
+
+
+@pytest.mark.skipif(not tesserocr_available() or not tesseract_available(),
+                    reason='tesserocr with its traineddata and the tesseract binary are all required')
+def test_in_process_engine_matches_subprocess_engine():
+    processor = ReceiptProcessor()
+    image = cv2.imread(os.path.join(TEST_IMAGE_DIR, 'Itemized+receipt+example.png'), cv2.IMREAD_GRAYSCALE)
+
+    texts = []
+    for name in ('pytesseract', 'tesserocr'):
+        data = get_engine(name).image_to_data(image, '--oem 3 --psm 4')
+        texts.append(normalize(processor._build_layout_from_data(data)['text']))
+
+    assert texts[0] == texts[1]
+
+
+@pytest.mark.skipif(ocr_engines.tesserocr is None, reason='tesserocr is not installed')
+def test_in_process_engine_reports_bad_tessdata_at_startup(tmp_path):
+    with pytest.raises(RuntimeError, match=str(tmp_path)):
+        ocr_engines.TesserocrEngine(tessdata_path=str(tmp_path))
+
+
+@pytest.mark.skipif(not tesserocr_available(), reason='tesserocr with its traineddata is required')
+def test_in_process_orientation_detection_failure_returns_none(tmp_path):
+    engine = ocr_engines.TesserocrEngine()
+    engine.tessdata_path = str(tmp_path)  # osd.traineddata can't be found
+    image = cv2.imread(os.path.join(TEST_IMAGE_DIR, 'images.png'), cv2.IMREAD_GRAYSCALE)
+    assert engine.detect_orientation(image) is None
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import pytest
+
+from ocr_pool import OCRWorkerPool, PoolSaturatedError
+
+
+def test_pool_rejects_when_slots_and_queue_are_full():
+    release = threading.Event()
+
+    async def scenario():
+        pool = OCRWorkerPool(max_in_flight=1, max_queue=1)
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(lambda: 'done'))
+        await asyncio.sleep(0.05)
+
+        assert pool.stats()['in_flight'] == 1
+        assert pool.stats()['queue_depth'] == 1
+        with pytest.raises(PoolSaturatedError) as error:
+            await pool.run(lambda: None)
+        assert error.value.retry_after >= 1
+
+        release.set()
+        await running
+        result, queue_stats = await queued
+        pool.shutdown()
+        return pool, result, queue_stats
+
+    pool, result, queue_stats = asyncio.run(scenario())
+
+    assert result == 'done'
+    assert queue_stats['queue_depth'] == 0
+    assert queue_stats['queue_wait_ms'] > 0
+    assert pool.stats()['completed'] == 2
+    assert pool.stats()['rejected'] == 1
+
+
+def test_event_loop_stays_responsive_while_work_runs():
+    release = threading.Event()
+
+    async def scenario():
+        pool = OCRWorkerPool(max_in_flight=1, max_queue=0)
+        job = asyncio.ensure_future(pool.run(release.wait))
+        # The loop keeps serving other coroutines while the job blocks its thread
+        await asyncio.sleep(0.01)
+        release.set()
+        await job
+        pool.shutdown()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+def test_cancelled_job_keeps_its_slot_until_its_thread_finishes():
+    release = threading.Event()
+
+    async def scenario():
+        pool = OCRWorkerPool(max_in_flight=1, max_queue=1)
+        abandoned = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        await asyncio.sleep(0.05)
+
+        # The thread is still busy, so the slot is too
+        assert pool.stats()['in_flight'] == 1
+        queued = asyncio.ensure_future(pool.run(lambda: 'done'))
+        await asyncio.sleep(0.05)
+        assert not queued.done()
+
+        release.set()
+        result, _ = await queued
+        pool.shutdown()
+        return pool, result
+
+    pool, result = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+    assert result == 'done'
+    assert pool.stats()['in_flight'] == 0
+    assert pool.stats()['completed'] == 2
+
+
+def test_on_done_waits_for_the_thread_not_the_caller():
+    release = threading.Event()
+    done = []
+
+    async def scenario():
+        pool = OCRWorkerPool(max_in_flight=1, max_queue=0)
+        abandoned = asyncio.ensure_future(pool.run(release.wait, on_done=lambda: done.append('abandoned')))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        await asyncio.sleep(0.05)
+
+        # The caller is gone but the thread may still be reading its buffer
+        assert done == []
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(lambda: None, on_done=lambda: done.append('rejected'))
+        assert done == ['rejected']
+
+        release.set()
+        await asyncio.sleep(0.05)
+        pool.shutdown()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+    assert done == ['rejected', 'abandoned']
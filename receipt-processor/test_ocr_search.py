@@ -0,0 +1,196 @@
+import cv2
+import numpy as np
+import pytesseract
+
+import receipt_processor
+from receipt_processor import ReceiptProcessor
+from stage_timer import StageTimer
+from test_single_pass_ocr import make_data
+
+CLEAN_RECEIPT = [
+    (1, 1, 1, 'SUBTOTAL', 95), (1, 1, 1, '$13.95', 95),
+    (1, 1, 2, 'TAX', 95), (1, 1, 2, '$0.84', 95),
+    (1, 1, 3, 'TOTAL', 95), (1, 1, 3, '$14.79', 95),
+]
+NOISY_RECEIPT = [(1, 1, 1, 'T0TAL', 40), (1, 1, 1, '$l4.79', 40)]
+
+
+def preprocessed_images():
+    image = np.full((40, 40), 255, dtype=np.uint8)
+    return [{'image': image, 'method': method}
+            for method in ('grayscale', 'bilateral_otsu', 'clahe', 'adaptive_gaussian')]
+
+
+def fake_tesseract(monkeypatch, words_for_call):
+    calls = []
+
+    def fake_image_to_data(image, config='', output_type=None):
+        calls.append(config)
+        return make_data(words_for_call(len(calls)))
+
+    monkeypatch.setattr(pytesseract, 'image_to_data', fake_image_to_data)
+    return calls
+
+
+def test_grid_runs_every_combination(monkeypatch):
+    calls = fake_tesseract(monkeypatch, lambda n: CLEAN_RECEIPT)
+    results = ReceiptProcessor().perform_ocr(preprocessed_images())
+    assert len(calls) == len(results) == 20
+
+
+def test_cascade_stops_at_first_acceptable_result(monkeypatch):
+    calls = fake_tesseract(monkeypatch, lambda n: NOISY_RECEIPT if n == 1 else CLEAN_RECEIPT)
+    processor = ReceiptProcessor(search_mode='cascade', early_exit_score=90, early_exit_confidence=80)
+
+    results = processor.perform_ocr(preprocessed_images())
+
+    assert len(calls) == len(results) == 2
+    assert [(r['method'], r['config']) for r in results] == processor.strategy_order[:2]
+    assert results[-1]['extracted_data']['total_amount'] == 14.79
+
+
+def test_cascade_respects_order_and_budget(monkeypatch):
+    calls = fake_tesseract(monkeypatch, lambda n: NOISY_RECEIPT)
+    order = [('clahe', 'uniform_block'), ('grayscale', 'sparse_text'), ('grayscale', 'single_column')]
+    processor = ReceiptProcessor(search_mode='cascade', strategy_order=order, max_ocr_attempts=2)
+
+    results = processor.perform_ocr(preprocessed_images())
+
+    assert calls == ['--oem 3 --psm 6', '--oem 3 --psm 11']
+    assert [(r['method'], r['config']) for r in results] == order[:2]
+
+
+def test_parallel_grid_matches_sequential(monkeypatch):
+    fake_tesseract(monkeypatch, lambda n: CLEAN_RECEIPT if n % 3 else NOISY_RECEIPT)
+    sequential = ReceiptProcessor().perform_ocr(preprocessed_images())
+
+    fake_tesseract(monkeypatch, lambda n: CLEAN_RECEIPT)
+    processor = ReceiptProcessor(ocr_workers=4)
+    try:
+        parallel = processor.perform_ocr(preprocessed_images())
+    finally:
+        processor.close()
+
+    key = lambda r: (r['method'], r['config'])
+    assert [key(r) for r in parallel] == [key(r) for r in sequential]
+    # Every parallel result ties, so the first combination in grid order wins
+    assert key(processor.select_best_ocr_result(parallel)) == ('grayscale', 'single_column')
+
+
+def test_stage_timings_cover_every_ocr_run(monkeypatch):
+    fake_tesseract(monkeypatch, lambda n: CLEAN_RECEIPT)
+    processor = ReceiptProcessor(correct_orientation=False)
+    image = np.full((200, 200), 255, dtype=np.uint8)
+
+    result = processor.process_receipt(cv2.imencode('.png', image)[1].tobytes())
+
+    stages = [span['stage'] for span in result['stage_timings']]
+    assert stages[:2] == ['decode', 'normalize']
+    assert stages.count('preprocess') == 3
+    assert stages.count('ocr') == 20
+    assert {'scoring', 'extraction'} <= set(stages)
+    assert all(span['ms'] >= 0 for span in result['stage_timings'])
+
+
+def test_stream_picks_the_grid_winner_holding_one_full_result(monkeypatch):
+    # Scores vary by call and tie in places, so the winner depends on order
+    receipts = lambda n: CLEAN_RECEIPT if n % 7 == 3 else NOISY_RECEIPT
+    fake_tesseract(monkeypatch, receipts)
+    image = np.full((200, 200), 255, dtype=np.uint8)
+    grid = ReceiptProcessor(correct_orientation=False)._run_pipeline(image, enhance_quality=True)
+
+    fake_tesseract(monkeypatch, receipts)
+    processor = ReceiptProcessor(search_mode='stream', correct_orientation=False)
+    results = processor._perform_streaming_ocr(image, True, StageTimer())
+
+    assert len(results) == 20
+    full = [result for result in results if 'data' in result]
+    assert len(full) == 1 and processor.select_best_ocr_result(results) is full[0]
+
+    fake_tesseract(monkeypatch, receipts)
+    stream = processor._run_pipeline(image, enhance_quality=True)
+    for field in ('preprocessing_method', 'ocr_config', 'total_amount', 'extracted_text', 'ocr_attempts'):
+        assert stream[field] == grid[field]
+
+
+def test_stream_only_builds_variants_it_will_read(monkeypatch):
+    calls = fake_tesseract(monkeypatch, lambda n: CLEAN_RECEIPT)
+    built = []
+    original = receipt_processor._apply_preprocessing
+    monkeypatch.setattr(receipt_processor, '_apply_preprocessing',
+                        lambda gray, method: built.append(method) or original(gray, method))
+
+    processor = ReceiptProcessor(search_mode='stream', max_ocr_attempts=7)
+    timer = StageTimer()
+    results = processor._perform_streaming_ocr(np.full((40, 40), 255, dtype=np.uint8), True, timer)
+
+    assert len(calls) == len(results) == 7
+    assert built == ['bilateral_otsu']
+    assert [span['method'] for span in timer.spans] == ['bilateral_otsu']
+
+
+def test_cascade_only_builds_variants_it_reaches(monkeypatch):
+    calls = fake_tesseract(monkeypatch, lambda n: NOISY_RECEIPT if n == 1 else CLEAN_RECEIPT)
+    built = []
+    original = receipt_processor._apply_preprocessing
+    monkeypatch.setattr(receipt_processor, '_apply_preprocessing',
+                        lambda gray, method: built.append(method) or original(gray, method))
+
+    order = [('clahe', 'uniform_block'), ('clahe', 'single_column'), ('bilateral_otsu', 'single_column')]
+    processor = ReceiptProcessor(search_mode='cascade', strategy_order=order, early_exit_score=90,
+                                 early_exit_confidence=80, correct_orientation=False)
+    timer = StageTimer()
+    result = processor._run_pipeline(np.full((40, 40), 255, dtype=np.uint8), True, timer)
+
+    assert result['total_amount'] == 14.79
+    assert len(calls) == 2
+    assert built == ['clahe']
+    assert [span['method'] for span in timer.spans if span['stage'] == 'preprocess'] == ['clahe']
+
+
+def test_refine_rereads_only_low_confidence_lines(monkeypatch):
+    page = CLEAN_RECEIPT[:4] + [(1, 1, 3, 'T0TAL', 40), (1, 1, 3, '$l4.79', 40)]
+    line_readings = {'--oem 3 --psm 6': [(1, 1, 1, 'TOTAL', 90), (1, 1, 1, '$14.79', 90)],
+                     '--oem 3 --psm 4': [(1, 1, 1, 'TOTAL', 85), (1, 1, 1, '$14.7', 95)]}
+    calls = []
+
+    def fake_image_to_data(image, config='', output_type=None):
+        calls.append((config, image.size))
+        return make_data(page if len(calls) == 1 else line_readings[config])
+
+    monkeypatch.setattr(pytesseract, 'image_to_data', fake_image_to_data)
+    processor = ReceiptProcessor(search_mode='refine', correct_orientation=False)
+    timer = StageTimer()
+    result = processor._run_pipeline(np.full((200, 200), 255, dtype=np.uint8), True, timer)
+
+    # One full pass, then a sheet holding the weak line's crop for each of
+    # 4 variants x 2 configs; the reading that drops a digit is never taken
+    assert calls[0] == ('--oem 3 --psm 4', (200, 200))
+    assert len(calls) == 9
+    assert all(config in line_readings and height == 3 * 16 for config, (_, height) in calls[1:])
+    assert result['extracted_text'] == 'SUBTOTAL $13.95\nTAX $0.84\nTOTAL $14.79\n'
+    assert result['total_amount'] == 14.79
+    assert result['refined_lines'] == 1 and result['ocr_attempts'] == 9
+    assert len([span for span in timer.spans if span['stage'] == 'ocr']) == 9
+
+
+def test_refine_keeps_confident_pages_to_one_pass(monkeypatch):
+    calls = fake_tesseract(monkeypatch, lambda n: CLEAN_RECEIPT)
+    processor = ReceiptProcessor(search_mode='refine', correct_orientation=False)
+    result = processor._run_pipeline(np.full((200, 200), 255, dtype=np.uint8), True)
+
+    assert len(calls) == 1
+    assert result['refined_lines'] == 0 and result['total_amount'] == 14.79
+
+
+def test_stacked_line_crops_map_back_to_their_lines():
+    crops = [np.zeros((10, 50), dtype=np.uint8), np.zeros((16, 80), dtype=np.uint8)]
+    sheet, bands = receipt_processor._stack_line_crops(crops)
+    assert sheet.shape == (16 + 10 + 16 + 16 + 16, 80 + 32)
+    assert (sheet == 0).sum() == 10 * 50 + 16 * 80
+
+    lines = [{'bbox': [60, 42, 90, 58], 'text': '$1.00', 'avg_confidence': 90},
+             {'bbox': [16, 44, 50, 56], 'text': 'MILK 2L', 'avg_confidence': 60},
+             {'bbox': [16, 16, 66, 26], 'text': 'TOTAL', 'avg_confidence': 80}]
+    readings = receipt_processor._readings_by_band(lines, bands)
+    assert readings == {0: ('TOTAL', 80), 1: ('MILK 2L $1.00', (60 * 2 + 90) / 3)}
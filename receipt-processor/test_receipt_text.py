@@ -0,0 +1,27 @@
+import re
+
+from receipt_processor import ReceiptProcessor
+from receipt_text import ReceiptText
+
+
+def test_keywords_and_amounts_found_once():
+    receipt_text = ReceiptText("JOE'S DINER\nBurger 10.00\nSubtotal 10.00\nTAX 0.80\nTotal 10.80\n")
+    assert receipt_text.keywords['tax'] == receipt_text.text.index('TAX')
+    assert receipt_text.keywords['tot'] == receipt_text.text.index('total')
+    assert 'vat' not in receipt_text.keywords
+    assert receipt_text.amounts == [10.0, 10.0, 0.8, 10.8]
+
+
+def test_scan_starts_at_keyword_line():
+    receipt_text = ReceiptText("Burger 10.00\nTAX 0.80\n")
+    pattern = re.compile(r'(?im)^.*tax.*$')
+    assert receipt_text.scan_start(['tax']) == receipt_text.text.index('TAX')
+    assert receipt_text.scan_start(['tax'], anchored=False) == 0
+    assert receipt_text.scan_start(['vat']) is None
+    assert receipt_text.search(pattern, ['tax']).group(0) == 'TAX 0.80'
+
+
+def test_matches_spanning_lines_are_kept():
+    processor = ReceiptProcessor()
+    assert processor.extract_structured_data("Coffee 30.00\nGRAND\nTOTAL\n$ 9.50\n")['total_amount'] == 9.5
+    assert processor.extract_structured_data("Coffee 30.00\n$12.00\ntotal\n")['total_amount'] == 12.0
@@ -0,0 +1,68 @@
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import response_compression
+from response_compression import CompressionMiddleware
+
+
+class FakeBrotli:
+    """zlib behind brotli's Compressor interface, as the package isn't always installed"""
+
+    class Compressor:
+        def __init__(self, quality=11):
+            self.compressor = zlib.compressobj()
+
+        def process(self, data):
+            return self.compressor.compress(data)
+
+        def flush(self):
+            return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish(self):
+            return self.compressor.flush()
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get('/text/{size}')
+    async def text(size: int):
+        return PlainTextResponse('x' * size)
+
+    @app.get('/stream')
+    async def stream():
+        return StreamingResponse(iter([b'{"a": 1}\n'] * 3), media_type='application/x-ndjson')
+
+    return TestClient(app)
+
+
+def test_gzip_above_the_threshold_only():
+    client = make_client()
+    assert 'content-encoding' not in client.get('/text/99', headers={'Accept-Encoding': 'gzip'}).headers
+
+    response = client.get('/text/5000', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.text == 'x' * 5000
+
+
+def test_brotli_when_installed_and_accepted(monkeypatch):
+    monkeypatch.setattr(response_compression, 'brotli', FakeBrotli)
+    client = make_client()
+
+    response = client.get('/text/5000', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['content-encoding'] == 'br'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert int(response.headers['content-length']) == len(response.content)
+    assert zlib.decompress(response.content) == b'x' * 5000
+
+    response = client.get('/stream', headers={'Accept-Encoding': 'br'})
+    assert 'content-length' not in response.headers
+    assert zlib.decompress(response.content) == b'{"a": 1}\n' * 3
+
+    response = client.get('/text/5000', headers={'Accept-Encoding': 'br;q=0, gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-encoding' not in client.get('/text/99', headers={'Accept-Encoding': 'br'}).headers
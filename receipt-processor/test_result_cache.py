@@ -0,0 +1,101 @@
+import threading
+import time
+
+from receipt_processor import ReceiptProcessor
+from result_cache import ResultCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.get_or_compute(key, lambda: {'key': key})
+    cache.get_or_compute('a', lambda: {'key': 'recomputed'})
+    cache.get_or_compute('c', lambda: {'key': 'c'})
+
+    assert cache.get_or_compute('a', lambda: {'key': 'recomputed'}) == ({'key': 'a'}, 'hit')
+    assert cache.get_or_compute('b', lambda: {'key': 'b2'}) == ({'key': 'b2'}, 'miss')
+    assert cache.stats()['evictions'] == 2
+
+
+def test_results_are_copied_and_failures_are_not_cached():
+    cache = ResultCache()
+    result, _ = cache.get_or_compute('ok', lambda: {'items': []})
+    result['items'].append('mutated')
+    assert cache.get_or_compute('ok', lambda: {})[0] == {'items': []}
+
+    cacheable = lambda result: result['success']
+    cache.get_or_compute('bad', lambda: {'success': False}, cacheable)
+    assert cache.get_or_compute('bad', lambda: {'success': True}, cacheable)[1] == 'miss'
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).get_or_compute('k' * 64, lambda: {'total': 14.79})
+
+    other = ResultCache(disk_dir=str(tmp_path))
+    assert other.get_or_compute('k' * 64, lambda: {'total': 0}) == ({'total': 14.79}, 'disk_hit')
+    assert other.get_or_compute('k' * 64, lambda: {'total': 0}) == ({'total': 14.79}, 'hit')
+
+
+def test_disk_tier_is_bounded_and_leaves_no_lock_files(tmp_path):
+    import os
+
+    cache = ResultCache(max_entries=1, disk_dir=str(tmp_path), max_disk_entries=3)
+    keys = [f"{i:02d}" * 32 for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.get_or_compute(key, lambda: {'key': key})
+        # Spaced out so the order doesn't depend on the filesystem's mtime resolution
+        os.utime(next(tmp_path.glob(f'*/{key}.json')), (1000 + i, 1000 + i))
+
+    assert sorted(path.stem for path in tmp_path.glob('*/*.json')) == keys[2:]
+    assert list(tmp_path.glob('*/*.lock')) == []
+    assert cache.stats()['disk_evictions'] == 2
+
+    # A disk hit counts as a use, so that entry outlives newer ones
+    os.utime(next(tmp_path.glob(f'*/{keys[2]}.json')), (0, 0))
+    assert ResultCache(disk_dir=str(tmp_path)).get_or_compute(keys[2], dict)[1] == 'disk_hit'
+    cache.get_or_compute('99' * 32, lambda: {'key': 'new'})
+    assert keys[2] in [path.stem for path in tmp_path.glob('*/*.json')]
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'total': 1.0}
+
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(cache.get_or_compute('key', compute)[1]))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(statuses) == ['coalesced'] * 3 + ['miss']
+
+
+def test_cache_key_depends_on_content_and_settings():
+    processor = ReceiptProcessor()
+    key = processor.cache_key(b'image', True)
+
+    assert key == ReceiptProcessor().cache_key(b'image', True)
+    assert key != processor.cache_key(b'image', False)
+    assert key != processor.cache_key(b'other', True)
+    assert key != ReceiptProcessor(search_mode='cascade').cache_key(b'image', True)
+
+
+def test_cache_key_changes_with_any_pipeline_module(tmp_path, monkeypatch):
+    import line_rules
+
+    key = ReceiptProcessor().cache_key(b'image', True)
+
+    edited = tmp_path / 'line_rules.py'
+    with open(line_rules.__file__) as f:
+        edited.write_text(f.read() + '\n# rule change\n')
+    monkeypatch.setattr(line_rules, '__file__', str(edited))
+
+    assert ReceiptProcessor().cache_key(b'image', True) != key
@@ -0,0 +1,94 @@
+import difflib
+import os
+import re
+
+import numpy as np
+import pytest
+import pytesseract
+
+from receipt_processor import ReceiptProcessor
+
+TEST_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test')
+
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def make_data(words):
+    """Build image_to_data TSV output from (block, par, line, text, conf) tuples"""
+    rows = ['level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext',
+            '1\t1\t0\t0\t0\t0\t0\t0\t400\t300\t-1\t']
+    for word_num, (block, par, line, text, conf) in enumerate(words, 1):
+        rows.append(f"5\t1\t{block}\t{par}\t{line}\t{word_num}\t{10 * word_num}\t{20 * line}\t8\t12\t{conf}\t{text}")
+    return '\n'.join(rows) + '\n'
+
+
+def normalize(text):
+    return '\n'.join(re.sub(r'\s+', ' ', line).strip() for line in text.splitlines() if line.strip())
+
+
+def test_layout_rebuilds_lines_and_blocks():
+    processor = ReceiptProcessor()
+    data = make_data([
+        (1, 1, 1, 'WALMART', 95),
+        (1, 1, 1, 'SUPERCENTER', 90),
+        (1, 1, 2, '11/25/2024', 88),
+        (2, 1, 1, 'BANANAS', 92),
+        (2, 1, 1, '$2.48', -1),
+        (2, 2, 1, 'TOTAL', 96),
+        (2, 2, 1, '$14.79', 94),
+    ])
+
+    layout = processor._build_layout_from_data(data)
+
+    assert layout['text'] == 'WALMART SUPERCENTER\n11/25/2024\n\nBANANAS $2.48\n\nTOTAL $14.79\n'
+    assert [line['text'] for line in layout['lines']] == [
+        'WALMART SUPERCENTER', '11/25/2024', 'BANANAS $2.48', 'TOTAL $14.79'
+    ]
+    assert layout['blocks'] == ['WALMART SUPERCENTER\n11/25/2024', 'BANANAS $2.48\nTOTAL $14.79']
+    assert layout['lines'][2]['avg_confidence'] == 92
+    assert layout['lines'][0]['bbox'] == [10, 20, 28, 32]
+
+
+def test_perform_ocr_runs_tesseract_once_per_combination(monkeypatch):
+    processor = ReceiptProcessor()
+    calls = []
+
+    def fake_image_to_data(image, config='', output_type=None):
+        calls.append(config)
+        return make_data([(1, 1, 1, 'TOTAL', 90), (1, 1, 1, '$5.00', 90)])
+
+    def fail_image_to_string(*args, **kwargs):
+        raise AssertionError('image_to_string should not be called')
+
+    monkeypatch.setattr(pytesseract, 'image_to_data', fake_image_to_data)
+    monkeypatch.setattr(pytesseract, 'image_to_string', fail_image_to_string)
+
+    image = np.full((40, 40), 255, dtype=np.uint8)
+    results = processor.perform_ocr([{'image': image, 'method': 'grayscale'}])
+
+    assert len(calls) == len(results) == 5
+    assert all(result['text'] == 'TOTAL $5.00\n' for result in results)
+
+
+@pytest.mark.skipif(not tesseract_available(), reason='Tesseract is not installed')
+@pytest.mark.parametrize('filename', sorted(os.listdir(TEST_IMAGE_DIR)))
+def test_rebuilt_text_matches_image_to_string(filename):
+    processor = ReceiptProcessor()
+    with open(os.path.join(TEST_IMAGE_DIR, filename), 'rb') as f:
+        preprocessed = processor.preprocess_image(f.read(), enhance_quality=False)
+
+    image = preprocessed[0]['image']
+    config = '--oem 3 --psm 4'
+    expected = pytesseract.image_to_string(image, config=config)
+    data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+    rebuilt = processor._build_layout_from_data(data)['text']
+
+    ratio = difflib.SequenceMatcher(None, normalize(expected), normalize(rebuilt)).ratio()
+    assert ratio >= 0.98
+    assert processor.extract_structured_data(rebuilt) == processor.extract_structured_data(expected)
@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+import pytesseract
+
+from receipt_processor import ReceiptProcessor
+from strategy_stats import StrategyStats, wilson_upper
+from test_ocr_search import CLEAN_RECEIPT, NOISY_RECEIPT
+from test_single_pass_ocr import make_data
+
+COMBINATIONS = ['grayscale/single_column', 'clahe/single_column', 'grayscale/legacy_single']
+
+
+def result(combination, score):
+    method, config = combination.split('/')
+    return {'method': method, 'config': config, 'combined_score': score}
+
+
+def record_round(stats, scores):
+    results = [result(combination, score) for combination, score in zip(COMBINATIONS, scores)]
+    stats.record(results, max(results, key=lambda r: r['combined_score']))
+
+
+def test_wilson_bound_shrinks_with_evidence():
+    assert wilson_upper(0, 0) == 1.0
+    assert wilson_upper(0, 10) > wilson_upper(0, 100) > 0
+    assert wilson_upper(50, 100) > 0.5
+
+
+def test_rarely_winning_combinations_are_pruned():
+    stats = StrategyStats(exploration=0.0, min_trials=20, min_win_rate=0.1, min_gain=1.0)
+    for i in range(60):
+        # legacy_single never wins; clahe wins one receipt in four, narrowly
+        record_round(stats, [90, 91 if i % 4 == 0 else 80, 40])
+
+    assert stats.select(COMBINATIONS, key=lambda c: c) == COMBINATIONS[:2]
+    summary = stats.stats()['combinations']
+    assert summary['grayscale/legacy_single'] == {'runs': 60, 'wins': 0, 'win_rate': 0.0,
+                                                  'mean_gain': 0.0, 'pruned': True}
+    assert summary['clahe/single_column']['wins'] == 15
+
+
+def test_rare_but_large_wins_are_kept():
+    stats = StrategyStats(exploration=0.0, min_trials=20, min_win_rate=0.1, min_gain=1.0)
+    for i in range(60):
+        # Wins one receipt in thirty, but by 60 points when it does
+        record_round(stats, [90, 80, 150 if i % 30 == 0 else 40])
+
+    assert stats.is_pruned('grayscale/legacy_single') is False
+
+
+def test_exploration_rounds_run_everything():
+    stats = StrategyStats(exploration=1.0, min_trials=1, min_win_rate=0.5)
+    record_round(stats, [90, 80, 40])
+    assert stats.select(COMBINATIONS, key=lambda c: c) == COMBINATIONS
+    assert stats.stats()['explored'] == 1
+
+
+def test_counts_persist_and_merge_between_workers(tmp_path):
+    path = str(tmp_path / 'strategy_stats.json')
+    first = StrategyStats(path=path, save_every=100)
+    second = StrategyStats(path=path, save_every=100)
+    record_round(first, [90, 80, 40])
+    record_round(second, [80, 90, 40])
+    first.save()
+    second.save()
+
+    with open(path) as f:
+        saved = json.load(f)['combinations']
+    assert saved['grayscale/single_column'] == {'runs': 2, 'wins': 1, 'gain': 10.0}
+
+    restarted = StrategyStats(path=path)
+    assert restarted.stats()['combinations']['clahe/single_column']['wins'] == 1
+    # The second worker saw the first worker's counts when it saved
+    assert second.stats()['combinations']['grayscale/single_column']['runs'] == 2
+
+
+def test_processor_stops_running_pruned_combinations(monkeypatch):
+    calls = []
+
+    def fake_image_to_data(image, config='', output_type=None):
+        calls.append(config)
+        return make_data(CLEAN_RECEIPT if config == '--oem 3 --psm 4' else NOISY_RECEIPT)
+
+    monkeypatch.setattr(pytesseract, 'image_to_data', fake_image_to_data)
+    stats = StrategyStats(exploration=0.0, min_trials=3, min_win_rate=0.5)
+    processor = ReceiptProcessor(strategy_stats=stats)
+    image = np.full((40, 40), 255, dtype=np.uint8)
+
+    for _ in range(3):
+        processor._run_pipeline(image, enhance_quality=True)
+    assert len(calls) == 60
+
+    del calls[:]
+    result = processor._run_pipeline(image, enhance_quality=True)
+    # Single-column results tie, so grid order makes grayscale the only winner
+    assert calls == ['--oem 3 --psm 4']
+    assert (result['preprocessing_method'], result['ocr_config']) == ('grayscale', 'single_column')
+
+
+def test_pruning_is_opt_in(monkeypatch):
+    from service_config import processor_from_env
+
+    monkeypatch.delenv('OCR_STRATEGY_PRUNING', raising=False)
+    assert processor_from_env().strategy_stats is None
+
+    monkeypatch.setenv('OCR_STRATEGY_PRUNING', 'true')
+    monkeypatch.delenv('OCR_STRATEGY_STATS_PATH', raising=False)
+    assert processor_from_env().strategy_stats is not None
@@ -0,0 +1,56 @@
+import pickle
+
+import pytesseract
+
+from test_single_pass_ocr import make_data
+from word_boxes import WORD_COLUMNS, WordBoxes
+
+WORDS = [
+    (1, 1, 1, 'WALMART', 95),
+    (1, 1, 1, 'SUPERCENTER', 90.7),
+    (1, 1, 1, ' ', 30),
+    (1, 1, 2, '11/25/2024', 88),
+    (2, 1, 1, 'BANANAS', 92),
+    (2, 1, 1, '$2.48', -1),
+    (2, 2, 1, 'TOTAL', 96),
+]
+
+
+def test_tsv_parse_matches_pytesseract_dict():
+    tsv = make_data(WORDS)
+    expected = pytesseract.pytesseract.file_to_dict(tsv, '\t', -1)
+    words = [i for i, level in enumerate(expected['level']) if level == 5]
+
+    boxes = WordBoxes.from_tsv(tsv)
+
+    assert boxes.words() == [expected['text'][i].strip() for i in words]
+    for name in WORD_COLUMNS:
+        assert boxes.boxes[name].tolist() == [expected[name][i] for i in words]
+
+
+def test_stripped_tsv_keeps_its_last_row():
+    tsv = make_data(WORDS[:2] + [(1, 1, 1, '', -1)]).rstrip()
+    boxes = WordBoxes.from_tsv(tsv)
+    assert boxes.words() == ['WALMART', 'SUPERCENTER', '']
+    assert WordBoxes.from_tsv('level\tpage_num\ttext\n').words() == []
+
+
+def test_blank_words_count_towards_mean_confidence_only():
+    boxes = WordBoxes.from_tsv(make_data(WORDS))
+    assert boxes.mean_confidence() == (95 + 90 + 30 + 88 + 92 + 96) / 6
+
+    lines = boxes.lines()
+    assert [line['text'] for line in lines] == ['WALMART SUPERCENTER', '11/25/2024', 'BANANAS $2.48', 'TOTAL']
+    assert lines[0]['avg_confidence'] == (95 + 90) / 2
+    assert lines[0]['bbox'] == [10, 20, 28, 32]
+    assert [(line['block_num'], line['par_num']) for line in lines] == [(1, 1), (1, 1), (2, 1), (2, 2)]
+
+
+def test_dict_input_and_pickling_round_trip():
+    tsv = make_data(WORDS)
+    from_dict = WordBoxes.of(pytesseract.pytesseract.file_to_dict(tsv, '\t', -1))
+    assert from_dict.lines() == WordBoxes.of(tsv).lines()
+
+    restored = pickle.loads(pickle.dumps(from_dict))
+    assert restored.lines() == from_dict.lines()
+    assert restored.nbytes == from_dict.nbytes
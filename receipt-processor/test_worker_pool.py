@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from receipt_processor import ReceiptProcessor
+from result_cache import ResultCache
+from strategy_stats import StrategyStats
+from worker_pool import ProcessorWorkerPool, WorkerCrashedError, WorkerUnavailableError
+
+
+class FakeProcessor:
+    def warm_up(self):
+        return 0.01
+
+    def process_receipt(self, image_data, enhance_quality=True):
+        if image_data == b'crash':
+            os._exit(1)
+        return {'success': True, 'pid': os.getpid(), 'size': len(image_data), 'enhance': enhance_quality}
+
+    def stats(self):
+        return {'result_cache': {'hits': 0}}
+
+    def close(self):
+        pass
+
+
+def fake_processor():
+    return FakeProcessor()
+
+
+def broken_processor():
+    raise RuntimeError('no traineddata')
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault('factory', fake_processor)
+        pool = ProcessorWorkerPool(**kwargs)
+        pool.start()
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def test_receipts_run_in_warm_worker_processes(make_pool):
+    pool = make_pool(size=2)
+
+    result = pool.process_receipt(b'image', enhance_quality=False)
+
+    assert result['pid'] != os.getpid()
+    assert (result['size'], result['enhance']) == (5, False)
+    stats = pool.stats()
+    assert stats['completed'] == 1 and stats['last_warm_up_ms'] == 10
+    assert stats['processors'] == {str(result['pid']): {'result_cache': {'hits': 0}}}
+
+
+def test_workers_are_recycled_after_max_tasks(make_pool):
+    pool = make_pool(size=1, max_tasks=2, max_rss_mb=None)
+
+    pids = [pool.process_receipt(b'image')['pid'] for _ in range(5)]
+
+    assert pids[0] == pids[1] != pids[2] == pids[3] != pids[4]
+    assert pool.stats()['recycled'] == 2
+
+
+def test_workers_over_the_memory_limit_are_recycled(make_pool):
+    pool = make_pool(size=1, max_rss_mb=1)
+
+    pids = [pool.process_receipt(b'image')['pid'] for _ in range(2)]
+
+    assert pids[0] != pids[1]
+    assert pool.stats()['recycled'] == 2
+
+
+def test_a_dead_worker_is_replaced(make_pool):
+    pool = make_pool(size=1)
+
+    with pytest.raises(WorkerCrashedError):
+        pool.process_receipt(b'crash')
+
+    assert pool.process_receipt(b'image')['success'] is True
+    assert pool.stats()['crashed'] == 1
+
+
+def test_waiting_for_a_worker_times_out(make_pool):
+    pool = make_pool(size=1, factory=broken_processor, acquire_timeout=0.5)
+
+    with pytest.raises(WorkerUnavailableError):
+        pool.process_receipt(b'image')
+
+
+def test_warm_up_leaves_no_trace():
+    cache = ResultCache()
+    stats = StrategyStats()
+    processor = ReceiptProcessor(result_cache=cache, strategy_stats=stats)
+
+    assert processor.warm_up() > 0
+    assert cache.stats()['misses'] == 0
+    assert stats.stats()['combinations'] == {}
@@ -0,0 +1,112 @@
+import io
+import mmap
+import warnings
+from contextlib import contextmanager
+from typing import BinaryIO, Collection, Iterator, Union
+
+from PIL import Image, UnidentifiedImageError
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from image_ingest import InvalidImageError
+
+
+class ImageTooLargeError(InvalidImageError):
+    """Raised when an image's header declares more pixels than allowed"""
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies over max_bytes on the given paths with 413.
+
+    A declared Content-Length over the limit is refused before any of the
+    body is read. Bodies without one (chunked uploads) are counted as they
+    stream in, and the request is cut off as soon as the count passes the
+    limit, so an upload is never read past max_bytes however large it is.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Collection[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds {self.max_bytes} bytes"
+        for name, value in scope['headers']:
+            if name == b'content-length' and value.isdigit() and int(value) > self.max_bytes:
+                await JSONResponse({'detail': detail}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    # An HTTPException passes through FastAPI's form parsing unchanged
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def check_pixel_count(upload: BinaryIO, max_pixels: int):
+    """
+    Read just the image header and refuse images over max_pixels before
+    anything is decoded. Formats Pillow can't identify are left to the
+    decoder to accept or reject.
+    """
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(upload) as image:
+                width, height = image.size
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError(f"Image exceeds {max_pixels} pixels")
+    except (UnidentifiedImageError, OSError, ValueError):
+        return
+    finally:
+        upload.seek(0)
+
+    if width * height > max_pixels:
+        raise ImageTooLargeError(f"Image is {width}x{height}, over the {max_pixels} pixel limit")
+
+
+@contextmanager
+def upload_buffer(upload: BinaryIO) -> Iterator[Union[bytes, mmap.mmap]]:
+    """
+    Contents of a spooled upload. Once the upload has rolled over to a
+    temp file it is memory-mapped rather than read, so decoding works from
+    the page cache instead of a second copy on the heap; small uploads
+    still in memory are returned as bytes.
+    """
+    # Same check Starlette's UploadFile uses for SpooledTemporaryFile
+    if not getattr(upload, '_rolled', True):
+        upload.seek(0)
+        yield upload.read()
+        return
+
+    try:
+        upload.flush()
+        mapped = mmap.mmap(upload.fileno(), 0, access=mmap.ACCESS_READ)
+    except (io.UnsupportedOperation, AttributeError, ValueError):
+        # No real file behind it, or an empty one, which can't be mapped
+        upload.seek(0)
+        yield upload.read()
+        return
+
+    try:
+        yield mapped
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # A view is still alive; the map closes once it is collected
+            pass
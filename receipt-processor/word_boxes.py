@@ -0,0 +1,152 @@
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+# Numeric word columns kept from Tesseract's image_to_data output.
+# Confidences are truncated to ints, as pytesseract.Output.DICT has them.
+WORD_COLUMNS = ('block_num', 'par_num', 'line_num', 'word_num',
+                'left', 'top', 'width', 'height', 'conf')
+WORD_DTYPE = np.dtype([(name, np.int32) for name in WORD_COLUMNS])
+
+
+class WordBoxes:
+    """
+    Word-level OCR output held in one NumPy structured array.
+
+    Replaces pytesseract.Output.DICT, which keeps twelve Python lists with
+    a boxed int or str per cell for every row Tesseract reports (pages,
+    blocks, paragraphs and lines as well as words). Only word rows are
+    kept: their numbers in boxes, their text in a single string with the
+    non-blank words separated by spaces and addressed by starts/ends
+    (-1 for blank words). A line's text is then one slice of that string.
+
+    Blank words are kept in boxes because their confidences count towards
+    the overall average, as they always have.
+    """
+
+    __slots__ = ('boxes', 'text', 'starts', 'ends')
+
+    def __init__(self, boxes: np.ndarray, words: List[str]):
+        stripped = [str(word).strip() for word in words]
+        lengths = np.fromiter((len(word) for word in stripped), dtype=np.int64, count=len(stripped))
+        has_text = lengths > 0
+
+        # Each non-blank word is followed by one separator in the buffer
+        ends = np.cumsum(np.where(has_text, lengths + 1, 0)) - 1
+        self.boxes = boxes
+        self.text = ' '.join(word for word in stripped if word)
+        self.starts = np.where(has_text, ends - lengths, -1).astype(np.int32)
+        self.ends = np.where(has_text, ends, -1).astype(np.int32)
+
+    @classmethod
+    def from_tsv(cls, tsv: str) -> 'WordBoxes':
+        """
+        Parse Tesseract's TSV output (pytesseract.image_to_data with the
+        default string output) with one split and array conversions
+        instead of converting cell by cell.
+        """
+        header, _, body = tsv.partition('\n')
+        columns = header.split('\t')
+        body = body.rstrip('\n')
+        if not body:
+            return cls(np.zeros(0, WORD_DTYPE), [])
+
+        cells = body.replace('\n', '\t').split('\t')
+        if len(cells) % len(columns):
+            # A stripped TSV loses the empty text cell of its last row
+            cells.append('')
+        table = np.array(cells, dtype=object).reshape(-1, len(columns))
+        table = table[table[:, columns.index('level')] == '5']
+
+        numbers = table[:, [columns.index(name) for name in WORD_COLUMNS]].astype(np.float64)
+        boxes = np.zeros(len(table), WORD_DTYPE)
+        for i, name in enumerate(WORD_COLUMNS):
+            # Casting truncates towards zero, like int(float(cell))
+            boxes[name] = numbers[:, i]
+        return cls(boxes, table[:, columns.index('text')].tolist())
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[Any]]) -> 'WordBoxes':
+        """Convert pytesseract.Output.DICT style columns"""
+        rows = [i for i, level in enumerate(data.get('level', [])) if int(level) == 5]
+        boxes = np.zeros(len(rows), WORD_DTYPE)
+        for name in WORD_COLUMNS:
+            if name in data:
+                boxes[name] = [int(float(data[name][i])) for i in rows]
+        return cls(boxes, [data['text'][i] for i in rows])
+
+    @classmethod
+    def of(cls, data: Union['WordBoxes', str, Dict[str, List[Any]]]) -> 'WordBoxes':
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, str):
+            return cls.from_tsv(data)
+        return cls.from_dict(data)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def __getstate__(self):
+        return self.boxes, self.text, self.starts, self.ends
+
+    def __setstate__(self, state):
+        self.boxes, self.text, self.starts, self.ends = state
+
+    @property
+    def nbytes(self) -> int:
+        return self.boxes.nbytes + self.starts.nbytes + self.ends.nbytes + len(self.text)
+
+    def words(self) -> List[str]:
+        """Text of every word, '' for blank ones"""
+        return [self.text[start:end] if start >= 0 else '' for start, end in zip(self.starts.tolist(), self.ends.tolist())]
+
+    def mean_confidence(self) -> float:
+        """Average confidence over words with a positive confidence"""
+        conf = self.boxes['conf']
+        positive = conf[conf > 0]
+        return float(positive.sum()) / len(positive) if len(positive) else 0.0
+
+    def lines(self) -> List[Dict[str, Any]]:
+        """
+        Group consecutive non-blank words sharing (block_num, par_num,
+        line_num) into lines, with each line's text, bounding box and
+        average positive confidence.
+        """
+        rows = np.flatnonzero(self.starts >= 0)
+        if not len(rows):
+            return []
+
+        words = self.boxes[rows]
+        new_line = np.zeros(len(rows), dtype=bool)
+        new_line[0] = True
+        for name in ('block_num', 'par_num', 'line_num'):
+            new_line[1:] |= words[name][1:] != words[name][:-1]
+        first = np.flatnonzero(new_line)
+        last = np.append(first[1:], len(rows)) - 1
+
+        left = np.minimum.reduceat(words['left'], first)
+        top = np.minimum.reduceat(words['top'], first)
+        right = np.maximum.reduceat(words['left'] + words['width'], first)
+        bottom = np.maximum.reduceat(words['top'] + words['height'], first)
+
+        conf = words['conf'].astype(np.int64)
+        positive = conf > 0
+        conf_sums = np.add.reduceat(np.where(positive, conf, 0), first)
+        conf_counts = np.add.reduceat(positive.astype(np.int64), first)
+
+        starts = self.starts[rows[first]].tolist()
+        ends = self.ends[rows[last]].tolist()
+        lines = []
+        for i, (block, par, line) in enumerate(zip(words['block_num'][first].tolist(),
+                                                   words['par_num'][first].tolist(),
+                                                   words['line_num'][first].tolist())):
+            count = int(conf_counts[i])
+            lines.append({
+                'block_num': block,
+                'par_num': par,
+                'line_num': line,
+                'bbox': [int(left[i]), int(top[i]), int(right[i]), int(bottom[i])],
+                'text': self.text[starts[i]:ends[i]],
+                'avg_confidence': int(conf_sums[i]) / count if count else 0.0,
+            })
+        return lines
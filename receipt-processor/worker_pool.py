@@ -0,0 +1,263 @@
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a worker process dies while handling a receipt"""
+
+
+class WorkerUnavailableError(RuntimeError):
+    """Raised when no worker process is free within the acquire timeout"""
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current RSS, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+
+
+def _worker_main(factory: Callable[[], Any], connection, warm_up: bool,
+                 max_tasks: int, max_rss_bytes: Optional[int]):
+    """
+    Worker process loop: build a processor, warm it up, report ready, then
+    process receipts until told to stop or it is time to retire.
+    """
+    processor = factory()
+    warm_up_seconds = processor.warm_up() if warm_up else 0.0
+    connection.send(('ready', os.getpid(), warm_up_seconds))
+
+    tasks = 0
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+
+            image_data, enhance_quality = message
+            result = processor.process_receipt(image_data, enhance_quality)
+            tasks += 1
+
+            retire = tasks >= max_tasks or (max_rss_bytes is not None and _rss_bytes() > max_rss_bytes)
+            stats = processor.stats() if hasattr(processor, 'stats') else None
+            connection.send(('result', result, retire, stats))
+            if retire:
+                break
+    finally:
+        processor.close()
+        connection.close()
+
+
+class _Worker:
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.pid = process.pid
+
+
+class ProcessorWorkerPool:
+    """
+    Long-lived worker processes, each with its own warmed-up ReceiptProcessor.
+
+    Each worker builds a processor with factory (a module-level function,
+    so it can be sent to a spawned process), runs a warm-up receipt and
+    only then joins the pool. A worker retires after max_tasks receipts,
+    or once its resident memory passes max_rss_mb, and a replacement warms
+    up in the background while the others keep serving. Memory held by
+    large images therefore can't build up for the life of the service.
+
+    process_receipt blocks until a worker is free, so call it from a
+    thread (OCRWorkerPool does). If none frees up within acquire_timeout,
+    for instance because every worker keeps failing to start, it raises
+    WorkerUnavailableError rather than holding the caller's thread forever.
+
+    Each worker reports its processor's stats() with every result, and
+    stats() lists the latest report of each live worker.
+    """
+
+    def __init__(self, size: int, factory: Callable[[], Any], max_tasks: int = 500,
+                 max_rss_mb: Optional[int] = 1024, warm_up: bool = True,
+                 start_method: str = 'spawn', ready_timeout: float = 300.0,
+                 acquire_timeout: Optional[float] = 60.0):
+        """
+        Args:
+            size: number of worker processes
+            factory: builds a worker's processor
+            max_tasks: receipts a worker handles before it is replaced
+            max_rss_mb: resident memory (MB) above which a worker is
+                replaced after its current receipt (None = no limit)
+            warm_up: run a synthetic receipt before a worker takes work
+            start_method: multiprocessing start method; 'spawn' gives
+                every worker a fresh interpreter
+            ready_timeout: seconds a new worker gets to report ready
+            acquire_timeout: seconds process_receipt waits for a free
+                worker (None = no limit)
+        """
+        self.size = max(1, size)
+        self.factory = factory
+        self.max_tasks = max(1, max_tasks)
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.warm_up = warm_up
+        self.ready_timeout = ready_timeout
+        self.acquire_timeout = acquire_timeout
+        self._context = multiprocessing.get_context(start_method)
+
+        self._idle: 'queue.Queue[_Worker]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.starting = 0
+        self.busy = 0
+        self.completed = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.last_warm_up_ms = None
+        self._processor_stats: Dict[int, Any] = {}
+
+    def start(self):
+        """Start the workers; each joins the pool once it has warmed up"""
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self):
+        """Start one worker and wait for it to report ready on a background thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self.starting += 1
+        threading.Thread(target=self._start_worker, name='ocr-worker-start', daemon=True).start()
+
+    def _start_worker(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.factory, child_connection, self.warm_up, self.max_tasks, self.max_rss_bytes),
+            daemon=True
+        )
+        process.start()
+        child_connection.close()
+        worker = _Worker(process, parent_connection)
+
+        try:
+            if not parent_connection.poll(self.ready_timeout):
+                raise TimeoutError(f"not ready after {self.ready_timeout}s")
+            _, pid, warm_up_seconds = parent_connection.recv()
+        except (EOFError, OSError, TimeoutError) as e:
+            with self._lock:
+                self.starting -= 1
+                closed = self._closed
+            self._stop(worker)
+            if closed:
+                return
+            logger.error(f"OCR worker process {process.pid} failed to start: {e}")
+            # Back off so a worker that can't start doesn't spin
+            time.sleep(5)
+            self._spawn()
+            return
+
+        logger.info(f"OCR worker process {pid} ready (warm-up {warm_up_seconds * 1000:.0f}ms)")
+        with self._lock:
+            self.starting -= 1
+            self.last_warm_up_ms = int(warm_up_seconds * 1000)
+            closed = self._closed
+        if closed:
+            self._stop(worker)
+        else:
+            self._idle.put(worker)
+
+    def process_receipt(self, image_data: bytes, enhance_quality: bool = True) -> Dict[str, Any]:
+        """Process a receipt on the next free worker"""
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise WorkerUnavailableError(
+                f"No OCR worker process became free within {self.acquire_timeout:g}s")
+        with self._lock:
+            self.busy += 1
+
+        try:
+            worker.connection.send((image_data, enhance_quality))
+            _, result, retire, processor_stats = worker.connection.recv()
+        except (EOFError, OSError) as e:
+            # Killed mid-receipt, typically by the OOM killer
+            with self._lock:
+                self.busy -= 1
+                self.crashed += 1
+            logger.error(f"OCR worker process {worker.pid} died: {e}")
+            self._stop(worker)
+            self._spawn()
+            raise WorkerCrashedError(f"OCR worker process {worker.pid} died while processing the receipt")
+
+        with self._lock:
+            self.busy -= 1
+            self.completed += 1
+            if retire:
+                self.recycled += 1
+            if processor_stats is not None:
+                self._processor_stats[worker.pid] = processor_stats
+            closed = self._closed
+
+        if closed:
+            threading.Thread(target=self._stop, args=(worker,), daemon=True).start()
+        elif retire:
+            logger.info(f"Recycling OCR worker process {worker.pid}")
+            threading.Thread(target=self._stop, args=(worker,), daemon=True).start()
+            self._spawn()
+        else:
+            self._idle.put(worker)
+        return result
+
+    def _stop(self, worker: _Worker, timeout: float = 10.0):
+        with self._lock:
+            self._processor_stats.pop(worker.pid, None)
+        try:
+            worker.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join()
+        worker.connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': self.size,
+                'ready': self._idle.qsize(),
+                'busy': self.busy,
+                'starting': self.starting,
+                'completed': self.completed,
+                'recycled': self.recycled,
+                'crashed': self.crashed,
+                'max_tasks': self.max_tasks,
+                'max_rss_mb': self.max_rss_bytes // (1024 * 1024) if self.max_rss_bytes else None,
+                'last_warm_up_ms': self.last_warm_up_ms,
+                'processors': {str(pid): stats for pid, stats in self._processor_stats.items()},
+            }
+
+    def shutdown(self):
+        """Stop idle workers; busy ones stop after their current receipt"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._stop(worker)